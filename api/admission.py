@@ -0,0 +1,119 @@
+"""
+Admission Policy
+Decide se um resultado lido do MongoDB entra no Redis, pela frequência de
+acesso estimada (TinyLFU)
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+# Contadores de 4 bits (saturam em 15), como no TinyLFU
+MAX_COUNT = 15
+
+# Tabela para envelhecer todos os contadores de uma vez (bytes.translate)
+_HALVE = bytes(value >> 1 for value in range(256))
+
+
+class FrequencySketch:
+    """
+    Count-min sketch com envelhecimento periódico
+
+    `depth` linhas de `width` contadores; a frequência estimada de um item é
+    o menor dos seus contadores. A cada `sample_size` incrementos todos os
+    contadores são divididos por 2, para que a popularidade antiga perca
+    peso. Incrementos concorrentes podem se perder (contagem aproximada, sem
+    lock no caminho crítico).
+    """
+
+    def __init__(self, width: int, depth: int = 4, sample_size: Optional[int] = None):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or 10 * width
+        self.counters = bytearray(width * depth)
+        self.additions = 0
+        self.resets = 0
+        self._reset_lock = threading.Lock()
+
+    def _indexes(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def increment(self, item: str) -> None:
+        counters = self.counters
+        for index in self._indexes(item):
+            if counters[index] < MAX_COUNT:
+                counters[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def frequency(self, item: str) -> int:
+        counters = self.counters
+        return min(counters[index] for index in self._indexes(item))
+
+    def _age(self) -> None:
+        with self._reset_lock:
+            if self.additions < self.sample_size:
+                return
+            self.counters = bytearray(self.counters.translate(_HALVE))
+            self.additions //= 2
+            self.resets += 1
+
+
+class AdmissionPolicy:
+    """
+    Admissão no cache dos resultados de leitura (read-through)
+
+    Todo acesso é registrado no sketch (`record`). No backfill, `ttl_for`
+    admite com o TTL completo chaves vistas ao menos `min_frequency` vezes
+    na janela recente; as demais entram com TTL de experiência
+    (`probation_ttl`), ou não são cacheadas se ele for 0. Assim leituras
+    únicas (varreduras, auditorias) não expulsam chaves quentes de um Redis
+    com memória limitada.
+
+    O sketch é por processo: com vários workers, a frequência de uma chave
+    se divide entre eles.
+    """
+
+    def __init__(
+        self,
+        min_frequency: int = 2,
+        probation_ttl: int = 0,
+        width: int = 65536,
+    ):
+        self.min_frequency = min_frequency
+        self.probation_ttl = probation_ttl
+        self.sketch = FrequencySketch(width)
+        self.admitted = 0
+        self.probation = 0
+        self.rejected = 0
+
+    def record(self, key: str) -> None:
+        self.sketch.increment(key)
+
+    def ttl_for(self, key: str, full_ttl: int) -> Optional[int]:
+        """TTL do backfill de `key`, ou None para não cachear"""
+        if self.sketch.frequency(key) >= self.min_frequency:
+            self.admitted += 1
+            return full_ttl
+        if self.probation_ttl:
+            self.probation += 1
+            return min(self.probation_ttl, full_ttl)
+        self.rejected += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        decisions = self.admitted + self.probation + self.rejected
+        return {
+            "min_frequency": self.min_frequency,
+            "probation_ttl": self.probation_ttl,
+            "admitted": self.admitted,
+            "probation": self.probation,
+            "rejected": self.rejected,
+            "admit_ratio": round(self.admitted / decisions, 4) if decisions else 0.0,
+            "sketch_resets": self.sketch.resets,
+        }
@@ -0,0 +1,98 @@
+"""
+Micro-batching
+Agrupa leituras de chave única concorrentes (threads do mesmo processo) em uma
+única chamada em lote, no estilo DataLoader
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class _Batch:
+    __slots__ = ("keys", "results", "error", "full", "done")
+
+    def __init__(self):
+        self.keys: Dict[Hashable, None] = {}
+        self.results: Dict[Hashable, Any] = {}
+        self.error = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Junta as chaves pedidas dentro de uma janela curta em um lote
+
+    A primeira thread a pedir uma chave abre o lote e vira líder: espera até
+    `window_seconds` (ou até o lote ter `max_batch_size` chaves), executa
+    `batch_fn` uma vez com todas as chaves e entrega a cada thread o seu
+    resultado. Não há thread de fundo (seguro após fork). Chaves repetidas
+    no mesmo lote são buscadas uma vez.
+
+    `batch_fn(keys)` devolve {chave: resultado}; um resultado que seja uma
+    exceção é levantado apenas para quem pediu aquela chave.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Hashable]], Dict[Hashable, Any]],
+        window_seconds: float,
+        max_batch_size: int,
+    ):
+        self.batch_fn = batch_fn
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._lock = threading.Lock()
+        self._pending = None
+        self.batches = 0
+        self.keys = 0
+        self.largest_batch = 0
+
+    def load(self, key: Hashable) -> Any:
+        with self._lock:
+            batch = self._pending
+            leader = batch is None
+            if leader:
+                batch = self._pending = _Batch()
+            batch.keys[key] = None
+            if len(batch.keys) >= self.max_batch_size:
+                # Lote cheio: o próximo pedido abre outro
+                self._pending = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window_seconds)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+                self.batches += 1
+                self.keys += len(batch.keys)
+                self.largest_batch = max(self.largest_batch, len(batch.keys))
+            try:
+                batch.results = self.batch_fn(list(batch.keys))
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        result = batch.results.get(key)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window_ms": self.window_seconds * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "keys": self.keys,
+                "avg_batch_size": (
+                    round(self.keys / self.batches, 2) if self.batches else 0.0
+                ),
+                "largest_batch": self.largest_batch,
+            }
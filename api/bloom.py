@@ -0,0 +1,65 @@
+"""
+Bloom Filter
+Índice de pertencimento dos customer_ids conhecidos, compatível com bitmaps do Redis
+"""
+
+import hashlib
+import math
+from typing import Iterable, List
+
+
+class BloomFilter:
+    """
+    Bloom filter em memória com o mesmo layout de bits dos bitmaps do Redis
+
+    O bit `i` fica no byte `i // 8`, na posição `7 - i % 8` (mais significativo
+    primeiro), igual a SETBIT/BITFIELD. Assim o bitmap pode ser mantido no
+    Redis com BITFIELD e carregado em cada processo com um único GET.
+
+    Responde "definitivamente ausente" sem falsos negativos; "talvez presente"
+    tem taxa de falso positivo próxima de `error_rate` até `capacity` itens.
+    """
+
+    def __init__(self, size_bits: int, num_hashes: int, data: bytes = b""):
+        """
+        Args:
+            size_bits: Quantidade de bits do filtro (m)
+            num_hashes: Quantidade de funções hash (k)
+            data: Bitmap existente (ex.: lido do Redis); completado com zeros
+        """
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        num_bytes = (size_bits + 7) // 8
+        self.bits = bytearray(data[:num_bytes])
+        self.bits.extend(b"\x00" * (num_bytes - len(self.bits)))
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        """Cria um filtro vazio dimensionado para `capacity` itens"""
+        size_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(size_bits / capacity * math.log(2)))
+        return cls(size_bits, num_hashes)
+
+    def offsets(self, item: str) -> List[int]:
+        """Posições dos bits de um item (double hashing sobre blake2b)"""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> None:
+        for offset in self.offsets(item):
+            self.bits[offset >> 3] |= 0x80 >> (offset & 7)
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[offset >> 3] & (0x80 >> (offset & 7)) for offset in self.offsets(item)
+        )
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
@@ -0,0 +1,107 @@
+"""
+Bulkhead
+Limita a concorrência de chamadas a um recurso (MongoDB) com fila de espera limitada
+"""
+
+import threading
+from typing import Any, Dict
+
+
+class BulkheadFull(Exception):
+    """Nenhuma vaga liberada dentro do tempo máximo de espera"""
+
+
+class Bulkhead:
+    """
+    Semáforo com timeout de espera e métricas de fila
+
+    Uso:
+        with bulkhead.slot():
+            collection.find_one(...)
+
+    Se não houver vaga em `max_wait_seconds`, levanta `BulkheadFull` (a
+    chamada é descartada em vez de aumentar a fila do recurso).
+    Com `max_concurrent=0` o bulkhead fica desligado.
+    """
+
+    def __init__(self, max_concurrent: int, max_wait_seconds: float):
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = (
+            threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        )
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.shed = 0
+
+    def slot(self):
+        if self._semaphore is None:
+            return _NULL_SLOT
+        return _Slot(self)
+
+    def _acquire(self) -> None:
+        # Caminho rápido: vaga livre, sem contabilizar espera
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+            acquired = self._semaphore.acquire(timeout=self.max_wait_seconds)
+            with self._lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.shed += 1
+            if not acquired:
+                raise BulkheadFull(
+                    f"No slot available within {self.max_wait_seconds * 1000:.0f} ms"
+                )
+        with self._lock:
+            self.in_flight += 1
+            self.acquired += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "acquired": self.acquired,
+                "shed": self.shed,
+            }
+
+
+class _Slot:
+    __slots__ = ("bulkhead",)
+
+    def __init__(self, bulkhead: Bulkhead):
+        self.bulkhead = bulkhead
+
+    def __enter__(self):
+        self.bulkhead._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.bulkhead._release()
+        return False
+
+
+class _NullSlot:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SLOT = _NullSlot()
@@ -0,0 +1,156 @@
+"""
+Feature Export
+Codifica os lotes de `FeaturesService.export_features` como NDJSON ou Arrow
+(IPC stream), em pedaços, com cursor para retomar a exportação
+"""
+
+import base64
+import io
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .renderers import ORJSON_AVAILABLE
+
+if ORJSON_AVAILABLE:
+    import orjson
+
+# Apache Arrow (instalar: pip install pyarrow)
+try:
+    import pyarrow as pa
+
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+# Chamado após cada lote com (documentos exportados, cursor para retomar)
+ProgressCallback = Callable[[int, str], None]
+
+
+def encode_cursor(model_version: str, after: str) -> str:
+    """Token opaco que retoma a exportação após `after` na versão informada"""
+    raw = json.dumps({"v": model_version, "after": after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, str]:
+    """
+    Returns:
+        (model_version, after)
+
+    Raises:
+        ValueError: Se o token for inválido
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(data["v"]), str(data["after"])
+    except Exception:
+        raise ValueError("Invalid export cursor")
+
+
+def _dumps(doc: Dict[str, Any]) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(doc, default=str)
+    return json.dumps(doc, default=str).encode()
+
+
+def iter_ndjson(
+    batches: Iterable[List[Dict[str, Any]]],
+    model_version: str,
+    limit: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Iterable[bytes]:
+    """
+    Um documento por linha, um pedaço por lote
+
+    Se a exportação parou em `limit`, a última linha é
+    `{"next_cursor": "..."}` para buscar o restante.
+    """
+    exported = 0
+    cursor = None
+    for docs in batches:
+        yield b"".join(_dumps(doc) + b"\n" for doc in docs)
+        exported += len(docs)
+        cursor = encode_cursor(model_version, docs[-1]["customer_id"])
+        if progress is not None:
+            progress(exported, cursor)
+
+    if limit is not None and exported >= limit and cursor is not None:
+        yield _dumps({"next_cursor": cursor}) + b"\n"
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def arrow_schema(fields: Optional[List[str]] = None) -> "pa.Schema":
+    """
+    Colunas fixas + uma coluna float64 por feature pedida em `fields`, ou
+    todas as features numa coluna map<string, float64>
+    """
+    columns = [
+        ("customer_id", pa.string()),
+        ("model_version", pa.string()),
+        ("calculated_at", pa.string()),
+    ]
+    if fields is not None:
+        columns.extend((name, pa.float64()) for name in fields)
+    else:
+        columns.append(("features", pa.map_(pa.string(), pa.float64())))
+    return pa.schema(columns)
+
+
+def iter_arrow(
+    batches: Iterable[List[Dict[str, Any]]],
+    model_version: str,
+    fields: Optional[List[str]] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Iterable[bytes]:
+    """
+    Arrow IPC stream com um record batch por lote
+
+    Cada record batch leva o cursor para retomar após ele nos metadados
+    (`next_cursor`). Features não numéricas viram null.
+    """
+    schema = arrow_schema(fields)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    exported = 0
+    for docs in batches:
+        columns: Dict[str, list] = {
+            "customer_id": [doc.get("customer_id") for doc in docs],
+            "model_version": [doc.get("model_version") for doc in docs],
+            "calculated_at": [doc.get("calculated_at") for doc in docs],
+        }
+        if fields is not None:
+            for name in fields:
+                columns[name] = [
+                    _as_float(doc.get("features", {}).get(name)) for doc in docs
+                ]
+        else:
+            columns["features"] = [
+                [(k, _as_float(v)) for k, v in doc.get("features", {}).items()]
+                for doc in docs
+            ]
+
+        exported += len(docs)
+        cursor = encode_cursor(model_version, docs[-1]["customer_id"])
+        writer.write_batch(
+            pa.RecordBatch.from_pydict(columns, schema=schema),
+            custom_metadata={"next_cursor": cursor},
+        )
+        if progress is not None:
+            progress(exported, cursor)
+        yield drain()
+
+    writer.close()
+    yield drain()
@@ -0,0 +1,284 @@
+"""
+Raw ASGI fast path for GET /api/features/<customer_id>/ cache hits
+
+Mounted ahead of Django in cache_project/asgi.py when ASGI_FAST_PATH is on.
+It answers Redis hits (and negative cache hits) with the same body and
+headers the Django view would send, without URL resolution, middleware,
+content negotiation, serializers or response objects. Everything else
+(other paths, misses, conditional requests, other media types, errors) is
+handed to the Django application unchanged.
+"""
+
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.utils.http import http_date
+
+from .renderers import ORJSON_AVAILABLE
+from .services import ACTIVE_VERSION_KEY, CACHE_STATS_KEY, GET_FEATURES_SCRIPT
+from .services import NEGATIVE_CACHE_MARKER
+from .shared import get_features_service
+from .views import cache_max_age, feature_validators
+
+# Cliente assíncrono do Redis (incluso no redis-py >= 4.2)
+try:
+    import redis.asyncio as aioredis
+
+    AIOREDIS_AVAILABLE = True
+except ImportError:
+    AIOREDIS_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    import orjson
+
+logger = logging.getLogger(__name__)
+
+FEATURE_PATH = re.compile(r"^/api/features/([^/]+)/$")
+
+# Requests answered here vs. matching the route but handed to Django
+_counters = {"hit": 0, "negative_hit": 0, "delegated": 0}
+
+
+def get_fast_path_counters():
+    """Fast path counters of this worker (see MetricsView)"""
+    return dict(_counters)
+
+
+def _reserved_segments():
+    """Literal routes under features/ (bulk/, export/) that are not lookups"""
+    from .urls import urlpatterns
+
+    segments = set()
+    for pattern in urlpatterns:
+        parts = str(pattern.pattern).strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "features" and "<" not in parts[1]:
+            segments.add(parts[1])
+    return frozenset(segments)
+
+
+def _dumps(data):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _string(value):
+    return None if value is None else str(value)
+
+
+class FeatureFastPath:
+    """
+    ASGI app serving feature lookups from Redis, delegating the rest to `app`
+
+    Only plain GETs are answered here: no query string, no If-None-Match /
+    If-Modified-Since and an Accept header that is absent, `*/*` or
+    `application/json`. The lookup shares the FeaturesService policies
+    (sliding TTL/counters script, admission sketch, stale copies) but reads
+    through a redis.asyncio client, so it never blocks the event loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.reserved = _reserved_segments()
+        self.client = None
+        self.get_script = None
+        self.active_version = None
+        self.active_version_expires = 0.0
+        self.compression = None
+        if settings.RESPONSE_COMPRESSION_ENABLED:
+            from .middleware import ResponseCompressionMiddleware
+
+            self.compression = ResponseCompressionMiddleware(None)
+        self.security_headers = self._security_headers()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "GET"
+            and not scope.get("query_string")
+            and not scope.get("root_path")
+        ):
+            match = FEATURE_PATH.match(scope["path"])
+            if match and match.group(1) not in self.reserved:
+                response = await self._respond(match.group(1), scope)
+                if response is not None:
+                    status, headers, body = response
+                    await send(
+                        {
+                            "type": "http.response.start",
+                            "status": status,
+                            "headers": headers,
+                        }
+                    )
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                _counters["delegated"] += 1
+        await self.app(scope, receive, send)
+
+    async def _respond(self, customer_id, scope):
+        """(status, headers, body), or None to let Django handle the request"""
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept":
+                if value.strip() not in (b"*/*", b"application/json"):
+                    return None
+            elif name in (b"if-none-match", b"if-modified-since"):
+                return None
+            elif name == b"accept-encoding":
+                accept_encoding = value
+        if settings.SECURE_SSL_REDIRECT and scope.get("scheme") != "https":
+            return None
+
+        service = get_features_service()
+        if not (AIOREDIS_AVAILABLE and service.use_redis):
+            return None
+
+        try:
+            model_version = await self._get_active_version(service)
+            if model_version is None:
+                return None
+            key = service._get_redis_key(customer_id, model_version)
+            if service._use_get_script():
+                # Misses are not counted here: Django repeats the lookup
+                cached = await self.get_script(
+                    keys=[key, CACHE_STATS_KEY],
+                    args=service._get_script_args(model_version, count_misses=False),
+                )
+            else:
+                cached = await self.client.get(key)
+            if cached is None:
+                return None
+            if service.admission is not None:
+                service.admission.record(f"{model_version}:{customer_id}")
+
+            if cached == NEGATIVE_CACHE_MARKER:
+                _counters["negative_hit"] += 1
+                body = _dumps(
+                    {"error": f"Features not found for customer_id: {customer_id}"}
+                )
+                return 404, self._headers(body, [(b"vary", b"Accept")]), body
+
+            doc = orjson.loads(cached) if ORJSON_AVAILABLE else json.loads(cached)
+            service._remember_stale(customer_id, model_version, doc)
+        except Exception as e:
+            logger.error(f"Fast path lookup error: {e}")
+            return None
+
+        _counters["hit"] += 1
+        return self._hit_response(doc, scope, accept_encoding)
+
+    def _hit_response(self, doc, scope, accept_encoding):
+        """Same body and validators as FeatureRetrieveView + FeatureSerializer"""
+        features = doc.get("features")
+        body = _dumps(
+            {
+                "customer_id": _string(doc.get("customer_id")),
+                "features": (
+                    None
+                    if features is None
+                    else {str(name): value for name, value in features.items()}
+                ),
+                "calculated_at": _string(doc.get("calculated_at")),
+                "model_version": _string(doc.get("model_version")),
+                "expires_at": _string(doc.get("expires_at")),
+            }
+        )
+
+        etag, last_modified = feature_validators(doc)
+        visibility = "public" if settings.HTTP_CACHE_PUBLIC else "private"
+        headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", f"{visibility}, max-age={cache_max_age(doc)}".encode()),
+        ]
+        if last_modified is not None:
+            headers.append((b"last-modified", http_date(last_modified).encode()))
+        if scope.get("scheme") == "https" and settings.SECURE_HSTS_SECONDS:
+            hsts = f"max-age={settings.SECURE_HSTS_SECONDS}"
+            if settings.SECURE_HSTS_INCLUDE_SUBDOMAINS:
+                hsts += "; includeSubDomains"
+            if settings.SECURE_HSTS_PRELOAD:
+                hsts += "; preload"
+            headers.append((b"strict-transport-security", hsts.encode()))
+
+        vary = b"Accept"
+        if self.compression is not None and len(body) >= self.compression.min_size:
+            vary = b"Accept, Accept-Encoding"
+            encoding = self.compression._negotiate(accept_encoding.decode("latin-1"))
+            if encoding is not None:
+                compressed = self.compression._compress(encoding, body)
+                if len(compressed) < len(body):
+                    body = compressed
+                    headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", vary))
+        return 200, self._headers(body, headers), body
+
+    def _headers(self, body, extra):
+        return [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *extra,
+            *self.security_headers,
+        ]
+
+    @staticmethod
+    def _security_headers():
+        """Static headers SecurityMiddleware/XFrameOptionsMiddleware would add"""
+        headers = []
+        if "django.middleware.clickjacking.XFrameOptionsMiddleware" in (
+            settings.MIDDLEWARE
+        ):
+            headers.append(
+                (b"x-frame-options", getattr(settings, "X_FRAME_OPTIONS", "DENY"))
+            )
+        if settings.SECURE_CONTENT_TYPE_NOSNIFF:
+            headers.append((b"x-content-type-options", "nosniff"))
+        referrer_policy = settings.SECURE_REFERRER_POLICY
+        if referrer_policy:
+            if not isinstance(referrer_policy, str):
+                referrer_policy = ",".join(referrer_policy)
+            headers.append((b"referrer-policy", referrer_policy))
+        if settings.SECURE_CROSS_ORIGIN_OPENER_POLICY:
+            headers.append(
+                (
+                    b"cross-origin-opener-policy",
+                    settings.SECURE_CROSS_ORIGIN_OPENER_POLICY,
+                )
+            )
+        return [(name, value.encode()) for name, value in headers]
+
+    async def _get_active_version(self, service):
+        """Active version alias from Redis, cached like get_active_version
+
+        Without the alias, reuses the version the service resolved (MongoDB
+        or DEFAULT_MODEL_VERSION) while it is fresh; otherwise returns None
+        and the delegated request resolves it again.
+        """
+        now = time.monotonic()
+        if self.active_version is not None and now < self.active_version_expires:
+            return self.active_version
+        if self.client is None:
+            # Created on the first request, inside the worker's event loop
+            self.client = aioredis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+            )
+            self.get_script = self.client.register_script(GET_FEATURES_SCRIPT)
+        version = await self.client.get(ACTIVE_VERSION_KEY)
+        expires = now + service.active_version_cache_ttl
+        if version is None:
+            if (
+                service._active_version is None
+                or now >= service._active_version_expires
+            ):
+                return None
+            version, expires = service._active_version, service._active_version_expires
+        self.active_version = version
+        self.active_version_expires = expires
+        return version
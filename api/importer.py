@@ -0,0 +1,423 @@
+"""
+Feature Import
+Carrega dumps CSV e Parquet de features sem passar pela API: o arquivo é
+dividido em pedaços (faixas de bytes do CSV, alinhadas em quebras de linha
+via mmap, ou row groups do Parquet), lidos de forma colunar e gravados em
+lote com `bulk_set_features` por um pool de processos
+"""
+
+import csv
+import io
+import json
+import math
+import mmap
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from rest_framework import serializers
+
+from .serializers import validate_feature_names
+
+# Apache Arrow (instalar: pip install pyarrow); sem ele, CSV é lido com o
+# módulo csv e Parquet não é suportado
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+ID_COLUMN = "customer_id"
+# Coluna opcional com todas as features: map<string, valor> no Parquet (como
+# no export Arrow sem `fields`) ou um objeto JSON por linha no CSV
+MAP_COLUMN = "features"
+# Colunas de metadados (ex.: de um export) que não são features
+IGNORED_COLUMNS = frozenset(
+    {"model_version", "calculated_at", "expires_at", "updated_at", "content_hash"}
+)
+# Mesmo limite do FeatureSerializer
+CUSTOMER_ID_MAX_LENGTH = 100
+
+# Células do CSV tratadas como ausentes (a feature fica fora do documento)
+NULL_VALUES = ["", "NA", "N/A", "NaN", "nan", "null", "NULL", "None"]
+_INT_PATTERN = r"^[+-]?\d+$"
+_INT_RE = re.compile(_INT_PATTERN)
+
+# Serviço e ritmo do processo de carga (criados uma vez por processo do pool)
+_worker_service = None
+_worker_pacer = None
+
+# Pedaço do arquivo: (início, fim, bytes) no CSV ou (row group, linhas, bytes)
+# no Parquet
+Piece = Tuple[int, int, int]
+
+
+def detect_format(path: str) -> Optional[str]:
+    """ "csv" ou "parquet" pela extensão do arquivo"""
+    name = path.lower()
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".csv", ".txt")):
+        return "csv"
+    return None
+
+
+def read_columns(path: str, fmt: str) -> List[str]:
+    """Nomes das colunas (cabeçalho do CSV ou schema do Parquet)"""
+    if fmt == "parquet":
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader([f.readline()]), [])
+
+
+def validate_columns(columns: List[str]) -> List[str]:
+    """
+    Colunas de features do arquivo
+
+    Raises:
+        ValueError: Sem coluna customer_id ou com nomes inválidos no MongoDB
+    """
+    if ID_COLUMN not in columns:
+        raise ValueError(f"Missing '{ID_COLUMN}' column")
+    features = [
+        name
+        for name in columns
+        if name not in IGNORED_COLUMNS and name not in (ID_COLUMN, MAP_COLUMN)
+    ]
+    try:
+        validate_feature_names(features)
+    except serializers.ValidationError as e:
+        raise ValueError(str(e.detail[0]))
+    if not features and MAP_COLUMN not in columns:
+        raise ValueError("No feature columns")
+    return features
+
+
+def plan_pieces(path: str, fmt: str, range_bytes: int) -> List[Piece]:
+    """
+    Divide o arquivo em pedaços independentes
+
+    CSV: faixas de ~`range_bytes` após o cabeçalho, estendidas até a próxima
+    quebra de linha (cada registro em uma linha; campos com quebras de linha
+    não são suportados). Parquet: um pedaço por row group.
+    """
+    if fmt == "parquet":
+        metadata = pq.ParquetFile(path).metadata
+        pieces = []
+        for index in range(metadata.num_row_groups):
+            group = metadata.row_group(index)
+            size = sum(
+                group.column(column).total_compressed_size
+                for column in range(group.num_columns)
+            )
+            pieces.append((index, group.num_rows, size))
+        return pieces
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = data.find(b"\n") + 1
+            if start == 0:
+                return []
+            pieces = []
+            while start < size:
+                end = min(size, start + range_bytes)
+                if end < size:
+                    newline = data.find(b"\n", end - 1)
+                    end = size if newline < 0 else newline + 1
+                pieces.append((start, end, end - start))
+                start = end
+    return pieces
+
+
+def piece_key(piece: Piece) -> str:
+    return f"{piece[0]}-{piece[1]}"
+
+
+def parse_value(text: Optional[str]) -> Any:
+    """
+    Célula de texto → int, float ou a própria string (None se ausente)
+
+    Segue o JSON: "5" vira int e "5.0" vira float, então o mesmo arquivo
+    gera os mesmos tipos (e o mesmo content_hash) que um POST em lote.
+    """
+    if text is None or text in NULL_VALUES:
+        return None
+    if _INT_RE.match(text):
+        return int(text)
+    if "_" not in text:
+        try:
+            return float(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _convert_strings(array: "pa.Array") -> List[Any]:
+    """`parse_value` vetorizado: casts do Arrow, com fallback por valor"""
+    try:
+        floats = pc.cast(array, pa.float64())
+        is_int = pc.match_substring_regex(array, _INT_PATTERN)
+        ints = pc.cast(
+            pc.if_else(is_int, array, pa.scalar(None, pa.string())), pa.int64()
+        )
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Coluna com texto (ou inteiros acima de int64)
+        return [parse_value(value) for value in array.to_pylist()]
+    return [
+        number if number is not None else real
+        for number, real in zip(ints.to_pylist(), floats.to_pylist())
+    ]
+
+
+def _csv_batches(
+    path: str,
+    start: int,
+    end: int,
+    columns: List[str],
+    batch_rows: int,
+    stats: Dict[str, int],
+) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Lotes colunares de uma faixa de bytes do CSV (sem copiar o arquivo)
+
+    Linhas com número de colunas diferente do cabeçalho são descartadas e
+    contadas em `stats["invalid"]`.
+    """
+
+    def skip(row) -> str:
+        stats["invalid"] += 1
+        return "skip"
+
+    if ARROW_AVAILABLE:
+        with pa.memory_map(path) as source:
+            table = pa_csv.read_csv(
+                pa.BufferReader(source.read_at(end - start, start)),
+                read_options=pa_csv.ReadOptions(column_names=columns),
+                parse_options=pa_csv.ParseOptions(invalid_row_handler=skip),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types={name: pa.string() for name in columns},
+                    null_values=NULL_VALUES,
+                    strings_can_be_null=True,
+                ),
+            )
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            yield {
+                name: (
+                    _convert_strings(batch.column(index))
+                    if name not in (ID_COLUMN, MAP_COLUMN)
+                    else batch.column(index).to_pylist()
+                )
+                for index, name in enumerate(columns)
+            }
+        return
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode("utf-8")
+    rows = csv.reader(io.StringIO(text, newline=""))
+    while True:
+        batch = [row for _, row in zip(range(batch_rows), rows)]
+        if not batch:
+            return
+        values = []
+        for row in batch:
+            if len(row) == len(columns):
+                values.append(row)
+            elif row:
+                skip(row)
+        yield {
+            name: [
+                (
+                    parse_value(row[index])
+                    if name not in (ID_COLUMN, MAP_COLUMN)
+                    else row[index] or None
+                )
+                for row in values
+            ]
+            for index, name in enumerate(columns)
+        }
+
+
+def _parquet_batches(
+    path: str, row_group: int, columns: List[str], batch_rows: int
+) -> Iterator[Dict[str, List[Any]]]:
+    """Lotes colunares de um row group do Parquet (arquivo mapeado em memória)"""
+    source = pq.ParquetFile(path, memory_map=True)
+    for batch in source.iter_batches(
+        batch_size=batch_rows, row_groups=[row_group], columns=columns
+    ):
+        yield {
+            name: batch.column(index).to_pylist()
+            for index, name in enumerate(batch.schema.names)
+        }
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and not math.isfinite(value))
+
+
+def to_features_list(
+    columns: Dict[str, List[Any]], feature_columns: List[str]
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Lote colunar → formato de `bulk_set_features`
+
+    Células ausentes ficam fora do documento. Linhas sem customer_id
+    válido, sem nenhuma feature ou com nomes inválidos na coluna `features`
+    são descartadas.
+
+    Returns:
+        (features_list, linhas descartadas)
+    """
+    ids = columns[ID_COLUMN]
+    maps = columns.get(MAP_COLUMN)
+    values = [(name, columns[name]) for name in feature_columns]
+
+    features_list = []
+    invalid = 0
+    for row, customer in enumerate(ids):
+        if customer is None or not str(customer).strip():
+            invalid += 1
+            continue
+        customer = str(customer)
+        if len(customer) > CUSTOMER_ID_MAX_LENGTH:
+            invalid += 1
+            continue
+
+        features = {}
+        if maps is not None and maps[row] is not None:
+            try:
+                entry = maps[row]
+                entry = json.loads(entry) if isinstance(entry, str) else dict(entry)
+                validate_feature_names(entry)
+            except (ValueError, TypeError, serializers.ValidationError):
+                invalid += 1
+                continue
+            features.update(
+                (str(name), value)
+                for name, value in entry.items()
+                if not _is_missing(value)
+            )
+        for name, column in values:
+            if not _is_missing(column[row]):
+                features[name] = column[row]
+
+        if not features:
+            invalid += 1
+            continue
+        features_list.append({"customer_id": customer, "features": features})
+    return features_list, invalid
+
+
+class RatePacer:
+    """Limita as linhas gravadas por segundo deste processo (0 = sem limite)"""
+
+    def __init__(self, rows_per_second: float = 0):
+        self.rows_per_second = rows_per_second
+        self.started = None
+        self.rows = 0
+
+    def wait(self, rows: int) -> None:
+        """Espera até que gravar mais `rows` linhas respeite o limite"""
+        if not self.rows_per_second:
+            return
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+        delay = self.started + self.rows / self.rows_per_second - now
+        self.rows += rows
+        if delay > 0:
+            time.sleep(delay)
+
+
+def init_worker(service_kwargs: Dict[str, Any], rows_per_second: float = 0) -> None:
+    """Inicializador do pool: uma conexão Redis/MongoDB por processo"""
+    global _worker_service, _worker_pacer
+    from .services import FeaturesService
+
+    _worker_service = FeaturesService(**service_kwargs)
+    _worker_pacer = RatePacer(rows_per_second)
+
+
+def import_piece(
+    path: str,
+    fmt: str,
+    piece: Piece,
+    columns: List[str],
+    feature_columns: List[str],
+    model_version: str,
+    ttl_days: int,
+    batch_rows: int,
+) -> Dict[str, int]:
+    """Lê um pedaço e grava com `bulk_set_features` (executado no pool)"""
+    stats = {"rows": 0, "success": 0, "failed": 0, "unchanged": 0, "invalid": 0}
+    if fmt == "parquet":
+        read = [name for name in columns if name not in IGNORED_COLUMNS]
+        batches = _parquet_batches(path, piece[0], read, batch_rows)
+    else:
+        batches = _csv_batches(path, piece[0], piece[1], columns, batch_rows, stats)
+
+    for batch in batches:
+        features_list, invalid = to_features_list(batch, feature_columns)
+        stats["rows"] += len(batch[ID_COLUMN])
+        stats["invalid"] += invalid
+        if not features_list:
+            continue
+        _worker_pacer.wait(len(features_list))
+        result = _worker_service.bulk_set_features(
+            features_list=features_list, model_version=model_version, ttl_days=ttl_days
+        )
+        for name in ("success", "failed", "unchanged"):
+            stats[name] += result[name]
+    return stats
+
+
+def source_fingerprint(
+    path: str, fmt: str, model_version: str, range_bytes: int
+) -> Dict[str, Any]:
+    """Identifica o arquivo e a divisão em pedaços de uma carga (retomada)"""
+    info = os.stat(path)
+    return {
+        "source": os.path.abspath(path),
+        "size": info.st_size,
+        "mtime_ns": info.st_mtime_ns,
+        "format": fmt,
+        "model_version": model_version,
+        "range_bytes": range_bytes if fmt == "csv" else None,
+    }
+
+
+def load_state(state_path: str, fingerprint: Dict[str, Any]) -> Set[str]:
+    """
+    Pedaços já gravados por uma execução anterior da mesma carga
+
+    Raises:
+        ValueError: Se o arquivo de estado for de outra carga (outro arquivo,
+            arquivo alterado, outra versão ou outra divisão)
+    """
+    if not os.path.exists(state_path):
+        return set()
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("fingerprint") != fingerprint:
+        raise ValueError(
+            f"{state_path} belongs to a different import (source file, "
+            "model version or --range-mb changed)"
+        )
+    return set(state.get("done", []))
+
+
+def save_state(state_path: str, fingerprint: Dict[str, Any], done: Set[str]) -> None:
+    """Grava o estado de forma atômica (arquivo temporário + rename)"""
+    temporary = f"{state_path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "done": sorted(done)}, f)
+    os.replace(temporary, state_path)
@@ -0,0 +1,194 @@
+"""
+Feature Loader
+Camada L3: calcula sob demanda, em um pool limitado, as features de clientes
+que não estão no Redis nem no MongoDB
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# compute_fn(customer_ids, model_version) → {customer_id: features}; clientes
+# omitidos (ou com features vazias) continuam não encontrados
+ComputeFn = Callable[[List[str], str], Dict[str, Dict[str, Any]]]
+# store_fn(computed, model_version) → {customer_id: documento gravado}
+StoreFn = Callable[[Dict[str, Dict[str, Any]], str], Dict[str, Dict[str, Any]]]
+
+
+class FeatureLoader:
+    """
+    Executa `compute_fn` em um pool de threads ou processos, com deduplicação
+
+    - Cada chave (customer_id, model_version) é calculada uma vez por vez:
+      quem pede uma chave já em cálculo espera o mesmo resultado
+    - `load_many` envia as chaves novas em uma única chamada a `compute_fn`
+    - No máximo `max_pending` chaves em cálculo; acima disso o pedido é
+      recusado (None) em vez de crescer a fila do pool
+    - Quem espera mais que `timeout` segundos recebe None, mas o cálculo
+      continua e o resultado é gravado (a próxima leitura o encontra)
+    - O resultado é gravado por `store_fn` (write-through no MongoDB e no
+      Redis) antes de ser entregue
+
+    Com `use_processes`, `compute_fn` precisa ser importável pelo nome
+    (função de módulo); a gravação acontece no processo que pediu. O pool é
+    criado no primeiro uso (seguro após fork).
+    """
+
+    def __init__(
+        self,
+        compute_fn: ComputeFn,
+        store_fn: StoreFn,
+        max_workers: int = 4,
+        timeout: float = 2.0,
+        max_pending: int = 1000,
+        use_processes: bool = False,
+    ):
+        self.compute_fn = compute_fn
+        self.store_fn = store_fn
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Any, Future] = {}
+        self.batches = 0
+        self.computed = 0
+        self.not_computed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def load_many(
+        self, customer_ids: List[str], model_version: str
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Documentos calculados (e gravados) por customer_id, ou None se o
+        cálculo não os encontrou; clientes recusados, ainda em cálculo após o
+        timeout ou cujo cálculo/gravação falhou ficam de fora (sem resposta
+        definitiva, então não geram cache negativo)
+        """
+        futures: Dict[str, Future] = {}
+        submit = []
+        with self._lock:
+            for customer_id in dict.fromkeys(customer_ids):
+                key = (customer_id, model_version)
+                future = self._in_flight.get(key)
+                if future is not None:
+                    self.deduplicated += 1
+                elif len(self._in_flight) >= self.max_pending:
+                    self.rejected += 1
+                    continue
+                else:
+                    future = self._in_flight[key] = Future()
+                    submit.append(customer_id)
+                futures[customer_id] = future
+
+        if submit:
+            self._submit(submit, model_version)
+
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        deadline = time.monotonic() + self.timeout
+        for customer_id, future in futures.items():
+            try:
+                results[customer_id] = future.result(
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+            except FutureTimeout:
+                with self._lock:
+                    self.timeouts += 1
+            except Exception:
+                pass  # Já registrado em _finish e contado em failed
+        return results
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    executor_class = (
+                        ProcessPoolExecutor
+                        if self.use_processes
+                        else ThreadPoolExecutor
+                    )
+                    self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    def _submit(self, customer_ids: List[str], model_version: str) -> None:
+        with self._lock:
+            self.batches += 1
+        try:
+            batch = self._get_executor().submit(
+                self.compute_fn, customer_ids, model_version
+            )
+        except Exception as e:
+            self._finish(customer_ids, model_version, None, e)
+            return
+        batch.add_done_callback(
+            lambda done: self._finish(customer_ids, model_version, done)
+        )
+
+    def _finish(
+        self,
+        customer_ids: List[str],
+        model_version: str,
+        batch: Optional[Future],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Grava o resultado do lote e libera quem espera por suas chaves"""
+        docs: Dict[str, Dict[str, Any]] = {}
+        try:
+            if error is None:
+                error = batch.exception()
+            if error is None:
+                computed = batch.result() or {}
+                computed = {
+                    customer_id: computed[customer_id]
+                    for customer_id in customer_ids
+                    if computed.get(customer_id)
+                }
+                if computed:
+                    docs = self.store_fn(computed, model_version)
+        except Exception as e:
+            error = e
+        if error is not None:
+            logger.error(
+                f"Feature loader error for {len(customer_ids)} customers: {error}"
+            )
+
+        with self._lock:
+            if error is not None:
+                self.failed += len(customer_ids)
+            else:
+                self.computed += len(docs)
+                self.not_computed += len(customer_ids) - len(docs)
+            futures = [
+                self._in_flight.pop((customer_id, model_version))
+                for customer_id in customer_ids
+            ]
+        for customer_id, future in zip(customer_ids, futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(docs.get(customer_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pool": "processes" if self.use_processes else "threads",
+                "max_workers": self.max_workers,
+                "timeout_ms": self.timeout * 1000,
+                "in_flight": len(self._in_flight),
+                "batches": self.batches,
+                "computed": self.computed,
+                "not_computed": self.not_computed,
+                "failed": self.failed,
+                "deduplicated": self.deduplicated,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
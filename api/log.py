@@ -0,0 +1,109 @@
+"""
+Cache event logging
+Handler assíncrono (fila + thread) e amostragem por tipo de evento, configurados em LOGGING
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from typing import Dict, Optional
+
+# Contadores por evento: total recebido e quantos foram suprimidos pela amostragem
+_event_counters: Dict[str, Dict[str, int]] = {}
+_event_counters_lock = threading.Lock()
+
+
+def get_event_counters() -> Dict[str, Dict[str, int]]:
+    """Retorna uma cópia dos contadores de eventos de cache deste processo"""
+    with _event_counters_lock:
+        return {event: dict(counts) for event, counts in _event_counters.items()}
+
+
+class CacheEventSampler(logging.Filter):
+    """
+    Filtro que amostra registros por tipo de evento (`extra={"event": ...}`)
+
+    Exemplo em LOGGING:
+        "filters": {
+            "cache_sampling": {
+                "()": "api.log.CacheEventSampler",
+                "rates": {"hit": 0.01, "error": 1.0},
+                "default_rate": 1.0,
+            }
+        }
+
+    Todo evento é contado, inclusive os suprimidos (ver `get_event_counters`).
+    Registros sem `event` sempre passam.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate=1.0):
+        super().__init__()
+        self.rates = rates or {}
+        self.default_rate = default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        if event is None:
+            return True
+
+        rate = self.rates.get(event, self.default_rate)
+        keep = rate >= 1.0 or random.random() < rate
+
+        with _event_counters_lock:
+            counts = _event_counters.get(event)
+            if counts is None:
+                counts = _event_counters[event] = {"total": 0, "suppressed": 0}
+            counts["total"] += 1
+            if not keep:
+                counts["suppressed"] += 1
+
+        return keep
+
+
+class AsyncStreamHandler(logging.handlers.QueueHandler):
+    """
+    Handler que enfileira os registros e escreve no stream numa thread própria
+
+    A formatação também acontece na thread de escrita (os registros vão para a
+    fila sem formatar), então a thread da requisição só paga o `put`. Com a
+    fila cheia o registro é descartado e contado em `dropped`. A thread é
+    recriada no processo filho após um fork (workers pré-forkados).
+    """
+
+    def __init__(self, stream=None, queue_size: int = 10000):
+        self.queue_size = queue_size
+        self.target = logging.StreamHandler(stream)
+        self.dropped = 0
+        self.listener = None
+        super().__init__(queue.Queue(queue_size))
+        self._start_listener()
+        os.register_at_fork(after_in_child=self._start_listener)
+        atexit.register(self._stop_listener)
+
+    def _start_listener(self):
+        self.queue = queue.Queue(self.queue_size)
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def _stop_listener(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Sem formatar: o listener formata ao escrever
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,118 @@
+"""
+Management command to compare in-process throughput of the Django ASGI
+application and the raw ASGI fast path on feature cache hits
+"""
+
+import asyncio
+import time
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+
+from api.fastpath import AIOREDIS_AVAILABLE, FeatureFastPath, get_fast_path_counters
+
+
+def build_scope(customer_id):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": f"/api/features/{customer_id}/",
+        "raw_path": f"/api/features/{customer_id}/".encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"accept", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+
+
+async def request(app, scope):
+    """Run one request through `app`, returning the status code"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+
+async def run(app, scope, count, concurrency):
+    """Requests per second for `count` requests, `concurrency` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await request(app, scope)
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(one() for _ in range(count)))
+    return count / (time.perf_counter() - started), statuses
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GET /api/features/<id>/ cache hits through the Django ASGI "
+        "application and through the raw fast path (ASGI_FAST_PATH)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "customer_id",
+            help="Customer with features stored (it is cached before timing)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=5000,
+            help="Timed requests per application (default: 5000)",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Requests in flight at a time (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        if not AIOREDIS_AVAILABLE:
+            raise CommandError("redis.asyncio (redis-py >= 4.2) is required")
+        asyncio.run(self.benchmark(options))
+
+    async def benchmark(self, options):
+        django_app = get_asgi_application()
+        fast_app = FeatureFastPath(django_app)
+        scope = build_scope(options["customer_id"])
+
+        # First request backfills Redis; a few more warm both applications
+        if await request(django_app, scope) != 200:
+            raise CommandError(f"No features for {options['customer_id']}")
+        hits = get_fast_path_counters()["hit"]
+        for _ in range(100):
+            await request(django_app, scope)
+            await request(fast_app, scope)
+        if get_fast_path_counters()["hit"] == hits:
+            raise CommandError("The fast path did not answer (is Redis available?)")
+
+        count, concurrency = options["requests"], options["concurrency"]
+        self.stdout.write(f"{count} requests, {concurrency} concurrent, one process\n")
+        self.stdout.write(f"{'application':<12} {'req/s':>10}")
+        results = {}
+        for name, app in (("django", django_app), ("fast path", fast_app)):
+            rate, statuses = await run(app, scope, count, concurrency)
+            if any(status != 200 for status in statuses):
+                raise CommandError(f"{name}: non-200 responses during the run")
+            results[name] = rate
+            self.stdout.write(f"{name:<12} {rate:>10.0f}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nFast path: {results['fast path'] / results['django']:.1f}x "
+                "the Django throughput on cache hits"
+            )
+        )
@@ -0,0 +1,164 @@
+"""
+Management command to compare index size and lookup latency of the MongoDB
+feature layouts (compound key vs _id = "<model_version>:<customer_id>")
+"""
+
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api import synthetic
+from api.services import FeaturesService, create_feature_indexes
+
+MODEL_VERSION = "v1.0.0"
+
+
+def build_documents(start, count, seed, width):
+    """Feature documents shaped like the ones written by bulk_set_features"""
+    if synthetic.NUMPY_AVAILABLE:
+        items = synthetic.generate_chunk(start, count, seed, width)
+    else:
+        rng = random.Random(seed + start)
+        items = [
+            {
+                "customer_id": synthetic.customer_id(start + offset + 1, width),
+                "features": {
+                    name: round(rng.uniform(low, high), 2)
+                    for name, (_, low, high) in synthetic.FEATURE_SPECS.items()
+                },
+            }
+            for offset in range(count)
+        ]
+    return [
+        {
+            "customer_id": item["customer_id"],
+            "features": item["features"],
+            "calculated_at": "2025-11-02T10:00:00.000000Z",
+            "model_version": MODEL_VERSION,
+            "expires_at": None,
+            "updated_at": None,
+        }
+        for item in items
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the same synthetic documents into a compound-key and an "
+        "_id-keyed scratch collection and compare index sizes and lookups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=100000,
+            help="Documents per layout (default: 100000)",
+        )
+        parser.add_argument(
+            "--lookups",
+            type=int,
+            default=5000,
+            help="Timed find_one lookups per layout (default: 5000)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Documents per insert_many (default: 10000)",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the scratch collections for manual inspection",
+        )
+
+    def handle(self, *args, **options):
+        service = FeaturesService(
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            use_redis=False,
+        )
+        if not service.use_mongo:
+            raise CommandError("MongoDB is required for the benchmark")
+        database = service.mongo_collection.database
+
+        count = options["count"]
+        width = synthetic.id_width(count)
+        layouts = {
+            "compound": database["benchmark_layout_compound"],
+            "id": database["benchmark_layout_id"],
+        }
+
+        self.stdout.write(
+            self.style.WARNING(f"Loading {count} documents per layout...")
+        )
+        for layout, collection in layouts.items():
+            keyed_by_id = layout == "id"
+            collection.drop()
+            create_feature_indexes(collection, keyed_by_id)
+            for start, size in synthetic.chunk_ranges(count, options["batch_size"]):
+                docs = build_documents(start, size, 42, width)
+                if keyed_by_id:
+                    for doc in docs:
+                        doc["_id"] = service._get_document_id(
+                            doc["customer_id"], MODEL_VERSION
+                        )
+                collection.insert_many(docs, ordered=False)
+
+        rng = random.Random(7)
+        sample = [
+            synthetic.customer_id(rng.randint(1, count), width)
+            for _ in range(options["lookups"])
+        ]
+        filters = {
+            "compound": lambda c: {"customer_id": c, "model_version": MODEL_VERSION},
+            "id": lambda c: {"_id": service._get_document_id(c, MODEL_VERSION)},
+        }
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'layout':<10} {'indexes MB':>10} {'lookup p50 µs':>14} "
+            f"{'lookup p99 µs':>14} {'keys examined':>14}"
+        )
+        for layout, collection in layouts.items():
+            build_filter = filters[layout]
+            # Warm pass so both layouts are measured with a hot cache
+            for customer_id in sample[:1000]:
+                collection.find_one(build_filter(customer_id), {"_id": 0})
+            timings = []
+            for customer_id in sample:
+                started = time.perf_counter()
+                collection.find_one(build_filter(customer_id), {"_id": 0})
+                timings.append((time.perf_counter() - started) * 1_000_000)
+
+            try:
+                index_mb = (
+                    database.command("collStats", collection.name)["totalIndexSize"]
+                    / 1024
+                    / 1024
+                )
+                index_size = f"{index_mb:.1f}"
+            except Exception:
+                index_size = "n/a"
+            try:
+                plan = collection.find(build_filter(sample[0])).explain()
+                keys_examined = plan["executionStats"]["totalKeysExamined"]
+            except Exception:
+                keys_examined = "n/a"
+
+            self.stdout.write(
+                f"{layout:<10} {index_size:>10} "
+                f"{statistics.median(timings):>14.0f} "
+                f"{percentile(timings, 0.99):>14.0f} {keys_examined!s:>14}"
+            )
+
+        if not options["keep"]:
+            for collection in layouts.values():
+                collection.drop()
@@ -0,0 +1,119 @@
+"""
+Management command to compare serialization time of the response renderers
+"""
+
+import gzip
+import random
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.middleware import ZSTD_AVAILABLE
+from api.renderers import MSGPACK_AVAILABLE, ORJSON_AVAILABLE
+from api.renderers import MessagePackRenderer, ORJSONRenderer
+from api.serializers import FeatureSerializer
+
+if ZSTD_AVAILABLE:
+    import zstandard
+
+
+def build_documents(count, num_features):
+    """Feature documents shaped like GET /api/features/<id>/ responses"""
+    rng = random.Random(42)
+    return [
+        FeatureSerializer(
+            {
+                "customer_id": f"CUST{i:08d}",
+                "features": {
+                    f"feature_{j:03d}": round(rng.random(), 6)
+                    for j in range(num_features)
+                },
+                "calculated_at": "2025-11-02T10:00:00.000000Z",
+                "model_version": "v1.0.0",
+                "expires_at": "2025-11-09 10:00:00.000000",
+            }
+        ).data
+        for i in range(count)
+    ]
+
+
+def median_ms(func, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark serialization (JSON, orjson, msgpack) and response "
+        "compression (gzip, zstd) on single-document and bulk payloads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--bulk-size",
+            type=int,
+            default=1000,
+            help="Documents in the bulk payload (default: 1000)",
+        )
+        parser.add_argument(
+            "--features",
+            type=int,
+            default=30,
+            help="Features per document (default: 30)",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=50,
+            help="Timed runs per measurement (default: 50)",
+        )
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        documents = build_documents(options["bulk_size"], options["features"])
+        payloads = {
+            "single": documents[0],
+            f"bulk x{len(documents)}": {"results": documents},
+        }
+
+        renderers = {"json (DRF)": JSONRenderer()}
+        if ORJSON_AVAILABLE:
+            renderers["orjson"] = ORJSONRenderer()
+        else:
+            self.stdout.write(self.style.WARNING("orjson not installed, skipping"))
+        if MSGPACK_AVAILABLE:
+            renderers["msgpack"] = MessagePackRenderer()
+        else:
+            self.stdout.write(self.style.WARNING("msgpack not installed, skipping"))
+
+        compressors = {
+            "gzip": lambda body: gzip.compress(
+                body, compresslevel=settings.GZIP_COMPRESSION_LEVEL, mtime=0
+            )
+        }
+        if ZSTD_AVAILABLE:
+            compressors["zstd"] = lambda body: zstandard.ZstdCompressor(
+                level=settings.ZSTD_COMPRESSION_LEVEL
+            ).compress(body)
+
+        for payload_name, data in payloads.items():
+            self.stdout.write(self.style.SUCCESS(f"\n{payload_name}"))
+            for name, renderer in renderers.items():
+                body = renderer.render(data)
+                elapsed = median_ms(lambda: renderer.render(data), runs)
+                self.stdout.write(
+                    f"  {name:<12} render {elapsed:9.3f} ms  size {len(body):10d} B"
+                )
+                for encoding, compress in compressors.items():
+                    compressed = compress(body)
+                    elapsed = median_ms(lambda: compress(body), runs)
+                    self.stdout.write(
+                        f"    + {encoding:<8} {elapsed:9.3f} ms  "
+                        f"size {len(compressed):10d} B"
+                    )
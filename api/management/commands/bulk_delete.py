@@ -0,0 +1,94 @@
+"""
+Management command to bulk delete features by customer_id list and/or selectors
+"""
+
+import re
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.serializers import MODEL_VERSION_REGEX
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete features in batches (MongoDB delete_many + Redis UNLINK) by "
+        "customer_id list, prefix, model version and/or calculated_at range"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids-file",
+            help="File with one customer_id per line ('-' reads from stdin)",
+        )
+        parser.add_argument("--prefix", help="Delete customer_ids with this prefix")
+        parser.add_argument(
+            "--model-version", help="Only delete this model version (default: all)"
+        )
+        parser.add_argument(
+            "--calculated-after",
+            help="Only delete features calculated at or after this ISO date",
+        )
+        parser.add_argument(
+            "--calculated-before",
+            help="Only delete features calculated before this ISO date",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="IDs / Redis keys per batch (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        customer_ids = None
+        if options["ids_file"]:
+            source = (
+                sys.stdin
+                if options["ids_file"] == "-"
+                else open(options["ids_file"], encoding="utf-8")
+            )
+            with source:
+                customer_ids = [line.strip() for line in source if line.strip()]
+
+        model_version = options["model_version"]
+        if model_version and not re.match(MODEL_VERSION_REGEX, model_version):
+            raise CommandError(f"Invalid model version: {model_version}")
+
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            active_version_cache_ttl=0,
+        )
+
+        def progress(stats):
+            self.stdout.write(
+                f"  batch {stats['batches']}: "
+                f"{stats['mongo_documents']} MongoDB documents, "
+                f"{stats['redis_keys']} Redis keys removed so far"
+            )
+
+        try:
+            stats = service.bulk_delete_features(
+                customer_ids=customer_ids,
+                customer_id_prefix=options["prefix"],
+                model_version=model_version,
+                calculated_after=options["calculated_after"],
+                calculated_before=options["calculated_before"],
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Removed {stats['mongo_documents']} MongoDB documents and "
+                f"{stats['redis_keys']} Redis keys"
+            )
+        )
@@ -0,0 +1,117 @@
+"""
+Management command to export all features of a model version (NDJSON or Arrow)
+"""
+
+import re
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.export import ARROW_AVAILABLE, decode_cursor, iter_arrow, iter_ndjson
+from api.serializers import MODEL_VERSION_REGEX
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Export features in customer_id order with keyset pagination "
+        "(constant memory, resumable with --cursor)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "arrow"],
+            default="ndjson",
+            help="Output format (default: ndjson)",
+        )
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="Output file (default: stdout)",
+        )
+        parser.add_argument(
+            "--model-version", help="Model version to export (default: active)"
+        )
+        parser.add_argument(
+            "--fields", help="Comma-separated feature names (default: all)"
+        )
+        parser.add_argument(
+            "--cursor", help="Resume after the cursor printed by a previous run"
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Maximum documents (default: all)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Documents per MongoDB query / output chunk (default: 5000)",
+        )
+
+    def handle(self, *args, **options):
+        if options["format"] == "arrow" and not ARROW_AVAILABLE:
+            raise CommandError("Arrow export requires pyarrow (pip install pyarrow)")
+
+        model_version = options["model_version"]
+        after = None
+        if options["cursor"]:
+            try:
+                cursor_version, after = decode_cursor(options["cursor"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            if model_version and model_version != cursor_version:
+                raise CommandError("--cursor belongs to a different model version")
+            model_version = cursor_version
+        if model_version and not re.match(MODEL_VERSION_REGEX, model_version):
+            raise CommandError(f"Invalid model version: {model_version}")
+
+        fields = None
+        if options["fields"]:
+            fields = [name.strip() for name in options["fields"].split(",")]
+
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            use_redis=False,
+            active_version_cache_ttl=0,
+        )
+        if not service.use_mongo:
+            raise CommandError("MongoDB is required to export features")
+        model_version = model_version or service.get_active_version()
+
+        # Progress goes to stderr so the export can be piped from stdout
+        def progress(exported, cursor):
+            self.stderr.write(f"  {exported} documents exported (cursor {cursor})")
+
+        batches = service.export_features(
+            model_version=model_version,
+            after=after,
+            fields=fields,
+            batch_size=options["batch_size"],
+            limit=options["limit"],
+        )
+        if options["format"] == "arrow":
+            chunks = iter_arrow(batches, model_version, fields, progress)
+        else:
+            chunks = iter_ndjson(batches, model_version, options["limit"], progress)
+
+        output = (
+            sys.stdout.buffer
+            if options["output"] == "-"
+            else open(options["output"], "wb")
+        )
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        self.stderr.write(
+            self.style.SUCCESS(f"✓ Export of {model_version} finished"), ending="\n"
+        )
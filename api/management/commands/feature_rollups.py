@@ -0,0 +1,89 @@
+"""
+Management command to rebuild, checkpoint and show the running feature
+statistics of a model version
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the per-feature statistics of a model version, rebuild them "
+        "with one scan of MongoDB or checkpoint them from Redis to MongoDB"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model-version",
+            default=None,
+            help="Model version (default: active version)",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute from MongoDB (start the rollups or repair drift)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            action="store_true",
+            help="Copy the Redis statistics to MongoDB now",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Documents per MongoDB page when rebuilding (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            feature_rollups=True,
+            rollup_checkpoint_interval=0,
+        )
+        if not service.feature_rollups:
+            raise CommandError("Redis and MongoDB are required for feature rollups")
+
+        model_version = options["model_version"] or service.get_active_version()
+
+        if options["rebuild"]:
+            self.stdout.write(
+                self.style.WARNING(f"Scanning {model_version} documents...")
+            )
+            stats = service.rebuild_rollups(model_version, options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ Rebuilt {stats['features']} features from "
+                    f"{stats['documents']} documents"
+                )
+            )
+        elif options["checkpoint"]:
+            if not service.checkpoint_rollups(model_version):
+                raise CommandError(f"No statistics in Redis for {model_version}")
+            self.stdout.write(self.style.SUCCESS("✓ Checkpoint saved to MongoDB"))
+
+        rollups = service.get_feature_rollups(model_version)
+        if rollups is None:
+            raise CommandError("Feature statistics are unavailable")
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'feature':<24} {'count':>10} {'mean':>12} {'stddev':>12} "
+            f"{'min':>10} {'p50':>10} {'p99':>10} {'max':>10}"
+        )
+        for name, item in rollups["features"].items():
+            quantiles = item["quantiles"]
+            self.stdout.write(
+                f"{name:<24} {item['count']:>10} {item['mean']:>12.4g} "
+                f"{item['stddev']:>12.4g} {item['min']:>10.4g} "
+                f"{quantiles['p50']:>10.4g} {quantiles['p99']:>10.4g} "
+                f"{item['max']:>10.4g}"
+            )
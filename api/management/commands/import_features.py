@@ -0,0 +1,243 @@
+"""
+Management command to load CSV or Parquet feature dumps in parallel
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api import importer
+from api.serializers import MODEL_VERSION_REGEX
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a CSV or Parquet feature dump (one row per customer: a "
+        "customer_id column plus one column per feature) with bulk writes, "
+        "split across processes by byte ranges or row groups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="CSV or Parquet file to import")
+        parser.add_argument(
+            "--format",
+            choices=["auto", "csv", "parquet"],
+            default="auto",
+            help="File format (default: from the file extension)",
+        )
+        parser.add_argument(
+            "--model-version",
+            help="Model version of the imported features (default: the active version)",
+        )
+        parser.add_argument(
+            "--ttl-days",
+            type=int,
+            default=7,
+            help="Days until the imported features expire (default: 7)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per bulk write (default: 5000)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes reading and writing pieces (default: CPU count)",
+        )
+        parser.add_argument(
+            "--range-mb",
+            type=int,
+            default=64,
+            help="CSV bytes per piece, in MB (default: 64); Parquet files are "
+            "split by row group",
+        )
+        parser.add_argument(
+            "--max-rows-per-second",
+            type=float,
+            default=0,
+            help="Rate limit across all workers (default: 0, unlimited)",
+        )
+        parser.add_argument(
+            "--state-file",
+            help="Record finished pieces here; running again with the same "
+            "file resumes an interrupted import",
+        )
+        parser.add_argument(
+            "--skip-redis",
+            action="store_true",
+            help="Only write MongoDB (the cache fills on reads); rebuild the "
+            "Bloom filter afterwards",
+        )
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        if not os.path.isfile(source):
+            raise CommandError(f"File not found: {source}")
+        fmt = options["format"]
+        if fmt == "auto":
+            fmt = importer.detect_format(source)
+            if fmt is None:
+                raise CommandError("Unknown file extension: use --format")
+        if fmt == "parquet" and not importer.ARROW_AVAILABLE:
+            raise CommandError("Parquet import requires pyarrow (pip install pyarrow)")
+
+        model_version = options["model_version"]
+        if model_version is not None and not re.match(
+            MODEL_VERSION_REGEX, model_version
+        ):
+            raise CommandError(f"Invalid model version: {model_version}")
+        if options["batch_size"] < 1 or options["range_mb"] < 1:
+            raise CommandError("--batch-size and --range-mb must be positive")
+
+        service_kwargs = {
+            "redis_host": settings.REDIS_HOST,
+            "redis_port": settings.REDIS_PORT,
+            "redis_db": settings.REDIS_DB,
+            "redis_ttl": settings.REDIS_TTL,
+            "mongo_uri": settings.MONGO_URI,
+            "mongo_db": settings.MONGO_DB,
+            "mongo_layout": settings.MONGO_LAYOUT,
+            "use_redis": not options["skip_redis"],
+        }
+        if model_version is None:
+            model_version = FeaturesService(**service_kwargs).get_active_version()
+
+        columns = importer.read_columns(source, fmt)
+        try:
+            feature_columns = importer.validate_columns(columns)
+        except ValueError as e:
+            raise CommandError(f"{source}: {e}")
+
+        range_bytes = options["range_mb"] * 1024 * 1024
+        pieces = importer.plan_pieces(source, fmt, range_bytes)
+
+        state_file = options["state_file"]
+        fingerprint = importer.source_fingerprint(
+            source, fmt, model_version, range_bytes
+        )
+        done = set()
+        if state_file:
+            try:
+                done = importer.load_state(state_file, fingerprint)
+            except ValueError as e:
+                raise CommandError(str(e))
+        pending = [p for p in pieces if importer.piece_key(p) not in done]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS("✓ Nothing to import"))
+            return
+
+        workers = max(1, min(options["workers"], len(pending)))
+        reader = "pyarrow" if importer.ARROW_AVAILABLE else "csv module"
+        self.stdout.write(
+            self.style.WARNING(
+                f"Importing {source} ({fmt}, {reader}) into {model_version}: "
+                f"{len(pending)} of {len(pieces)} pieces with {workers} worker(s)..."
+            )
+        )
+        # Each worker paces its own writes to an equal share of the limit
+        rows_per_second = options["max_rows_per_second"] / workers
+        import_args = (
+            columns,
+            feature_columns,
+            model_version,
+            options["ttl_days"],
+            options["batch_size"],
+        )
+
+        stats = {"rows": 0, "success": 0, "failed": 0, "unchanged": 0, "invalid": 0}
+        totals = {"bytes": 0, "errors": 0}
+        started = time.monotonic()
+
+        def add(piece, result, error=None):
+            if error is not None:
+                totals["errors"] += 1
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"  piece {importer.piece_key(piece)} failed: {error}"
+                    )
+                )
+                return
+            for name in stats:
+                stats[name] += result[name]
+            totals["bytes"] += piece[2]
+            if result["failed"]:
+                # Not recorded as done: a resumed import retries the piece
+                totals["errors"] += 1
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"  piece {importer.piece_key(piece)}: "
+                        f"{result['failed']} rows failed to store"
+                    )
+                )
+            else:
+                done.add(importer.piece_key(piece))
+                if state_file:
+                    importer.save_state(state_file, fingerprint, done)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  piece {len(done)}/{len(pieces)}: {stats['rows']} rows, "
+                f"{stats['rows'] / elapsed:,.0f} rows/s"
+            )
+
+        if workers == 1:
+            importer.init_worker(service_kwargs, rows_per_second)
+            for piece in pending:
+                try:
+                    result = importer.import_piece(source, fmt, piece, *import_args)
+                except Exception as e:
+                    add(piece, None, e)
+                else:
+                    add(piece, result)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=importer.init_worker,
+                initargs=(service_kwargs, rows_per_second),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        importer.import_piece, source, fmt, piece, *import_args
+                    ): piece
+                    for piece in pending
+                }
+                for future in as_completed(futures):
+                    error = future.exception()
+                    add(futures[future], None if error else future.result(), error)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write("")
+        self.stdout.write(f"{'rows read':<16} {stats['rows']:>14}")
+        self.stdout.write(f"{'stored':<16} {stats['success']:>14}")
+        self.stdout.write(f"{'unchanged':<16} {stats['unchanged']:>14}")
+        self.stdout.write(f"{'invalid rows':<16} {stats['invalid']:>14}")
+        self.stdout.write(f"{'failed':<16} {stats['failed']:>14}")
+        self.stdout.write(f"{'elapsed':<16} {elapsed:>13.1f}s")
+        self.stdout.write(
+            f"{'throughput':<16} {stats['rows'] / elapsed:>14,.0f} rows/s, "
+            f"{totals['bytes'] / elapsed / 1024 / 1024:.1f} MB/s"
+        )
+
+        if totals["errors"]:
+            hint = (
+                "; run again with the same --state-file to retry them"
+                if state_file
+                else ""
+            )
+            raise CommandError(f"{totals['errors']} piece(s) failed{hint}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"\n✓ Imported {stats['success']} customers")
+        )
+        if options["skip_redis"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Redis was skipped: run `manage.py rebuild_bloom_filter` "
+                    "so the new customers are not reported as unknown"
+                )
+            )
@@ -0,0 +1,73 @@
+"""
+Management command to measure application import/startup time per serving profile
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: loads the application the way a worker does
+# (settings, apps, URLconf and views) and reports time and imported modules
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from cache_project.{interface} import application
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{
+    "ms": elapsed,
+    "modules": len(sys.modules),
+    "drf_yasg": "drf_yasg" in sys.modules,
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure worker startup (application import) time for the full and lean profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Fresh interpreter runs per profile (default: 5)",
+        )
+        parser.add_argument(
+            "--interface",
+            choices=["wsgi", "asgi"],
+            default="wsgi",
+            help="Application module to load (default: wsgi)",
+        )
+
+    def handle(self, *args, **options):
+        probe = PROBE.format(interface=options["interface"])
+
+        self.stdout.write(
+            self.style.WARNING(
+                f"Loading cache_project.{options['interface']} "
+                f"{options['runs']} times per profile..."
+            )
+        )
+
+        for profile, lean in (("full", "False"), ("lean", "True")):
+            env = dict(os.environ, LEAN_MODE=lean)
+            results = []
+            for _ in range(options["runs"]):
+                output = subprocess.run(
+                    [sys.executable, "-c", probe],
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+
+            timings = [result["ms"] for result in results]
+            self.stdout.write(
+                f"  {profile:<5} median {statistics.median(timings):7.1f} ms  "
+                f"min {min(timings):7.1f} ms  "
+                f"modules {results[-1]['modules']:5d}  "
+                f"drf_yasg {'loaded' if results[-1]['drf_yasg'] else 'not loaded'}"
+            )
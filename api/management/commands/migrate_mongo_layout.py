@@ -0,0 +1,82 @@
+"""
+Management command to move feature documents to the _id-keyed MongoDB layout
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.services import FEATURES_BY_ID_COLLECTION, FeaturesService
+from api.services import create_feature_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Move documents from the compound-key collection to the _id-keyed one "
+        "in batches, with the API online (requires MONGO_LAYOUT=migrating)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Documents per batch (default: 1000)",
+        )
+        parser.add_argument(
+            "--drop-legacy",
+            action="store_true",
+            help="Drop the old collection once it is empty",
+        )
+
+    def handle(self, *args, **options):
+        if settings.MONGO_LAYOUT != "migrating":
+            raise CommandError(
+                "Set MONGO_LAYOUT=migrating (and restart the API) before migrating"
+            )
+
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            use_redis=False,
+        )
+        if not service.use_mongo:
+            raise CommandError("MongoDB is required to migrate the layout")
+
+        # The target needs its TTL/version indexes before receiving documents
+        create_feature_indexes(service.mongo_collection, keyed_by_id=True)
+
+        total = service.legacy_collection.estimated_document_count()
+        self.stdout.write(
+            self.style.WARNING(
+                f"Moving ~{total} documents to {FEATURES_BY_ID_COLLECTION}..."
+            )
+        )
+
+        def progress(stats):
+            self.stdout.write(
+                f"  batch {stats['batches']}: {stats['moved']} documents moved"
+            )
+
+        stats = service.migrate_layout(options["batch_size"], progress)
+        self.stdout.write(self.style.SUCCESS(f"✓ Moved {stats['moved']} documents"))
+
+        if stats["remaining"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{stats['remaining']} documents are still in the old "
+                    "collection (written by instances not yet running with "
+                    "MONGO_LAYOUT=migrating?): run the command again"
+                )
+            )
+        elif options["drop_legacy"]:
+            service.legacy_collection.drop()
+            self.stdout.write(self.style.SUCCESS("✓ Dropped the old collection"))
+
+        if not stats["remaining"]:
+            self.stdout.write(
+                "Set MONGO_LAYOUT=id and restart the API to finish the migration"
+            )
@@ -0,0 +1,106 @@
+"""
+Management command to manage model_version namespaces (status, warm, activate, purge)
+"""
+
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.serializers import MODEL_VERSION_REGEX
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage model versions: list them, warm a version into Redis, "
+        "switch the active version and purge old versions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["status", "warm", "activate", "purge"],
+            help="Operation to run",
+        )
+        parser.add_argument(
+            "version",
+            nargs="?",
+            help="Model version (required for warm, activate and purge)",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="With activate: warm the Redis cache before switching",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="With activate: switch even if the version has no documents",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Keys per Redis pipeline / UNLINK batch (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        version = options["version"]
+
+        if action != "status":
+            if not version:
+                raise CommandError(f"'{action}' requires a model version")
+            if not re.match(MODEL_VERSION_REGEX, version):
+                raise CommandError(f"Invalid model version: {version}")
+
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            active_version_cache_ttl=0,
+        )
+
+        if action == "status":
+            info = service.get_model_versions()
+            self.stdout.write(f"Active version:   {info['active_version']}")
+            self.stdout.write(f"Previous version: {info['previous_version']}")
+            for name, count in sorted(info["versions"].items()):
+                marker = "*" if name == info["active_version"] else " "
+                self.stdout.write(f"  {marker} {name}: {count} documents")
+
+        elif action == "warm":
+            warmed = service.warm_model_version(version, options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ Warmed {warmed} Redis keys for {version}")
+            )
+
+        elif action == "activate":
+            count = service.get_model_versions()["versions"].get(version, 0)
+            if count == 0 and not options["force"]:
+                raise CommandError(
+                    f"Model version {version} has no documents (use --force)"
+                )
+            if options["warm"]:
+                warmed = service.warm_model_version(version, options["batch_size"])
+                self.stdout.write(f"Warmed {warmed} Redis keys for {version}")
+            if not service.activate_model_version(version):
+                raise CommandError(f"Failed to activate model version {version}")
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ Active model version is now {version}")
+            )
+
+        elif action == "purge":
+            try:
+                stats = service.purge_model_version(version, options["batch_size"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ Removed {stats['redis_keys']} Redis keys and "
+                    f"{stats['mongo_documents']} MongoDB documents for {version}"
+                )
+            )
@@ -0,0 +1,38 @@
+"""
+Management command to create the MongoDB indexes of the configured layout
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the indexes of the feature collection(s) for MONGO_LAYOUT "
+        "(idempotent; run on deploy, the API does not create indexes)"
+    )
+
+    def handle(self, *args, **options):
+        service = FeaturesService(
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            use_redis=False,
+        )
+        if not service.use_mongo:
+            raise CommandError("MongoDB is required to create indexes")
+
+        for name, indexes in service.ensure_indexes().items():
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {name} ({settings.MONGO_LAYOUT} layout)")
+            )
+            database = service.mongo_collection.database
+            try:
+                sizes = database.command("collStats", name).get("indexSizes", {})
+            except Exception:
+                sizes = {}
+            for index in ["_id_", *indexes]:
+                size = sizes.get(index)
+                suffix = f" ({size / 1024 / 1024:.1f} MB)" if size is not None else ""
+                self.stdout.write(f"  • {index}{suffix}")
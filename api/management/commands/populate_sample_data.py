@@ -2,14 +2,19 @@
 Management command to populate sample data for testing the cache strategy
 """
 
-import random
-from django.core.management.base import BaseCommand
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from api.services import FeaturesService
+from api import synthetic
 
 
 class Command(BaseCommand):
-    help = "Populate sample customer features for testing the cache strategy"
+    help = (
+        "Populate sample customer features for testing the cache strategy, "
+        "and optionally write a Zipf-distributed access trace"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,61 +23,170 @@ class Command(BaseCommand):
             default=10,
             help="Number of sample customers to create (default: 10)",
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Customers generated and written per batch (default: 10000)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes generating and writing batches (default: CPU count)",
+        )
+        parser.add_argument(
+            "--model-version",
+            help="Model version of the generated features (default: the active version)",
+        )
+        parser.add_argument(
+            "--ttl-days",
+            type=int,
+            default=7,
+            help="Days until the generated features expire (default: 7)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed; the same seed produces the same data (default: 42)",
+        )
+        parser.add_argument(
+            "--skip-redis",
+            action="store_true",
+            help="Only write MongoDB (the cache fills on reads); rebuild the "
+            "Bloom filter afterwards",
+        )
+        parser.add_argument(
+            "--trace",
+            help="Also write a JSONL access trace to this path",
+        )
+        parser.add_argument(
+            "--trace-requests",
+            type=int,
+            default=1000000,
+            help="Reads in the access trace (default: 1000000)",
+        )
+        parser.add_argument(
+            "--zipf-s",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of customer popularity in the trace (default: 1.1)",
+        )
+        parser.add_argument(
+            "--miss-ratio",
+            type=float,
+            default=0.05,
+            help="Fraction of trace reads for unknown customers (default: 0.05)",
+        )
 
     def handle(self, *args, **options):
-        count = options["count"]
+        if not synthetic.NUMPY_AVAILABLE:
+            raise CommandError("Sample data generation requires numpy")
 
-        self.stdout.write(self.style.WARNING(f"Creating {count} sample customers..."))
+        count = options["count"]
+        seed = options["seed"]
+        width = synthetic.id_width(count)
+        chunks = list(synthetic.chunk_ranges(count, options["chunk_size"]))
+        workers = max(1, min(options["workers"], len(chunks)))
 
-        # Initialize service
-        service = FeaturesService(
-            redis_host=settings.REDIS_HOST,
-            redis_port=settings.REDIS_PORT,
-            redis_db=settings.REDIS_DB,
-            redis_ttl=settings.REDIS_TTL,
-            mongo_uri=settings.MONGO_URI,
-            mongo_db=settings.MONGO_DB,
+        self.stdout.write(
+            self.style.WARNING(
+                f"Creating {count} sample customers in {len(chunks)} batches "
+                f"with {workers} worker(s)..."
+            )
         )
 
-        # Generate sample data
-        features_list = []
-        for i in range(count):
-            customer_id = f"CUST{str(i + 1).zfill(5)}"
-            features = {
-                "payment_history_score": round(random.uniform(0.5, 1.0), 2),
-                "credit_utilization": round(random.uniform(0.1, 0.8), 2),
-                "account_age_months": random.randint(6, 120),
-                "recent_inquiries": random.randint(0, 5),
-                "debt_to_income": round(random.uniform(0.1, 0.6), 2),
-                "on_time_payments_pct": round(random.uniform(0.7, 1.0), 2),
-                "total_accounts": random.randint(1, 15),
-                "delinquent_accounts": random.randint(0, 3),
-                "credit_mix_score": round(random.uniform(0.5, 1.0), 2),
-                "length_of_credit_history": random.randint(12, 240),
-            }
-
-            features_list.append({"customer_id": customer_id, "features": features})
-
-        # Bulk insert
-        stats = service.bulk_set_features(
-            features_list=features_list, model_version="v1.0.0", ttl_days=7
+        service_kwargs = {
+            "redis_host": settings.REDIS_HOST,
+            "redis_port": settings.REDIS_PORT,
+            "redis_db": settings.REDIS_DB,
+            "redis_ttl": settings.REDIS_TTL,
+            "mongo_uri": settings.MONGO_URI,
+            "mongo_db": settings.MONGO_DB,
+            "mongo_layout": settings.MONGO_LAYOUT,
+            "use_redis": not options["skip_redis"],
+        }
+        model_version = (
+            options["model_version"]
+            or FeaturesService(**service_kwargs).get_active_version()
         )
+        load_args = (seed, width, model_version, options["ttl_days"])
+
+        stats = {"success": 0, "failed": 0, "unchanged": 0}
+
+        def add(result, done):
+            for name in stats:
+                stats[name] += result[name]
+            if len(chunks) > 1:
+                self.stdout.write(
+                    f"  batch {done}/{len(chunks)}: {stats['success']} stored"
+                )
+
+        if workers == 1:
+            synthetic.init_worker(service_kwargs)
+            for done, (start, size) in enumerate(chunks, 1):
+                add(synthetic.load_chunk(start, size, *load_args), done)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=synthetic.init_worker,
+                initargs=(service_kwargs,),
+            ) as executor:
+                futures = [
+                    executor.submit(synthetic.load_chunk, start, size, *load_args)
+                    for start, size in chunks
+                ]
+                for done, future in enumerate(as_completed(futures), 1):
+                    add(future.result(), done)
 
         self.stdout.write(
             self.style.SUCCESS(f"✓ Successfully created {stats['success']} customers")
         )
 
+        if stats["unchanged"] > 0:
+            self.stdout.write(
+                f"  {stats['unchanged']} customers were unchanged "
+                "(expiry extended, not rewritten)"
+            )
+
         if stats["failed"] > 0:
             self.stdout.write(
                 self.style.ERROR(f"✗ Failed to create {stats['failed']} customers")
             )
 
-        # Display sample
+        if options["skip_redis"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Redis was skipped: run `manage.py rebuild_bloom_filter` "
+                    "so the new customers are not reported as unknown"
+                )
+            )
+
+        # Display sample (regenerated: same seed, same data)
         self.stdout.write("\n" + self.style.WARNING("Sample data:"))
-        for item in features_list[:3]:
+        for item in synthetic.generate_chunk(0, min(3, count), seed, width):
             self.stdout.write(
                 f"  • {item['customer_id']}: {list(item['features'].keys())[:3]}..."
             )
 
+        if options["trace"]:
+            trace = synthetic.write_trace(
+                options["trace"],
+                num_customers=count,
+                num_requests=options["trace_requests"],
+                zipf_s=options["zipf_s"],
+                miss_ratio=options["miss_ratio"],
+                seed=seed,
+                width=width,
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ Wrote {trace['requests']} reads ({trace['misses']} for "
+                    f"unknown customers) to {options['trace']}"
+                )
+            )
+
+        first_id = synthetic.customer_id(1, width)
         self.stdout.write("\n" + self.style.SUCCESS("You can now test the API:"))
-        self.stdout.write(f"  curl http://localhost:8000/api/features/CUST00001/")
+        self.stdout.write(f"  curl http://localhost:8000/api/features/{first_id}/")
@@ -0,0 +1,76 @@
+"""
+Management command to rebuild the Bloom filter of known customers and the negative cache
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.services import FeaturesService
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Bloom filter of known customer_ids from MongoDB "
+        "and optionally clear negative cache entries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--capacity",
+            type=int,
+            default=None,
+            help=(
+                "Expected number of customers (default: the larger of "
+                "BLOOM_CAPACITY and twice the current document count)"
+            ),
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=settings.BLOOM_ERROR_RATE,
+            help=f"False positive rate (default: {settings.BLOOM_ERROR_RATE})",
+        )
+        parser.add_argument(
+            "--clear-negative-cache",
+            action="store_true",
+            help="Also remove all negative cache entries from Redis",
+        )
+
+    def handle(self, *args, **options):
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+        )
+
+        if not service.use_redis or not service.use_mongo:
+            raise CommandError("Redis and MongoDB are required to rebuild the filter")
+
+        capacity = options["capacity"]
+        if capacity is None:
+            documents = sum(
+                collection.estimated_document_count()
+                for collection in (service.mongo_collection, service.legacy_collection)
+                if collection is not None
+            )
+            capacity = max(settings.BLOOM_CAPACITY, 2 * documents)
+
+        self.stdout.write(
+            self.style.WARNING(
+                f"Rebuilding Bloom filter (capacity={capacity}, "
+                f"error_rate={options['error_rate']})..."
+            )
+        )
+        indexed = service.rebuild_bloom_filter(capacity, options["error_rate"])
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ Bloom filter rebuilt with {indexed} documents")
+        )
+
+        if options["clear_negative_cache"]:
+            removed = service.clear_negative_cache()
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ Removed {removed} negative cache entries")
+            )
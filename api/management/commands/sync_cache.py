@@ -0,0 +1,82 @@
+"""
+Management command to keep Redis in sync with writes made directly to MongoDB
+"""
+
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from api.services import FeaturesService
+from api.sync import CacheSyncWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Long-running worker that follows changes in customer_features "
+        "(change streams or updated_at polling) and refreshes Redis"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=["auto", "change_stream", "polling"],
+            default="auto",
+            help="Change detection mode (default: auto, change streams if available)",
+        )
+        parser.add_argument(
+            "--invalidate",
+            action="store_true",
+            help="Delete changed keys instead of rewriting them",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Maximum changes per Redis pipeline (default: 500)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when there are no changes (default: 1.0)",
+        )
+
+    def handle(self, *args, **options):
+        service = FeaturesService(
+            redis_host=settings.REDIS_HOST,
+            redis_port=settings.REDIS_PORT,
+            redis_db=settings.REDIS_DB,
+            redis_ttl=settings.REDIS_TTL,
+            mongo_uri=settings.MONGO_URI,
+            mongo_db=settings.MONGO_DB,
+            mongo_layout=settings.MONGO_LAYOUT,
+            bloom_refresh_interval=settings.BLOOM_REFRESH_INTERVAL,
+        )
+
+        if not service.use_redis or not service.use_mongo:
+            raise CommandError("Redis and MongoDB are required to sync the cache")
+
+        worker = CacheSyncWorker(
+            service,
+            mode=options["mode"],
+            invalidate=options["invalidate"],
+            batch_size=options["batch_size"],
+            poll_interval=options["poll_interval"],
+        )
+
+        def stop(signum, frame):
+            self.stdout.write(self.style.WARNING("Stopping cache sync..."))
+            worker.stop()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(self.style.WARNING("Starting cache sync worker..."))
+        worker.run()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ Cache sync stopped: {worker.stats['refreshed']} refreshed, "
+                f"{worker.stats['invalidated']} invalidated "
+                f"in {worker.stats['batches']} batches"
+            )
+        )
@@ -0,0 +1,207 @@
+"""
+Request timing, sampled profiling and response compression middleware
+"""
+
+import cProfile
+import gzip
+import itertools
+import logging
+import os
+import re
+import time
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .timing import current_timings, end_request_timings, phase, start_request_timings
+
+# Zstandard (instalar: pip install zstandard)
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """
+    Collects per-phase timings for each request
+
+    - SERVER_TIMING_ENABLED: adds a `Server-Timing` header with the phases
+      recorded by FeaturesService (redis, mongo, decode) and the views
+      (serialize, render), plus the total, and logs requests slower than
+      SLOW_REQUEST_THRESHOLD_MS
+    - PROFILE_SAMPLE_RATE: runs cProfile on 1 in N requests and dumps the
+      stats to PROFILE_DIR (0 disables)
+
+    Only added to MIDDLEWARE when one of them is on (see settings).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timing_enabled = settings.SERVER_TIMING_ENABLED
+        self.slow_threshold_ms = settings.SLOW_REQUEST_THRESHOLD_MS
+        self.profile_sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.profile_dir = settings.PROFILE_DIR
+        self._request_counter = itertools.count(1)
+        if self.profile_sample_rate:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+    def __call__(self, request):
+        token = start_request_timings() if self.timing_enabled else None
+        profiler = None
+        if (
+            self.profile_sample_rate
+            and next(self._request_counter) % self.profile_sample_rate == 0
+        ):
+            profiler = cProfile.Profile()
+
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            else:
+                response = self.get_response(request)
+            total_ms = (time.perf_counter() - started) * 1000
+
+            if token is not None:
+                timings = current_timings()
+                response["Server-Timing"] = timings.header_value(total_ms)
+                if total_ms >= self.slow_threshold_ms:
+                    logger.warning(
+                        f"Slow request {request.method} {request.path} -> "
+                        f"{response.status_code} in {total_ms:.1f} ms "
+                        f"({response['Server-Timing']})"
+                    )
+        finally:
+            if token is not None:
+                end_request_timings(token)
+
+        if profiler is not None:
+            self._dump_profile(profiler, request, total_ms)
+
+        return response
+
+    def process_template_response(self, request, response):
+        """Measure DRF rendering, which happens after the view returns"""
+        timings = current_timings()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add(
+                    "render", (time.perf_counter() - started) * 1000
+                )
+            )
+        return response
+
+    def _dump_profile(self, profiler, request, total_ms):
+        slug = request.path.strip("/").replace("/", "_") or "root"
+        path = os.path.join(
+            self.profile_dir,
+            f"{int(time.time() * 1000)}-{os.getpid()}-{slug}-{total_ms:.0f}ms.prof",
+        )
+        try:
+            profiler.dump_stats(path)
+            logger.info(f"Request profile written to {path}")
+        except OSError as e:
+            logger.error(f"Profile dump error: {e}")
+
+
+class ResponseCompressionMiddleware:
+    """
+    Compresses responses with zstd or gzip, negotiated through Accept-Encoding
+
+    - Bodies smaller than RESPONSE_COMPRESSION_MIN_SIZE bytes are sent as is
+    - zstd is preferred when installed and accepted with the same quality
+    - Streaming responses (exports) are compressed chunk by chunk
+    - Strong ETags are weakened, since the bytes differ per encoding
+
+    Only added to MIDDLEWARE when RESPONSE_COMPRESSION_ENABLED is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = settings.RESPONSE_COMPRESSION_MIN_SIZE
+        self.gzip_level = settings.GZIP_COMPRESSION_LEVEL
+        self.zstd_level = settings.ZSTD_COMPRESSION_LEVEL
+        self.encodings = ("zstd", "gzip") if ZSTD_AVAILABLE else ("gzip",)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header("Content-Encoding") or (
+            not response.streaming and len(response.content) < self.min_size
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = self._negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self._compress_stream(
+                encoding, response.streaming_content
+            )
+            del response["Content-Length"]
+        else:
+            with phase("compress"):
+                compressed = self._compress(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    def _negotiate(self, accept_encoding):
+        """Pick the preferred supported coding with the highest q-value"""
+        qualities = {}
+        for item in accept_encoding.split(","):
+            coding, _, params = item.partition(";")
+            match = re.search(r"q=([0-9.]+)", params)
+            try:
+                qualities[coding.strip().lower()] = (
+                    float(match.group(1)) if match else 1.0
+                )
+            except ValueError:
+                continue
+
+        best, best_quality = None, 0.0
+        for coding in self.encodings:
+            quality = qualities.get(coding, qualities.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def _compress(self, encoding, content):
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(content)
+        return gzip.compress(content, compresslevel=self.gzip_level, mtime=0)
+
+    def _compress_stream(self, encoding, chunks):
+        if encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level).compressobj()
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
@@ -0,0 +1,110 @@
+"""
+Response renderers: orjson-backed JSON and MessagePack, chosen by `Accept`
+"""
+
+import datetime
+import decimal
+
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# orjson (instalar: pip install orjson)
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# MessagePack (instalar: pip install msgpack)
+try:
+    import msgpack
+
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    `application/json` rendered with orjson
+
+    Falls back to DRF's JSONRenderer when orjson is not installed or when the
+    client asks for indented output (e.g. the browsable API), so the wire
+    format stays the same as the stock renderer.
+    """
+
+    _encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not ORJSON_AVAILABLE or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data, default=self._encoder.default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+def _msgpack_default(obj):
+    """Encode the types DRF serializers may leave in `data`"""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    `application/msgpack` (or `?format=msgpack`)
+
+    Only listed in DEFAULT_RENDERER_CLASSES when msgpack is installed.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    `application/x-ndjson` (or `?format=ndjson`) for the streaming export
+
+    The export view streams the body itself; the renderer is used for content
+    negotiation and renders one JSON document per line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(ORJSONRenderer().render(row) + b"\n" for row in rows)
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    """
+    `application/vnd.apache.arrow.stream` (or `?format=arrow`) for the
+    streaming export
+
+    Content negotiation only: the export view writes the Arrow IPC stream.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
@@ -0,0 +1,347 @@
+"""
+Feature Rollups
+Estatísticas por feature e por versão de modelo mantidas a cada escrita:
+contagem, média e variância (Welford), mínimo/máximo e um sketch de quantis
+com erro relativo limitado (buckets logarítmicos, como no DDSketch)
+"""
+
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Erro relativo máximo dos quantis estimados (1%)
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# Valores com módulo abaixo disso caem no bucket do zero
+_MIN_INDEXABLE = 1e-9
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Campo do hash de estatísticas que marca a versão como inicializada (vazio,
+# restaurado do checkpoint ou reconstruído); sem ele o script não aplica nada
+META_FIELD = "__rollup__"
+
+# Script Lua que aplica os deltas de um lote de escritas. KEYS[1]: hash
+# feature → "n mean m2 min max"; KEYS[2]: hash "feature|bucket" → contagem.
+# ARGV[1]: META_FIELD; ARGV[2]: JSON com [nome, n, média, m2, min, max
+# adicionados, n, média, m2 removidos, {bucket: delta}] por feature. Remoções
+# são subtraídas e adições combinadas pelas fórmulas de Chan (Welford em
+# grupo). Remoções não recalculam min/max: na leitura eles são limitados aos
+# buckets não vazios do sketch (ver `bounds`). Devolve 0 se a versão não
+# estiver inicializada.
+APPLY_ROLLUP_SCRIPT = """
+if redis.call("HEXISTS", KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+local function number(value)
+    return string.format("%.17g", value)
+end
+for _, u in ipairs(cjson.decode(ARGV[2])) do
+    local name = u[1]
+    local n, mean, m2, low, high = 0, 0, 0, nil, nil
+    local raw = redis.call("HGET", KEYS[1], name)
+    if raw then
+        local s = {}
+        for token in string.gmatch(raw, "%S+") do
+            s[#s + 1] = tonumber(token)
+        end
+        n, mean, m2, low, high = s[1], s[2], s[3], s[4], s[5]
+    end
+    local removed = u[7]
+    if removed > 0 then
+        if removed >= n then
+            n, mean, m2, low, high = 0, 0, 0, nil, nil
+        else
+            local rest = n - removed
+            local rest_mean = (n * mean - removed * u[8]) / rest
+            local delta = u[8] - rest_mean
+            m2 = math.max(0, m2 - u[9] - delta * delta * rest * removed / n)
+            n, mean = rest, rest_mean
+        end
+    end
+    local added = u[2]
+    if added > 0 then
+        local total = n + added
+        local delta = u[3] - mean
+        mean = mean + delta * added / total
+        m2 = m2 + u[4] + delta * delta * n * added / total
+        n = total
+        if low == nil or u[5] < low then low = u[5] end
+        if high == nil or u[6] > high then high = u[6] end
+    end
+    if n > 0 then
+        redis.call("HSET", KEYS[1], name, table.concat(
+            {n, number(mean), number(m2), number(low), number(high)}, " "))
+    else
+        redis.call("HDEL", KEYS[1], name)
+    end
+    for bucket, delta in pairs(u[10]) do
+        local field = name .. "|" .. bucket
+        if redis.call("HINCRBY", KEYS[2], field, delta) <= 0 then
+            redis.call("HDEL", KEYS[2], field)
+        end
+    end
+end
+return 1
+"""
+
+# Script Lua que inicializa uma versão a partir de um snapshot (checkpoint do
+# MongoDB ou reconstrução), só se ela ainda não estiver no Redis. ARGV[3]:
+# JSON {"stats": {feature: "n mean m2 min max"}, "sketch": {campo: contagem}}
+RESTORE_ROLLUP_SCRIPT = """
+if redis.call("HEXISTS", KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+local snapshot = cjson.decode(ARGV[3])
+for name, value in pairs(snapshot.stats) do
+    redis.call("HSET", KEYS[1], name, value)
+end
+for field, count in pairs(snapshot.sketch) do
+    redis.call("HSET", KEYS[2], field, count)
+end
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+
+def is_tracked(value: Any) -> bool:
+    """Só valores numéricos finitos entram nas estatísticas"""
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+    )
+
+
+def bucket_of(value: float) -> str:
+    """Bucket do sketch: "z" (zero), "p<i>" (positivos) ou "n<i>" (negativos)"""
+    magnitude = abs(value)
+    if magnitude < _MIN_INDEXABLE:
+        return "z"
+    index = math.ceil(math.log(magnitude) / _LOG_GAMMA)
+    return f"{'p' if value > 0 else 'n'}{index}"
+
+
+def bucket_value(bucket: str) -> float:
+    """Valor representativo do bucket (erro relativo <= RELATIVE_ACCURACY)"""
+    if bucket == "z":
+        return 0.0
+    value = 2 * _GAMMA ** int(bucket[1:]) / (_GAMMA + 1)
+    return value if bucket[0] == "p" else -value
+
+
+def _bucket_order(bucket: str) -> Tuple[int, int]:
+    if bucket == "z":
+        return (1, 0)
+    if bucket[0] == "n":
+        return (0, -int(bucket[1:]))
+    return (2, int(bucket[1:]))
+
+
+class RunningStats:
+    """Contagem, média, M2 (Welford), mínimo e máximo de uma feature"""
+
+    __slots__ = ("n", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def encode(self) -> str:
+        """Formato guardado no Redis: "n mean m2 min max" """
+        values = (self.mean, self.m2, self.min, self.max)
+        return " ".join([str(self.n)] + [repr(float(v)) for v in values])
+
+
+class RollupDelta:
+    """
+    Alterações de um lote de escritas em uma versão, agregadas por feature
+
+    Documentos gravados entram por `add` e os valores que eles substituem ou
+    que foram removidos por `remove`; o script aplica tudo de uma vez.
+    """
+
+    def __init__(self):
+        self.added: Dict[str, RunningStats] = {}
+        self.removed: Dict[str, RunningStats] = {}
+        self.buckets: Dict[str, Counter] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def add(self, features: Optional[Dict[str, Any]]) -> None:
+        self._record(features, self.added, 1)
+
+    def remove(self, features: Optional[Dict[str, Any]]) -> None:
+        self._record(features, self.removed, -1)
+
+    def _record(self, features, target, sign) -> None:
+        for name, value in (features or {}).items():
+            if not is_tracked(value):
+                continue
+            name = str(name)
+            stats = target.get(name)
+            if stats is None:
+                stats = target[name] = RunningStats()
+            stats.add(value)
+            self.buckets.setdefault(name, Counter())[bucket_of(value)] += sign
+
+    def script_args(self) -> str:
+        """Argumento JSON do APPLY_ROLLUP_SCRIPT"""
+        updates = []
+        for name in set(self.added) | set(self.removed):
+            added = self.added.get(name) or RunningStats()
+            removed = self.removed.get(name) or RunningStats()
+            updates.append(
+                [
+                    name,
+                    added.n,
+                    added.mean,
+                    added.m2,
+                    added.min,
+                    added.max,
+                    removed.n,
+                    removed.mean,
+                    removed.m2,
+                    {b: d for b, d in self.buckets.get(name, {}).items() if d},
+                ]
+            )
+        return json.dumps(updates)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot (formato do Redis) das adições, para reconstruções"""
+        return {
+            "stats": {name: stats.encode() for name, stats in self.added.items()},
+            "sketch": {
+                f"{name}|{bucket}": count
+                for name, counts in self.buckets.items()
+                for bucket, count in counts.items()
+                if count > 0
+            },
+        }
+
+
+def parse_stats(raw: str) -> Dict[str, Any]:
+    n, mean, m2, low, high = raw.split()
+    return {
+        "n": int(float(n)),
+        "mean": float(mean),
+        "m2": float(m2),
+        "min": float(low),
+        "max": float(high),
+    }
+
+
+def split_sketch(fields: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """{"feature|bucket": contagem} → {feature: {bucket: contagem}}"""
+    sketches: Dict[str, Dict[str, int]] = {}
+    for field, count in fields.items():
+        name, _, bucket = field.rpartition("|")
+        sketches.setdefault(name, {})[bucket] = int(count)
+    return sketches
+
+
+def bounds(
+    sketch: Dict[str, int], low: float, high: float, mean: float
+) -> Tuple[float, float]:
+    """
+    Mínimo/máximo atuais a partir dos guardados e do sketch
+
+    O script só estende min/max; depois de remoções eles podem ser de
+    valores que já saíram. Se o mínimo (máximo) guardado cai antes do
+    primeiro (depois do último) bucket não vazio, é trocado pelo valor
+    representativo desse bucket (erro relativo <= RELATIVE_ACCURACY),
+    sem passar da média.
+    """
+    buckets = sorted(
+        (bucket for bucket, count in sketch.items() if count > 0), key=_bucket_order
+    )
+    if not buckets:
+        return low, high
+    if _bucket_order(bucket_of(low)) < _bucket_order(buckets[0]):
+        low = min(bucket_value(buckets[0]), mean)
+    if _bucket_order(bucket_of(high)) > _bucket_order(buckets[-1]):
+        high = max(bucket_value(buckets[-1]), mean)
+    return low, high
+
+
+def quantiles(
+    sketch: Dict[str, int], fractions: Iterable[float], low: float, high: float
+) -> Dict[str, float]:
+    """Quantis estimados pelo sketch, limitados ao mínimo/máximo atuais"""
+    ordered = sorted(sketch.items(), key=lambda item: _bucket_order(item[0]))
+    total = sum(count for _, count in ordered)
+    result = {}
+    for fraction in fractions:
+        label = f"p{fraction * 100:g}"
+        if not total:
+            result[label] = None
+            continue
+        rank = fraction * (total - 1)
+        seen = 0
+        for bucket, count in ordered:
+            seen += count
+            if seen > rank:
+                break
+        result[label] = min(high, max(low, bucket_value(bucket)))
+    return result
+
+
+def summarize(
+    stats: Dict[str, Any],
+    sketch: Dict[str, int],
+    fractions: Iterable[float] = DEFAULT_QUANTILES,
+) -> Dict[str, Any]:
+    """Resumo de uma feature: variância amostral, desvio padrão e quantis"""
+    n = stats["n"]
+    variance = stats["m2"] / (n - 1) if n > 1 else 0.0
+    low, high = bounds(sketch, stats["min"], stats["max"], stats["mean"])
+    return {
+        "count": n,
+        "mean": stats["mean"],
+        "variance": variance,
+        "stddev": math.sqrt(variance),
+        "min": low,
+        "max": high,
+        "quantiles": quantiles(sketch, fractions, low, high),
+    }
+
+
+def snapshot_to_document(
+    stats_fields: Dict[str, str], sketch_fields: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Hashes do Redis → lista de features do checkpoint no MongoDB"""
+    sketches = split_sketch(sketch_fields)
+    return [
+        {"name": name, **parse_stats(raw), "sketch": sketches.get(name, {})}
+        for name, raw in sorted(stats_fields.items())
+        if name != META_FIELD
+    ]
+
+
+def document_to_snapshot(features: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Checkpoint do MongoDB → snapshot aceito pelo RESTORE_ROLLUP_SCRIPT"""
+    snapshot: Dict[str, Dict[str, Any]] = {"stats": {}, "sketch": {}}
+    for item in features:
+        stats = RunningStats()
+        stats.n, stats.mean, stats.m2 = item["n"], item["mean"], item["m2"]
+        stats.min, stats.max = item["min"], item["max"]
+        snapshot["stats"][item["name"]] = stats.encode()
+        for bucket, count in item.get("sketch", {}).items():
+            snapshot["sketch"][f"{item['name']}|{bucket}"] = count
+    return snapshot
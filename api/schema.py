@@ -0,0 +1,51 @@
+"""
+Swagger/OpenAPI helpers
+
+In the full profile these are drf_yasg's own objects. In the lean profile
+(LEAN_MODE) drf_yasg is never imported: the view decorators become no-ops and
+the OpenAPI document is served from the file built by `manage.py generate_swagger`.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+if settings.LEAN_MODE:
+
+    def swagger_auto_schema(**kwargs):
+        """No-op replacement for drf_yasg's decorator"""
+
+        def decorator(view_method):
+            return view_method
+
+        return decorator
+
+    class _OpenAPIPlaceholder:
+        """Stands in for drf_yasg.openapi; every attribute is a no-op factory"""
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    openapi = _OpenAPIPlaceholder()
+else:
+    from drf_yasg.utils import swagger_auto_schema  # noqa: F401
+    from drf_yasg import openapi  # noqa: F401
+
+
+@lru_cache(maxsize=1)
+def _load_prebuilt_schema() -> bytes:
+    with open(settings.OPENAPI_SCHEMA_PATH, "rb") as schema_file:
+        return schema_file.read()
+
+
+def prebuilt_schema_view(request):
+    """Serve the OpenAPI document built at build time (read once per process)"""
+    try:
+        body = _load_prebuilt_schema()
+    except FileNotFoundError:
+        return JsonResponse(
+            {"error": "OpenAPI schema not built; run manage.py generate_swagger"},
+            status=404,
+        )
+    return HttpResponse(body, content_type="application/json")
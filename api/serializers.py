@@ -4,6 +4,12 @@ API Serializers for Feature Management
 
 from rest_framework import serializers
 
+from .export import decode_cursor
+
+# model_version is part of the Redis key namespace (features:{version}:{id}),
+# so it must not contain ":" or glob characters
+MODEL_VERSION_REGEX = r"^[A-Za-z0-9._-]+$"
+
 
 class FeatureSerializer(serializers.Serializer):
     """Serializer for feature data"""
@@ -22,7 +28,12 @@ class CreateFeatureSerializer(serializers.Serializer):
     features = serializers.DictField(
         help_text="Dictionary containing feature key-value pairs"
     )
-    model_version = serializers.CharField(default="v1.0.0", required=False)
+    model_version = serializers.RegexField(
+        MODEL_VERSION_REGEX,
+        max_length=50,
+        required=False,
+        help_text="Model version (default: the active version)",
+    )
     ttl_days = serializers.IntegerField(
         default=7, min_value=1, max_value=30, required=False
     )
@@ -35,12 +46,165 @@ class BulkFeatureSerializer(serializers.Serializer):
         child=serializers.DictField(),
         help_text="List of feature objects with customer_id and features",
     )
-    model_version = serializers.CharField(default="v1.0.0", required=False)
+    model_version = serializers.RegexField(
+        MODEL_VERSION_REGEX,
+        max_length=50,
+        required=False,
+        help_text="Model version (default: the active version)",
+    )
     ttl_days = serializers.IntegerField(
         default=7, min_value=1, max_value=30, required=False
     )
 
 
+def validate_feature_names(features):
+    """Reject feature names that cannot be used as MongoDB field paths"""
+    invalid = [name for name in features if "." in name or name.startswith("$")]
+    if invalid:
+        raise serializers.ValidationError(
+            f"Invalid feature names (must not contain '.' or start with '$'): {invalid}"
+        )
+    return features
+
+
+class PatchFeatureSerializer(serializers.Serializer):
+    """Serializer for partial feature updates"""
+
+    features = serializers.DictField(
+        allow_empty=False,
+        help_text="Dictionary containing only the feature key-value pairs to change",
+    )
+
+    def validate_features(self, value):
+        return validate_feature_names(value)
+
+
+class BulkPatchFeatureSerializer(serializers.Serializer):
+    """Serializer for bulk partial feature updates"""
+
+    updates_list = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        help_text="List of objects with customer_id and the features to change",
+    )
+
+    def validate_updates_list(self, value):
+        for item in value:
+            features = item.get("features")
+            if not item.get("customer_id") or not isinstance(features, dict):
+                raise serializers.ValidationError(
+                    "Each update must have a customer_id and a features object"
+                )
+            validate_feature_names(features)
+        return value
+
+
+class BulkDeleteFeatureSerializer(serializers.Serializer):
+    """Serializer for bulk deletes by customer_id list and/or selectors"""
+
+    customer_ids = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        required=False,
+        max_length=100000,
+        help_text="Customer IDs to delete",
+    )
+    customer_id_prefix = serializers.CharField(
+        max_length=100, required=False, help_text="Delete customer IDs with this prefix"
+    )
+    model_version = serializers.RegexField(
+        MODEL_VERSION_REGEX,
+        max_length=50,
+        required=False,
+        help_text="Only delete this model version (default: all versions)",
+    )
+    calculated_after = serializers.DateTimeField(
+        required=False, help_text="Only delete features calculated at or after this"
+    )
+    calculated_before = serializers.DateTimeField(
+        required=False, help_text="Only delete features calculated before this"
+    )
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError(
+                "Provide customer_ids or at least one selector"
+            )
+        return attrs
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """Query parameters for the streaming export"""
+
+    model_version = serializers.RegexField(
+        MODEL_VERSION_REGEX,
+        max_length=50,
+        required=False,
+        help_text="Model version to export (default: active version)",
+    )
+    fields = serializers.CharField(
+        required=False, help_text="Comma-separated feature names (default: all)"
+    )
+    cursor = serializers.CharField(
+        required=False, help_text="next_cursor of a previous export to resume from"
+    )
+    limit = serializers.IntegerField(
+        min_value=1, required=False, help_text="Maximum documents (default: all)"
+    )
+    batch_size = serializers.IntegerField(
+        min_value=1,
+        max_value=10000,
+        default=1000,
+        required=False,
+        help_text="Documents per MongoDB query / output chunk",
+    )
+
+    def validate_fields(self, value):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        if not names:
+            raise serializers.ValidationError("Provide at least one feature name")
+        validate_feature_names(names)
+        return names
+
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, attrs):
+        cursor = attrs.get("cursor")
+        version = attrs.get("model_version")
+        if cursor and version and cursor[0] != version:
+            raise serializers.ValidationError(
+                "cursor belongs to a different model_version"
+            )
+        return attrs
+
+
+class FeatureStatsQuerySerializer(serializers.Serializer):
+    """Query parameters for the feature statistics rollups"""
+
+    model_version = serializers.RegexField(
+        MODEL_VERSION_REGEX,
+        max_length=50,
+        required=False,
+        help_text="Model version (default: active version)",
+    )
+    quantiles = serializers.CharField(
+        required=False,
+        help_text="Comma-separated fractions in (0, 1) (default: 0.5,0.9,0.99)",
+    )
+
+    def validate_quantiles(self, value):
+        try:
+            fractions = [float(item) for item in value.split(",") if item.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Quantiles must be numbers")
+        if not fractions or not all(0 < f < 1 for f in fractions):
+            raise serializers.ValidationError("Quantiles must be between 0 and 1")
+        return fractions
+
+
 class HealthCheckSerializer(serializers.Serializer):
     """Serializer for health check response"""
 
@@ -3,10 +3,37 @@ Features Service
 Gerencia features pré-calculadas dos clientes com cache Redis + MongoDB
 """
 
+import contextlib
+import hashlib
+import heapq
 import json
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Callable,
+    Dict,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from datetime import datetime, timedelta, timezone
+
+from .admission import AdmissionPolicy
+from .batching import MicroBatcher
+from .bloom import BloomFilter
+from .bulkhead import Bulkhead, BulkheadFull
+from .loader import FeatureLoader
+from . import rollups
+from .rollups import RollupDelta
+from .timing import phase
 
 # Redis (instalar: pip install redis)
 try:
@@ -26,6 +53,216 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Eventos do caminho crítico (hit/miss/write/error...), com formatação lazy.
+# Amostragem e handler assíncrono configurados em LOGGING (logger "api.cache").
+cache_logger = logging.getLogger("api.cache")
+
+# Versão de modelo usada quando nenhuma versão ativa foi definida
+DEFAULT_MODEL_VERSION = "v1.0.0"
+
+# Layouts da coleção de features no MongoDB:
+# - "compound": _id gerado + índice único (customer_id, model_version)
+# - "id": _id = "{model_version}:{customer_id}" (busca direto pela chave
+#   primária, sem índice secundário)
+# - "migrating": grava no layout "id" e lê com fallback para a coleção antiga,
+#   enquanto `migrate_layout` move os documentos
+MONGO_LAYOUTS = ("compound", "id", "migrating")
+FEATURES_COLLECTION = "customer_features"
+FEATURES_BY_ID_COLLECTION = "customer_features_by_id"
+
+# Chave Redis com o alias da versão ativa (lido por todas as leituras)
+ACTIVE_VERSION_KEY = "features:active_version"
+
+# Bitmap do Bloom filter de customer_ids conhecidos e seus parâmetros
+BLOOM_FILTER_KEY = "features:bloom"
+BLOOM_META_KEY = "features:bloom:meta"
+
+# Chaves do namespace "features:*:*" que não são documentos de clientes
+RESERVED_KEYS = frozenset({BLOOM_FILTER_KEY, BLOOM_META_KEY})
+
+# Valor gravado na chave de features para marcar cliente inexistente
+# (cache negativo com TTL curto)
+NEGATIVE_CACHE_MARKER = ""
+
+
+# Tentativas de um PATCH no cache (WATCH/GET/SET) antes de desistir e remover
+# as chaves: a próxima leitura repopula a partir do MongoDB
+PATCH_CACHE_RETRIES = 3
+
+# Campos do MongoDB que o worker de sincronização não grava no Redis
+SYNC_INTERNAL_FIELDS = frozenset({"_id", "content_hash", "updated_at"})
+
+# Script Lua que devolve apenas os metadados de validação HTTP
+# (calculated_at, model_version, expires_at) do documento cacheado, sem
+# trafegar nem decodificar o documento inteiro no cliente. Retorna nil se a
+# chave não existe e "" para entradas de cache negativo.
+FEATURES_METADATA_SCRIPT = """
+local cached = redis.call("GET", KEYS[1])
+if not cached or cached == "" then
+    return cached
+end
+local doc = cjson.decode(cached)
+return {
+    tostring(doc["calculated_at"] or ""),
+    tostring(doc["model_version"] or ""),
+    tostring(doc["expires_at"] or ""),
+}
+"""
+
+# Campos usados para validação condicional (ETag/Last-Modified/Cache-Control)
+METADATA_FIELDS = ("calculated_at", "model_version", "expires_at")
+
+# Hash com contadores de hits/misses por versão, compartilhado entre processos
+CACHE_STATS_KEY = "features:stats"
+
+# Estatísticas por versão (api.rollups): hash de estatísticas e hash do
+# sketch de quantis no Redis, checkpoint na coleção ROLLUPS_COLLECTION
+ROLLUP_STATS_KEY = "feature_rollups:{model_version}"
+ROLLUP_SKETCH_KEY = "feature_rollups:{model_version}:sketch"
+ROLLUPS_COLLECTION = "feature_rollups"
+
+# Script Lua de leitura em um único round trip: GET, contadores de
+# hit/miss/negativo por versão (HINCRBY em CACHE_STATS_KEY) e expiração
+# deslizante. Num hit, o TTL da chave é estendido para ARGV[1] segundos
+# (nunca além do expires_at do documento e nunca encurtado). ARGV[3]: "0"
+# não conta, "1" conta tudo, "2" não conta misses (quem chama repete a
+# leitura pelo caminho completo). Devolve o valor cacheado (nil no miss, ""
+# no cache negativo). O expires_at é o campo de topo do documento decodificado
+# (não uma feature de mesmo nome).
+GET_FEATURES_SCRIPT = """
+local cached = redis.call("GET", KEYS[1])
+if ARGV[3] == "1" or (ARGV[3] == "2" and cached) then
+    local counter = "misses:"
+    if cached == "" then
+        counter = "negative_hits:"
+    elseif cached then
+        counter = "hits:"
+    end
+    redis.call("HINCRBY", KEYS[2], counter .. ARGV[2], 1)
+end
+local idle_ttl = tonumber(ARGV[1])
+if not cached or cached == "" or idle_ttl <= 0 then
+    return cached
+end
+local ok, doc = pcall(cjson.decode, cached)
+local expires_at = ok and type(doc) == "table" and doc["expires_at"]
+local y, m, d, hh, mi, ss
+if type(expires_at) == "string" then
+    y, m, d, hh, mi, ss = string.match(
+        expires_at, "^(%d+)-(%d+)-(%d+)[T ](%d+):(%d+):(%d+)")
+end
+if y then
+    y, m = tonumber(y), tonumber(m)
+    if m <= 2 then
+        y, m = y - 1, m + 12
+    end
+    local days = 365 * y + math.floor(y / 4) - math.floor(y / 100)
+        + math.floor(y / 400) + math.floor((153 * (m - 3) + 2) / 5)
+        + tonumber(d) - 719469
+    local expires = days * 86400 + tonumber(hh) * 3600 + tonumber(mi) * 60
+        + tonumber(ss)
+    local remaining = expires - tonumber(redis.call("TIME")[1])
+    if remaining < idle_ttl then
+        idle_ttl = remaining
+    end
+end
+if idle_ttl > 0 then
+    local ttl = redis.call("TTL", KEYS[1])
+    if ttl >= 0 and ttl < idle_ttl then
+        redis.call("EXPIRE", KEYS[1], idle_ttl)
+    end
+end
+return cached
+"""
+
+# Script Lua de backfill com compare-and-set em calculated_at: grava o
+# documento lido do MongoDB (SET EX) só se o cache não tiver uma versão mais
+# nova. Fecha a corrida em que um read-through lento sobrescreve o valor que
+# `set_features` acabou de gravar. Devolve 1 se gravou, 0 se recusou.
+# Compara o campo de topo decodificado (não uma feature de mesmo nome);
+# timestamps sem fração (gravados antes de `_timestamp`) ganham ".000000"
+# para que a comparação de strings siga a ordem cronológica. Com ARGV[4] = "1"
+# uma chave já cacheada mantém o TTL (KEEPTTL) em vez de receber ARGV[2].
+BACKFILL_FEATURES_SCRIPT = """
+local function normalize(ts)
+    if #ts == 20 then
+        return string.sub(ts, 1, 19) .. ".000000Z"
+    end
+    return ts
+end
+local cached = redis.call("GET", KEYS[1])
+if cached and cached ~= "" then
+    local ok, doc = pcall(cjson.decode, cached)
+    local current = ok and type(doc) == "table" and doc["calculated_at"]
+    if type(current) == "string" and normalize(current) > normalize(ARGV[3]) then
+        return 0
+    end
+end
+if ARGV[4] == "1" and cached then
+    redis.call("SET", KEYS[1], ARGV[1], "KEEPTTL")
+else
+    redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+end
+return 1
+"""
+
+
+def _timestamp(moment: datetime) -> str:
+    """calculated_at em UTC com microssegundos fixos (ordenável como string)"""
+    return moment.isoformat(timespec="microseconds") + "Z"
+
+
+def create_feature_indexes(collection, keyed_by_id: bool) -> List[str]:
+    """
+    Cria (se não existirem) os índices de uma coleção de features
+
+    Args:
+        collection: Coleção do MongoDB
+        keyed_by_id: Se a coleção usa o layout "id" (dispensa o índice
+            único em customer_id + model_version)
+
+    Returns:
+        Nomes dos índices
+    """
+    names = []
+    if not keyed_by_id:
+        # Um documento por (customer_id, model_version): várias versões
+        # coexistem durante um rollout. O índice único antigo apenas em
+        # customer_id impediria isso e é removido.
+        legacy_index = collection.index_information().get("customer_id_1")
+        if legacy_index and legacy_index.get("unique"):
+            collection.drop_index("customer_id_1")
+        names.append(
+            collection.create_index(
+                [("customer_id", 1), ("model_version", 1)], unique=True
+            )
+        )
+
+    # Índice no model_version para limpeza de versões antigas
+    names.append(collection.create_index("model_version"))
+
+    # Índice TTL para expiração automática
+    names.append(collection.create_index("expires_at", expireAfterSeconds=0))
+
+    # Índice no updated_at para a sincronização incremental
+    # (_id desempata a paginação por keyset)
+    names.append(collection.create_index([("updated_at", 1), ("_id", 1)]))
+    return names
+
+
+class ServiceOverloaded(Exception):
+    """
+    O MongoDB está saturado e a consulta foi descartada pelo bulkhead
+
+    `stale` traz a última versão conhecida do documento (cache em memória do
+    processo), ou None se não houver.
+    """
+
+    def __init__(self, customer_id: str, stale: Optional[Dict[str, Any]] = None):
+        super().__init__(f"MongoDB overloaded, lookup for {customer_id} shed")
+        self.customer_id = customer_id
+        self.stale = stale
+
 
 class FeaturesService:
     """
@@ -63,6 +300,29 @@ class FeaturesService:
         mongo_db: str = "credit_score",
         use_redis: bool = True,
         use_mongo: bool = True,
+        active_version_cache_ttl: float = 5.0,
+        negative_cache_ttl: int = 60,
+        use_bloom_filter: bool = True,
+        bloom_refresh_interval: float = 30.0,
+        mongo_max_concurrency: int = 0,
+        mongo_queue_timeout: float = 0.05,
+        stale_cache_size: int = 0,
+        read_batch_window: float = 0.0,
+        read_batch_max_size: int = 64,
+        admission_min_frequency: int = 0,
+        admission_probation_ttl: int = 0,
+        admission_sketch_width: int = 65536,
+        cache_idle_ttl: int = 0,
+        cache_hit_counters: bool = False,
+        mongo_layout: str = "compound",
+        feature_rollups: bool = False,
+        rollup_checkpoint_interval: float = 300.0,
+        feature_loader: Optional[Callable] = None,
+        loader_workers: int = 4,
+        loader_timeout: float = 2.0,
+        loader_max_pending: int = 1000,
+        loader_processes: bool = False,
+        loader_ttl_days: int = 7,
     ):
         """
         Inicializa o serviço de features
@@ -76,13 +336,114 @@ class FeaturesService:
             mongo_db: Nome do database MongoDB
             use_redis: Se deve usar Redis (para testes pode desabilitar)
             use_mongo: Se deve usar MongoDB (para testes pode desabilitar)
+            active_version_cache_ttl: Segundos que a versão ativa fica em
+                cache no processo antes de ser relida do Redis/MongoDB
+            negative_cache_ttl: TTL em segundos das entradas de cache negativo
+                (clientes inexistentes)
+            use_bloom_filter: Se deve usar o Bloom filter de clientes conhecidos
+            bloom_refresh_interval: Segundos entre verificações de mudança do
+                Bloom filter no Redis (cópia local em cada processo)
+            mongo_max_concurrency: Máximo de consultas simultâneas ao MongoDB
+                no caminho de miss, por processo (0 desliga o bulkhead)
+            mongo_queue_timeout: Segundos que uma consulta espera por vaga
+                antes de ser descartada (ServiceOverloaded)
+            stale_cache_size: Quantidade de documentos recentes mantidos em
+                memória para responder com valor antigo quando a consulta é
+                descartada (0 desliga)
+            read_batch_window: Segundos que uma leitura espera por outras
+                leituras concorrentes para seguirem juntas em um MGET e um
+                `$in` (0 desliga o micro-batching)
+            read_batch_max_size: Máximo de chaves por lote de leitura
+            admission_min_frequency: Acessos recentes necessários para que um
+                resultado lido do MongoDB entre no Redis com o TTL completo
+                (0 desliga a política de admissão: tudo é cacheado)
+            admission_probation_ttl: TTL em segundos das chaves abaixo da
+                frequência mínima (0: não são cacheadas)
+            admission_sketch_width: Contadores por linha do sketch de
+                frequência
+            cache_idle_ttl: Expiração deslizante em segundos: cada hit mantém
+                a chave no Redis por pelo menos esse tempo (limitado ao
+                expires_at), e os backfills usam esse TTL (0 desliga)
+            cache_hit_counters: Se deve contar hits/misses por versão no
+                Redis (hash compartilhado entre processos)
+            mongo_layout: Layout da coleção de features no MongoDB
+                ("compound", "id" ou "migrating", ver MONGO_LAYOUTS)
+            feature_rollups: Se as escritas devem manter as estatísticas por
+                feature de cada versão (requer Redis e MongoDB)
+            rollup_checkpoint_interval: Segundos entre checkpoints das
+                estatísticas no MongoDB (0: só pelo `checkpoint_rollups`)
+            feature_loader: Função `(customer_ids, model_version) →
+                {customer_id: features}` que calcula as features de clientes
+                ausentes no Redis e no MongoDB (camada L3, None desliga)
+            loader_workers: Threads (ou processos) do pool do loader
+            loader_timeout: Segundos que uma leitura espera pelo cálculo
+            loader_max_pending: Máximo de clientes em cálculo por processo
+            loader_processes: Se o loader roda em processos em vez de threads
+            loader_ttl_days: Dias até a expiração das features calculadas
         """
+        if mongo_layout not in MONGO_LAYOUTS:
+            raise ValueError(f"Unknown MongoDB layout: {mongo_layout}")
         self.redis_ttl = redis_ttl
+        self.active_version_cache_ttl = active_version_cache_ttl
+        self._active_version = None
+        self._active_version_expires = 0.0
+        self.negative_cache_ttl = negative_cache_ttl
+        self.use_bloom_filter = use_bloom_filter
+        self.bloom_refresh_interval = bloom_refresh_interval
+        self._bloom_filter = None
+        self._bloom_generation = None
+        self._bloom_checked_until = 0.0
+        self._bloom_lock = threading.Lock()
+        self.mongo_bulkhead = Bulkhead(mongo_max_concurrency, mongo_queue_timeout)
+        self.stale_cache_size = stale_cache_size
+        self._stale_cache = OrderedDict()
+        self._stale_lock = threading.Lock()
+        self.stale_served = 0
+        self._read_batcher = (
+            MicroBatcher(self._load_batch, read_batch_window, read_batch_max_size)
+            if read_batch_window > 0
+            else None
+        )
+        self.admission = (
+            AdmissionPolicy(
+                admission_min_frequency,
+                admission_probation_ttl,
+                admission_sketch_width,
+            )
+            if admission_min_frequency > 0
+            else None
+        )
+        self.loader_ttl_days = loader_ttl_days
+        self.loader = (
+            FeatureLoader(
+                feature_loader,
+                self._store_computed,
+                loader_workers,
+                loader_timeout,
+                loader_max_pending,
+                loader_processes,
+            )
+            if feature_loader is not None
+            else None
+        )
+        self.cache_idle_ttl = cache_idle_ttl
+        self.cache_hit_counters = cache_hit_counters
+        self.mongo_layout = mongo_layout
+        self.rollup_checkpoint_interval = rollup_checkpoint_interval
+        self._rollups_dirty = set()
+        self._rollups_checkpoint_at = time.monotonic() + rollup_checkpoint_interval
+        self._rollups_lock = threading.Lock()
         self.use_redis = use_redis and REDIS_AVAILABLE
         self.use_mongo = use_mongo and MONGO_AVAILABLE
 
         # Conecta ao Redis (cache)
         self.redis_client = None
+        self.redis_binary_client = None
+        self._features_metadata_script = None
+        self._get_features_script = None
+        self._backfill_features_script = None
+        self._apply_rollup_script = None
+        self._restore_rollup_script = None
         if self.use_redis:
             try:
                 self.redis_client = redis.Redis(
@@ -95,15 +456,45 @@ class FeaturesService:
                 )
                 # Testa conexão
                 self.redis_client.ping()
+                self._features_metadata_script = self.redis_client.register_script(
+                    FEATURES_METADATA_SCRIPT
+                )
+                # Scripts chamados por EVALSHA; se o Redis reiniciar (cache de
+                # scripts vazio), o redis-py recarrega no NOSCRIPT
+                self._get_features_script = self.redis_client.register_script(
+                    GET_FEATURES_SCRIPT
+                )
+                self._backfill_features_script = self.redis_client.register_script(
+                    BACKFILL_FEATURES_SCRIPT
+                )
+                self._apply_rollup_script = self.redis_client.register_script(
+                    rollups.APPLY_ROLLUP_SCRIPT
+                )
+                self._restore_rollup_script = self.redis_client.register_script(
+                    rollups.RESTORE_ROLLUP_SCRIPT
+                )
+                # Cliente sem decode para ler o bitmap do Bloom filter
+                self.redis_binary_client = redis.Redis(
+                    host=redis_host,
+                    port=redis_port,
+                    db=redis_db,
+                    decode_responses=False,
+                    socket_connect_timeout=2,
+                    socket_timeout=2,
+                )
                 logger.info("Redis connection established")
             except Exception as e:
                 logger.warning(f"Redis not available: {e}. Running without cache.")
                 self.redis_client = None
+                self.redis_binary_client = None
                 self.use_redis = False
 
         # Conecta ao MongoDB (persistência)
         self.mongo_client = None
         self.mongo_collection = None
+        self.legacy_collection = None
+        self.versions_collection = None
+        self.rollups_collection = None
         if self.use_mongo:
             try:
                 self.mongo_client = MongoClient(
@@ -112,13 +503,19 @@ class FeaturesService:
                 # Testa conexão
                 self.mongo_client.server_info()
                 db = self.mongo_client[mongo_db]
-                self.mongo_collection = db["customer_features"]
+                # Novas gravações vão sempre para `mongo_collection`; durante
+                # a migração a coleção antiga só é lida e esvaziada
+                if mongo_layout == "compound":
+                    self.mongo_collection = db[FEATURES_COLLECTION]
+                else:
+                    self.mongo_collection = db[FEATURES_BY_ID_COLLECTION]
+                if mongo_layout == "migrating":
+                    self.legacy_collection = db[FEATURES_COLLECTION]
+                self.versions_collection = db["feature_versions"]
+                self.rollups_collection = db[ROLLUPS_COLLECTION]
 
-                # Cria índice no customer_id para busca rápida
-                self.mongo_collection.create_index("customer_id", unique=True)
-
-                # Cria índice TTL para expiração automática
-                self.mongo_collection.create_index("expires_at", expireAfterSeconds=0)
+                # Os índices são criados por `ensure_indexes` (comando
+                # mongo_indexes no deploy), não a cada inicialização
 
                 logger.info("MongoDB connection established")
             except Exception as e:
@@ -127,265 +524,2608 @@ class FeaturesService:
                 )
                 self.mongo_client = None
                 self.mongo_collection = None
+                self.legacy_collection = None
+                self.versions_collection = None
+                self.rollups_collection = None
                 self.use_mongo = False
 
-    def _get_redis_key(self, customer_id: str) -> str:
-        """Gera chave Redis para um customer_id"""
-        return f"features:{customer_id}"
+        # Estatísticas precisam dos valores anteriores (MongoDB) e do Redis
+        self.feature_rollups = feature_rollups and self.use_redis and self.use_mongo
+
+    def _get_redis_key(self, customer_id: str, model_version: str) -> str:
+        """Gera chave Redis para um customer_id dentro de uma versão de modelo"""
+        return f"features:{model_version}:{customer_id}"
 
-    def get_features(self, customer_id: str) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def _get_document_id(customer_id: str, model_version: str) -> str:
         """
-        Recupera features de um cliente (Redis → MongoDB → None)
+        _id de um documento no layout "id" (versão primeiro: os documentos
+        de uma versão formam um intervalo contíguo do índice _id)
+        """
+        return f"{model_version}:{customer_id}"
+
+    @property
+    def _keyed_by_id(self) -> bool:
+        """Se `mongo_collection` usa o layout "id" """
+        return self.mongo_layout != "compound"
+
+    def _collections(self) -> List[Tuple[Any, bool]]:
+        """Coleções com documentos de features: (coleção, usa layout "id")"""
+        collections = [(self.mongo_collection, self._keyed_by_id)]
+        if self.legacy_collection is not None:
+            collections.append((self.legacy_collection, False))
+        return collections
+
+    def _document_filter(self, customer_id: str, model_version: str) -> Dict[str, Any]:
+        """Filtro de um documento em `mongo_collection`"""
+        if self._keyed_by_id:
+            return {"_id": self._get_document_id(customer_id, model_version)}
+        return {"customer_id": customer_id, "model_version": model_version}
+
+    def _find_document(
+        self, customer_id: str, model_version: str, projection: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Busca um documento (com fallback para a coleção antiga na migração)"""
+        doc = self.mongo_collection.find_one(
+            self._document_filter(customer_id, model_version), projection
+        )
+        if doc is None and self.legacy_collection is not None:
+            doc = self.legacy_collection.find_one(
+                {"customer_id": customer_id, "model_version": model_version},
+                projection,
+            )
+        return doc
+
+    def _documents_filter(
+        self, customer_ids: List[str], model_version: str
+    ) -> Dict[str, Any]:
+        """Filtro de vários documentos de uma versão em `mongo_collection`"""
+        if self._keyed_by_id:
+            return {
+                "_id": {
+                    "$in": [
+                        self._get_document_id(c, model_version) for c in customer_ids
+                    ]
+                }
+            }
+        return {"customer_id": {"$in": customer_ids}, "model_version": model_version}
+
+    def _find_documents(
+        self, customer_ids: List[str], model_version: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Busca vários documentos de uma versão: customer_id → documento"""
+        found = {
+            doc["customer_id"]: doc
+            for doc in self.mongo_collection.find(
+                self._documents_filter(customer_ids, model_version), {"_id": 0}
+            )
+        }
+
+        missing = [c for c in customer_ids if c not in found]
+        if missing and self.legacy_collection is not None:
+            for doc in self.legacy_collection.find(
+                {"customer_id": {"$in": missing}, "model_version": model_version},
+                {"_id": 0},
+            ):
+                found[doc["customer_id"]] = doc
+        return found
+
+    def _discard_legacy(self, model_version: str, customer_ids: List[str]) -> None:
+        """Migração: remove da coleção antiga documentos regravados na nova"""
+        if self.legacy_collection is None or not customer_ids:
+            return
+        self.legacy_collection.delete_many(
+            {"customer_id": {"$in": customer_ids}, "model_version": model_version}
+        )
+
+    def _move_from_legacy(self, model_version: str, customer_ids: List[str]) -> int:
+        """Migração: move documentos para a nova coleção antes de um `$set`"""
+        if self.legacy_collection is None:
+            return 0
+        return self._move_documents(
+            list(
+                self.legacy_collection.find(
+                    {
+                        "customer_id": {"$in": customer_ids},
+                        "model_version": model_version,
+                    }
+                )
+            )
+        )
+
+    def _move_documents(self, docs: List[Dict[str, Any]]) -> int:
+        """
+        Copia documentos da coleção antiga para a nova e os remove da antiga
+
+        A cópia usa `$setOnInsert`: um documento gravado na nova coleção
+        depois da leitura (set_features, bulk) não é sobrescrito.
+        """
+        if not docs:
+            return 0
+        from pymongo import UpdateOne
+
+        self.mongo_collection.bulk_write(
+            [
+                UpdateOne(
+                    {
+                        "_id": self._get_document_id(
+                            doc["customer_id"], doc["model_version"]
+                        )
+                    },
+                    {"$setOnInsert": {k: v for k, v in doc.items() if k != "_id"}},
+                    upsert=True,
+                )
+                for doc in docs
+            ],
+            ordered=False,
+        )
+        self.legacy_collection.delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs]}}
+        )
+        return len(docs)
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        """
+        Cria os índices do layout configurado (idempotente)
+
+        Chamado pelo comando `mongo_indexes` no deploy; o serviço não cria
+        índices ao iniciar. No layout "migrating" cria os índices das duas
+        coleções.
+
+        Returns:
+            Dict nome da coleção → nomes dos índices
+        """
+        if not (self.use_mongo and self.mongo_collection is not None):
+            return {}
+        return {
+            collection.name: create_feature_indexes(collection, keyed_by_id)
+            for collection, keyed_by_id in self._collections()
+        }
+
+    def migrate_layout(
+        self,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Move os documentos da coleção antiga ("compound") para a nova ("id")
+
+        Executado com o serviço no layout "migrating", com a API no ar: as
+        leituras buscam primeiro na nova coleção e depois na antiga, as
+        gravações vão para a nova e atualizações parciais movem o documento
+        antes do `$set`. Cada lote é lido em ordem de _id, copiado com
+        `$setOnInsert` e removido da coleção antiga, então a migração pode
+        ser interrompida e retomada. Uma remoção feita durante a cópia do
+        mesmo lote pode ser desfeita; evite bulk deletes durante a migração.
 
         Args:
-            customer_id: ID do cliente
+            batch_size: Documentos por lote
+            progress: Chamado após cada lote com os contadores acumulados
 
         Returns:
-            Dict com features ou None se não encontrado
+            Dict com contadores: {"moved", "batches", "remaining"}
+
+        Raises:
+            ValueError: Se o serviço não estiver no layout "migrating"
         """
-        logger.debug(f"Fetching features for customer_id: {customer_id}")
+        if self.legacy_collection is None:
+            raise ValueError('Layout migration requires mongo_layout="migrating"')
+
+        stats = {"moved": 0, "batches": 0}
+        last_id = None
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            docs = list(
+                self.legacy_collection.find(query).sort("_id", 1).limit(batch_size)
+            )
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            stats["moved"] += self._move_documents(docs)
+            stats["batches"] += 1
+            if progress is not None:
+                progress(dict(stats))
+
+        stats["remaining"] = self.legacy_collection.count_documents({})
+        logger.info(
+            f"Moved {stats['moved']} documents to {self.mongo_collection.name} "
+            f"in {stats['batches']} batches"
+        )
+        return stats
+
+    def get_active_version(self) -> str:
+        """
+        Retorna a versão de modelo ativa (cache no processo → Redis → MongoDB)
+
+        O valor fica em cache no processo por `active_version_cache_ttl`
+        segundos, então as leituras normalmente não fazem round trip extra.
+
+        Returns:
+            str: Versão ativa (DEFAULT_MODEL_VERSION se nenhuma foi definida)
+        """
+        now = time.monotonic()
+        if self._active_version is not None and now < self._active_version_expires:
+            return self._active_version
+
+        version = None
 
-        # Tenta Redis primeiro (cache L1)
         if self.use_redis and self.redis_client:
             try:
-                cached = self.redis_client.get(self._get_redis_key(customer_id))
-                if cached:
-                    logger.info(f"Features cache HIT for {customer_id} (Redis)")
-                    return json.loads(cached)
+                version = self.redis_client.get(ACTIVE_VERSION_KEY)
             except Exception as e:
-                logger.error(f"Redis get error: {e}")
+                logger.error(f"Redis get active version error: {e}")
 
-        # Tenta MongoDB (persistência L2)
-        if self.use_mongo and self.mongo_collection is not None:
+        if version is None and self.use_mongo and self.versions_collection is not None:
             try:
-                doc = self.mongo_collection.find_one(
-                    {"customer_id": customer_id},
-                    {"_id": 0},  # Exclui o _id do MongoDB
-                )
-
-                if doc:
-                    logger.info(
-                        f"Features cache MISS Redis, HIT MongoDB for {customer_id}"
-                    )
-
-                    # Atualiza o cache Redis
+                meta = self.versions_collection.find_one({"_id": "active"})
+                if meta:
+                    version = meta["model_version"]
+                    # Restaura o alias no Redis (ex.: após um flush)
                     if self.use_redis and self.redis_client:
-                        try:
-                            self.redis_client.setex(
-                                self._get_redis_key(customer_id),
-                                self.redis_ttl,
-                                json.dumps(doc, default=str),
-                            )
-                        except Exception as e:
-                            logger.error(f"Redis set error: {e}")
-
-                    return doc
+                        self.redis_client.set(ACTIVE_VERSION_KEY, version)
             except Exception as e:
-                logger.error(f"MongoDB get error: {e}")
+                logger.error(f"MongoDB get active version error: {e}")
 
-        logger.warning(f"Features not found for customer_id: {customer_id}")
-        return None
+        self._active_version = version or DEFAULT_MODEL_VERSION
+        self._active_version_expires = now + self.active_version_cache_ttl
+        return self._active_version
 
-    def set_features(
-        self,
-        customer_id: str,
-        features: Dict[str, Any],
-        model_version: str = "v1.0.0",
-        ttl_days: int = 7,
-    ) -> bool:
+    def activate_model_version(self, model_version: str) -> bool:
         """
-        Armazena features de um cliente (MongoDB + Redis)
+        Troca a versão ativa de forma atômica
+
+        A versão nova deve estar carregada (e, de preferência, aquecida no
+        Redis) antes da troca. Outros processos passam a usá-la em até
+        `active_version_cache_ttl` segundos. A versão anterior é registrada
+        para permitir rollback.
 
         Args:
-            customer_id: ID do cliente
-            features: Dicionário com as features
-            model_version: Versão do modelo que gerou as features
-            ttl_days: Dias até expiração (padrão: 7)
+            model_version: Versão que passa a ser servida
 
         Returns:
-            bool: True se sucesso, False se falhou
+            bool: True se a troca foi registrada, False se falhou
         """
-        now = datetime.utcnow()
-        expires_at = now + timedelta(days=ttl_days)
-
-        doc = {
-            "customer_id": customer_id,
-            "features": features,
-            "calculated_at": now.isoformat() + "Z",
-            "model_version": model_version,
-            "expires_at": expires_at,
-        }
-
-        success = False
+        previous_version = self.get_active_version()
+        activated = False
 
-        # Salva no MongoDB (persistência)
-        if self.use_mongo and self.mongo_collection is not None:
+        # Registra no MongoDB (fonte da verdade)
+        if self.use_mongo and self.versions_collection is not None:
             try:
-                self.mongo_collection.replace_one(
-                    {"customer_id": customer_id}, doc, upsert=True
+                self.versions_collection.replace_one(
+                    {"_id": "active"},
+                    {
+                        "model_version": model_version,
+                        "previous_version": previous_version,
+                        "activated_at": datetime.utcnow(),
+                    },
+                    upsert=True,
                 )
-                logger.info(f"Features saved to MongoDB for {customer_id}")
-                success = True
+                activated = True
             except Exception as e:
-                logger.error(f"MongoDB set error: {e}")
+                logger.error(f"MongoDB activate version error: {e}")
+                return False
 
-        # Salva no Redis (cache)
+        # Atualiza o alias no Redis (SET é atômico para todos os leitores)
         if self.use_redis and self.redis_client:
             try:
-                self.redis_client.setex(
-                    self._get_redis_key(customer_id),
-                    self.redis_ttl,
-                    json.dumps(doc, default=str),
-                )
-                logger.info(f"Features cached in Redis for {customer_id}")
-                success = True
+                self.redis_client.set(ACTIVE_VERSION_KEY, model_version)
+                activated = True
             except Exception as e:
-                logger.error(f"Redis set error: {e}")
+                logger.error(f"Redis activate version error: {e}")
 
-        return success
+        if activated:
+            self._active_version = model_version
+            self._active_version_expires = (
+                time.monotonic() + self.active_version_cache_ttl
+            )
+            logger.info(
+                f"Active model version switched from {previous_version} "
+                f"to {model_version}"
+            )
 
-    def delete_features(self, customer_id: str) -> bool:
+        return activated
+
+    def get_model_versions(self) -> Dict[str, Any]:
+        """
+        Lista as versões de modelo armazenadas e a versão ativa
+
+        Returns:
+            Dict com a versão ativa, a anterior e a contagem de documentos
+            por versão
+        """
+        info = {
+            "active_version": self.get_active_version(),
+            "previous_version": None,
+            "versions": {},
+        }
+
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                meta = self.versions_collection.find_one({"_id": "active"})
+                if meta:
+                    info["previous_version"] = meta.get("previous_version")
+                for collection, _ in self._collections():
+                    for row in collection.aggregate(
+                        [{"$group": {"_id": "$model_version", "count": {"$sum": 1}}}]
+                    ):
+                        info["versions"][row["_id"]] = (
+                            info["versions"].get(row["_id"], 0) + row["count"]
+                        )
+            except Exception as e:
+                logger.error(f"MongoDB list versions error: {e}")
+
+        return info
+
+    def warm_model_version(self, model_version: str, batch_size: int = 1000) -> int:
         """
-        Remove features de um cliente (MongoDB + Redis)
+        Carrega no Redis todos os documentos de uma versão (MongoDB → Redis)
 
         Args:
-            customer_id: ID do cliente
+            model_version: Versão a aquecer
+            batch_size: Quantidade de chaves por pipeline
 
         Returns:
-            bool: True se removido, False se não encontrado
+            int: Quantidade de chaves escritas no Redis
         """
-        deleted = False
+        if not (self.use_redis and self.redis_client):
+            return 0
+        if not (self.use_mongo and self.mongo_collection is not None):
+            return 0
+
+        warmed = 0
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for collection, _ in self._collections():
+                cursor = collection.find(
+                    {"model_version": model_version}, {"_id": 0}
+                ).batch_size(batch_size)
+                for doc in cursor:
+                    pipe.setex(
+                        self._get_redis_key(doc["customer_id"], model_version),
+                        self.redis_ttl,
+                        json.dumps(doc, default=str),
+                    )
+                    warmed += 1
+                    if warmed % batch_size == 0:
+                        pipe.execute()
+            pipe.execute()
+
+            logger.info(f"Warmed {warmed} keys for model version {model_version}")
+        except Exception as e:
+            logger.error(f"Warm model version error: {e}")
+
+        return warmed
+
+    def purge_model_version(
+        self, model_version: str, batch_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Remove todos os dados de uma versão que não está mais ativa
+
+        As chaves Redis são percorridas com SCAN e removidas com UNLINK em
+        lotes (sem bloquear o Redis); no MongoDB usa `delete_many`.
+
+        Args:
+            model_version: Versão a remover (não pode ser a ativa)
+            batch_size: Quantidade de chaves por lote de UNLINK
+
+        Returns:
+            Dict com contadores: {"redis_keys": int, "mongo_documents": int}
+
+        Raises:
+            ValueError: Se a versão informada for a versão ativa
+        """
+        if model_version == self.get_active_version():
+            raise ValueError(f"Cannot purge active model version {model_version}")
+
+        stats = {"redis_keys": 0, "mongo_documents": 0}
 
         # Remove do Redis
         if self.use_redis and self.redis_client:
             try:
-                self.redis_client.delete(self._get_redis_key(customer_id))
-                logger.info(f"Features removed from Redis for {customer_id}")
-                deleted = True
+                batch = []
+                for key in self.redis_client.scan_iter(
+                    match=self._get_redis_key("*", model_version), count=batch_size
+                ):
+                    batch.append(key)
+                    if len(batch) >= batch_size:
+                        stats["redis_keys"] += self.redis_client.unlink(*batch)
+                        batch = []
+                if batch:
+                    stats["redis_keys"] += self.redis_client.unlink(*batch)
+                self.redis_client.unlink(*self._rollup_keys(model_version))
+                logger.info(
+                    f"Removed {stats['redis_keys']} Redis keys "
+                    f"for model version {model_version}"
+                )
             except Exception as e:
-                logger.error(f"Redis delete error: {e}")
+                logger.error(f"Redis purge error: {e}")
 
         # Remove do MongoDB
         if self.use_mongo and self.mongo_collection is not None:
             try:
-                result = self.mongo_collection.delete_one({"customer_id": customer_id})
-                if result.deleted_count > 0:
-                    logger.info(f"Features removed from MongoDB for {customer_id}")
-                    deleted = True
+                for collection, _ in self._collections():
+                    result = collection.delete_many({"model_version": model_version})
+                    stats["mongo_documents"] += result.deleted_count
+                self.rollups_collection.delete_one({"_id": model_version})
+                logger.info(
+                    f"Removed {stats['mongo_documents']} MongoDB documents "
+                    f"for model version {model_version}"
+                )
             except Exception as e:
-                logger.error(f"MongoDB delete error: {e}")
+                logger.error(f"MongoDB purge error: {e}")
 
-        return deleted
+        return stats
 
-    def bulk_set_features(
-        self, features_list: list, model_version: str = "v1.0.0", ttl_days: int = 7
-    ) -> Dict[str, int]:
+    def export_features(
+        self,
+        model_version: Optional[str] = None,
+        after: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        batch_size: int = 1000,
+        limit: Optional[int] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
         """
-        Armazena features de múltiplos clientes em batch
+        Percorre os documentos de uma versão em ordem de customer_id
+
+        Paginação por keyset sobre o índice único (customer_id, model_version),
+        ou sobre o _id no layout "id": cada lote é uma consulta
+        `customer_id > último` limitada a `batch_size`, sem skip/offset e sem
+        cursor longo no servidor. A memória usada é a de um lote,
+        independente do tamanho da coleção. Durante a migração de layout as
+        duas coleções são intercaladas em ordem de customer_id.
 
         Args:
-            features_list: Lista de dicts com customer_id e features
-                Formato: [{"customer_id": "...", "features": {...}}, ...]
-            model_version: Versão do modelo
-            ttl_days: Dias até expiração
+            model_version: Versão a exportar (padrão: versão ativa)
+            after: Retoma a partir do customer_id seguinte a este
+            fields: Features a incluir (padrão: todas)
+            batch_size: Documentos por lote
+            limit: Máximo de documentos (padrão: todos)
 
-        Returns:
-            Dict com contadores: {"success": int, "failed": int}
+        Yields:
+            Lotes de documentos (sem _id e sem os campos internos
+            content_hash e updated_at)
         """
-        now = datetime.utcnow()
-        expires_at = now + timedelta(days=ttl_days)
+        if not (self.use_mongo and self.mongo_collection is not None):
+            return
+        model_version = model_version or self.get_active_version()
 
-        stats = {"success": 0, "failed": 0}
+        projection: Dict[str, int] = {"_id": 0, "content_hash": 0, "updated_at": 0}
+        if fields is not None:
+            projection = {"_id": 0}
+            projection.update(
+                {"customer_id": 1, "model_version": 1, "calculated_at": 1}
+            )
+            projection.update({f"features.{name}": 1 for name in fields})
 
-        # Prepara documentos
-        docs = []
-        for item in features_list:
-            doc = {
-                "customer_id": item["customer_id"],
-                "features": item["features"],
-                "calculated_at": now.isoformat() + "Z",
-                "model_version": model_version,
-                "expires_at": expires_at,
-            }
-            docs.append(doc)
+        if limit is not None and limit <= 0:
+            return
+        page_size = batch_size if limit is None else min(batch_size, limit)
+        streams = [
+            self._iter_version(
+                collection, keyed_by_id, model_version, after, projection, page_size
+            )
+            for collection, keyed_by_id in self._collections()
+        ]
+        if len(streams) == 1:
+            docs = streams[0]
+        else:
+            docs = heapq.merge(*streams, key=lambda doc: doc["customer_id"])
 
-        # Bulk insert no MongoDB
-        if self.use_mongo and self.mongo_collection is not None:
-            try:
-                from pymongo import ReplaceOne
+        batch = []
+        exported = 0
+        last_customer_id = None
+        for doc in docs:
+            # Documento sendo movido (presente nas duas coleções)
+            if doc["customer_id"] == last_customer_id:
+                continue
+            last_customer_id = doc["customer_id"]
+            batch.append(doc)
+            exported += 1
+            if exported == limit:
+                break
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
-                operations = [
-                    ReplaceOne({"customer_id": doc["customer_id"]}, doc, upsert=True)
-                    for doc in docs
-                ]
+    def _iter_version(
+        self,
+        collection,
+        keyed_by_id: bool,
+        model_version: str,
+        after: Optional[str],
+        projection: Dict[str, int],
+        page_size: int,
+    ) -> Iterator[Dict[str, Any]]:
+        """Documentos de uma versão em ordem de customer_id, página a página"""
+        while True:
+            if keyed_by_id:
+                # ";" é o caractere seguinte a ":": fim do intervalo da versão
+                query: Dict[str, Any] = {
+                    "_id": {
+                        "$gt": self._get_document_id(after or "", model_version),
+                        "$lt": f"{model_version};",
+                    }
+                }
+                cursor = collection.find(query, projection).sort("_id", 1)
+            else:
+                query = {"model_version": model_version}
+                if after is not None:
+                    query["customer_id"] = {"$gt": after}
+                cursor = (
+                    collection.find(query, projection)
+                    .sort("customer_id", 1)
+                    .hint([("customer_id", 1), ("model_version", 1)])
+                )
 
-                result = self.mongo_collection.bulk_write(operations, ordered=False)
-                stats["success"] = result.upserted_count + result.modified_count
+            docs = list(cursor.limit(page_size))
+            yield from docs
+            if len(docs) < page_size:
+                return
+            after = docs[-1]["customer_id"]
 
-                logger.info(f"Bulk insert to MongoDB: {stats['success']} documents")
-            except Exception as e:
-                logger.error(f"MongoDB bulk insert error: {e}")
-                stats["failed"] = len(docs)
+    def _get_bloom_filter(self) -> Optional[BloomFilter]:
+        """
+        Retorna a cópia local do Bloom filter, recarregando se mudou no Redis
 
-        # Cacheia no Redis (em pipeline para performance)
-        if self.use_redis and self.redis_client:
+        A mudança é verificada no máximo a cada `bloom_refresh_interval`
+        segundos (HGETALL dos metadados); o bitmap só é relido quando a geração
+        mudou, ou seja, quando o filtro foi reconstruído. Sem metadados no Redis (filtro nunca construído ou Redis
+        esvaziado) retorna None e o filtro não é usado.
+        """
+        if not (self.use_bloom_filter and self.use_redis and self.redis_client):
+            return None
+
+        now = time.monotonic()
+        if now < self._bloom_checked_until:
+            return self._bloom_filter
+
+        with self._bloom_lock:
+            if now < self._bloom_checked_until:
+                return self._bloom_filter
             try:
-                pipe = self.redis_client.pipeline()
-                for doc in docs:
-                    pipe.setex(
-                        self._get_redis_key(doc["customer_id"]),
-                        self.redis_ttl,
-                        json.dumps(doc, default=str),
+                meta = self.redis_client.hgetall(BLOOM_META_KEY)
+                if "size_bits" not in meta:
+                    self._bloom_filter = None
+                    self._bloom_generation = None
+                elif meta.get("generation") != self._bloom_generation:
+                    data = self.redis_binary_client.get(BLOOM_FILTER_KEY) or b""
+                    self._bloom_filter = BloomFilter(
+                        int(meta["size_bits"]), int(meta["num_hashes"]), data
                     )
-                pipe.execute()
-
-                logger.info(f"Bulk cache to Redis: {len(docs)} keys")
+                    self._bloom_generation = meta.get("generation")
             except Exception as e:
-                logger.error(f"Redis bulk set error: {e}")
+                logger.error(f"Redis Bloom filter load error: {e}")
+                self._bloom_filter = None
+                self._bloom_generation = None
+            self._bloom_checked_until = now + self.bloom_refresh_interval
 
-        return stats
+        return self._bloom_filter
 
-    def health_check(self) -> Dict[str, Any]:
+    def _queue_bloom_add(self, pipe, customer_ids: List[str]) -> None:
+        """Adiciona customer_ids ao Bloom filter (local e, via pipeline, no Redis)"""
+        if not customer_ids:
+            return
+        bloom = self._get_bloom_filter()
+        if bloom is None:
+            return
+
+        for customer_id in customer_ids:
+            operations = []
+            for offset in bloom.offsets(customer_id):
+                operations.extend(("SET", "u1", offset, 1))
+            pipe.execute_command("BITFIELD", BLOOM_FILTER_KEY, *operations)
+            bloom.add(customer_id)
+
+    def _bloom_absent(self, customer_ids: List[str]) -> Set[str]:
         """
-        Verifica saúde das conexões
+        Clientes que o Bloom filter garante ausentes (consultado após um miss
+        no Redis, para dispensar o MongoDB)
 
-        Returns:
-            Dict com status de Redis e MongoDB
+        A cópia local não vê clientes adicionados por outros processos até a
+        próxima reconstrução: um "ausente" local é confirmado nos bits do
+        Redis (BITFIELD GET, um pipeline para o lote) e os clientes achados lá
+        entram na cópia local. Com loader, clientes novos são calculados e o
+        filtro não se aplica.
         """
-        health = {
-            "redis": {"available": False, "status": "unavailable"},
-            "mongodb": {"available": False, "status": "unavailable"},
-        }
+        bloom = self._get_bloom_filter() if self.loader is None else None
+        if bloom is None:
+            return set()
+        candidates = [c for c in customer_ids if c not in bloom]
+        if not candidates:
+            return set()
 
-        # Check Redis
-        if self.use_redis and self.redis_client:
-            try:
-                self.redis_client.ping()
-                info = self.redis_client.info("stats")
-                health["redis"] = {
-                    "available": True,
-                    "status": "healthy",
-                    "total_keys": self.redis_client.dbsize(),
-                    "used_memory": info.get("used_memory_human", "N/A"),
-                }
-            except Exception as e:
-                health["redis"] = {
-                    "available": False,
-                    "status": "unhealthy",
-                    "error": str(e),
-                }
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for customer_id in candidates:
+                operations = []
+                for offset in bloom.offsets(customer_id):
+                    operations.extend(("GET", "u1", offset))
+                pipe.execute_command("BITFIELD", BLOOM_FILTER_KEY, *operations)
+            bits = pipe.execute()
+        except Exception as e:
+            # Sem confirmação, segue para o MongoDB
+            logger.error(f"Redis Bloom filter check error: {e}")
+            return set()
 
-        # Check MongoDB
-        if self.use_mongo and self.mongo_client:
-            try:
-                self.mongo_client.server_info()
-                count = self.mongo_collection.count_documents({})
-                health["mongodb"] = {
+        absent = set()
+        for customer_id, values in zip(candidates, bits):
+            if all(values):
+                bloom.add(customer_id)
+            else:
+                absent.add(customer_id)
+        return absent
+
+    def rebuild_bloom_filter(
+        self, capacity: int, error_rate: float = 0.01, batch_size: int = 10000
+    ) -> int:
+        """
+        Reconstrói o Bloom filter a partir dos customer_ids do MongoDB
+
+        O filtro é montado em memória, gravado numa chave temporária e trocado
+        com RENAME. Clientes gravados durante a reconstrução são readicionados
+        ao final. Também remove os bits de clientes já deletados.
+
+        Args:
+            capacity: Quantidade esperada de clientes
+            error_rate: Taxa de falso positivo desejada
+            batch_size: Tamanho do lote do cursor do MongoDB
+
+        Returns:
+            int: Quantidade de documentos indexados
+        """
+        if not (self.use_redis and self.redis_client):
+            return 0
+        if not (self.use_mongo and self.mongo_collection is not None):
+            return 0
+
+        started_at = _timestamp(datetime.utcnow())
+        bloom = BloomFilter.for_capacity(capacity, error_rate)
+
+        indexed = 0
+        for collection, _ in self._collections():
+            cursor = collection.find({}, {"_id": 0, "customer_id": 1}).batch_size(
+                batch_size
+            )
+            for doc in cursor:
+                bloom.add(doc["customer_id"])
+                indexed += 1
+
+        temp_key = f"{BLOOM_FILTER_KEY}:rebuild"
+        self.redis_binary_client.set(temp_key, bloom.to_bytes())
+
+        pipe = self.redis_client.pipeline()
+        pipe.rename(temp_key, BLOOM_FILTER_KEY)
+        pipe.delete(BLOOM_META_KEY)
+        pipe.hset(
+            BLOOM_META_KEY,
+            mapping={
+                "size_bits": bloom.size_bits,
+                "num_hashes": bloom.num_hashes,
+                "capacity": capacity,
+                "error_rate": error_rate,
+                "generation": int(time.time() * 1000),
+            },
+        )
+        pipe.execute()
+
+        # Força recarga local e readiciona quem foi gravado durante a reconstrução
+        self._bloom_checked_until = 0.0
+        recent = [
+            doc["customer_id"]
+            for collection, _ in self._collections()
+            for doc in collection.find(
+                {"calculated_at": {"$gte": started_at}}, {"_id": 0, "customer_id": 1}
+            )
+        ]
+        if recent:
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._queue_bloom_add(pipe, recent)
+            pipe.execute()
+
+        logger.info(
+            f"Bloom filter rebuilt with {indexed} documents "
+            f"({bloom.size_bits} bits, {bloom.num_hashes} hashes)"
+        )
+        return indexed
+
+    def clear_negative_cache(self, batch_size: int = 1000) -> int:
+        """
+        Remove todas as entradas de cache negativo do Redis (SCAN + UNLINK)
+
+        Args:
+            batch_size: Quantidade de chaves por lote
+
+        Returns:
+            int: Quantidade de entradas removidas
+        """
+        if not (self.use_redis and self.redis_client):
+            return 0
+
+        removed = 0
+        batch = []
+
+        def flush(keys):
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.strlen(key)
+            lengths = pipe.execute(raise_on_error=False)
+            negative = [key for key, length in zip(keys, lengths) if length == 0]
+            return self.redis_client.unlink(*negative) if negative else 0
+
+        for key in self.redis_client.scan_iter(match="features:*:*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                removed += flush(batch)
+                batch = []
+        if batch:
+            removed += flush(batch)
+
+        logger.info(f"Removed {removed} negative cache entries")
+        return removed
+
+    def _rollup_keys(self, model_version: str) -> List[str]:
+        return [
+            ROLLUP_STATS_KEY.format(model_version=model_version),
+            ROLLUP_SKETCH_KEY.format(model_version=model_version),
+        ]
+
+    def _apply_rollup(self, model_version: str, delta: RollupDelta) -> None:
+        """Aplica no Redis, atomicamente, as alterações de um lote de escritas"""
+        if not (self.feature_rollups and delta):
+            return
+        try:
+            keys = self._rollup_keys(model_version)
+            args = [rollups.META_FIELD, delta.script_args()]
+            if not self._apply_rollup_script(keys=keys, args=args):
+                # Versão ainda não está no Redis: parte do último checkpoint
+                self._restore_rollup(model_version)
+                self._apply_rollup_script(keys=keys, args=args)
+        except Exception as e:
+            logger.error(f"Feature rollup update error: {e}")
+            return
+
+        if not self.rollup_checkpoint_interval:
+            return
+        with self._rollups_lock:
+            self._rollups_dirty.add(model_version)
+            now = time.monotonic()
+            if now < self._rollups_checkpoint_at:
+                return
+            versions, self._rollups_dirty = self._rollups_dirty, set()
+            self._rollups_checkpoint_at = now + self.rollup_checkpoint_interval
+        for version in versions:
+            self.checkpoint_rollups(version)
+
+    def _restore_rollup(self, model_version: str) -> None:
+        """Inicializa a versão no Redis com o checkpoint do MongoDB (ou vazia)"""
+        checkpoint = self.rollups_collection.find_one({"_id": model_version})
+        features = checkpoint["features"] if checkpoint else []
+        marker = checkpoint["checkpointed_at"].isoformat() if checkpoint else "empty"
+        self._restore_rollup_script(
+            keys=self._rollup_keys(model_version),
+            args=[
+                rollups.META_FIELD,
+                marker,
+                json.dumps(rollups.document_to_snapshot(features)),
+            ],
+        )
+
+    def _remove_from_rollups(
+        self, mongo_filters: List[Tuple[Any, Dict[str, Any]]], batch_size: int = 1000
+    ) -> None:
+        """
+        Retira das estatísticas os documentos que `mongo_filters` selecionam
+
+        Chamado antes do delete_many: lê só model_version e features, e
+        aplica um delta por versão.
+        """
+        if not self.feature_rollups:
+            return
+        deltas: Dict[str, RollupDelta] = {}
+        for collection, mongo_filter in mongo_filters:
+            for doc in collection.find(
+                mongo_filter, {"_id": 0, "model_version": 1, "features": 1}
+            ).batch_size(batch_size):
+                delta = deltas.setdefault(doc["model_version"], RollupDelta())
+                delta.remove(doc.get("features"))
+        for model_version, delta in deltas.items():
+            self._apply_rollup(model_version, delta)
+
+    def _legacy_features(
+        self, customer_ids: List[str], model_version: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """Features dos documentos ainda na coleção antiga (layout "migrating")"""
+        if self.legacy_collection is None or not customer_ids:
+            return {}
+        return {
+            doc["customer_id"]: doc.get("features")
+            for doc in self.legacy_collection.find(
+                {"customer_id": {"$in": customer_ids}, "model_version": model_version},
+                {"_id": 0, "customer_id": 1, "features": 1},
+            )
+        }
+
+    def checkpoint_rollups(self, model_version: str) -> bool:
+        """
+        Copia as estatísticas de uma versão do Redis para o MongoDB
+
+        Chamado a cada `rollup_checkpoint_interval` segundos pelas escritas;
+        o checkpoint é o ponto de partida se o Redis perder os dados.
+
+        Returns:
+            bool: True se o checkpoint foi gravado
+        """
+        if not self.feature_rollups:
+            return False
+        try:
+            stats_key, sketch_key = self._rollup_keys(model_version)
+            # MULTI: os dois hashes lidos no mesmo instante
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.hgetall(stats_key)
+            pipe.hgetall(sketch_key)
+            stats_fields, sketch_fields = pipe.execute()
+            if rollups.META_FIELD not in stats_fields:
+                return False
+            self.rollups_collection.replace_one(
+                {"_id": model_version},
+                {
+                    "features": rollups.snapshot_to_document(
+                        stats_fields, sketch_fields
+                    ),
+                    "checkpointed_at": datetime.utcnow(),
+                },
+                upsert=True,
+            )
+            logger.info(f"Feature rollups checkpointed for {model_version}")
+            return True
+        except Exception as e:
+            logger.error(f"Feature rollup checkpoint error: {e}")
+            return False
+
+    def get_feature_rollups(
+        self,
+        model_version: Optional[str] = None,
+        quantiles: Iterable[float] = rollups.DEFAULT_QUANTILES,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Estatísticas das features de uma versão, sem varrer a coleção
+
+        Lê os dois hashes da versão no Redis (custo proporcional ao número de
+        features, não de documentos). Se a versão não estiver no Redis, ela
+        é restaurada do checkpoint; sem Redis, o checkpoint é devolvido.
+
+        Args:
+            model_version: Versão a consultar (padrão: versão ativa)
+            quantiles: Frações dos quantis estimados
+
+        Returns:
+            Dict com model_version, source ("redis" ou "checkpoint") e
+            features (contagem, média, variância, desvio, min/max e quantis
+            por feature), ou None se desligado ou indisponível
+        """
+        if not self.feature_rollups:
+            return None
+        model_version = model_version or self.get_active_version()
+
+        try:
+            stats_key, sketch_key = self._rollup_keys(model_version)
+            for _ in range(2):
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.hgetall(stats_key)
+                pipe.hgetall(sketch_key)
+                stats_fields, sketch_fields = pipe.execute()
+                if rollups.META_FIELD in stats_fields:
+                    break
+                self._restore_rollup(model_version)
+            stats_fields.pop(rollups.META_FIELD, None)
+            source = "redis"
+            features = {
+                name: rollups.parse_stats(raw) for name, raw in stats_fields.items()
+            }
+            sketches = rollups.split_sketch(sketch_fields)
+        except Exception as e:
+            logger.error(f"Redis get feature rollups error: {e}")
+            try:
+                checkpoint = self.rollups_collection.find_one({"_id": model_version})
+            except Exception as e:
+                logger.error(f"MongoDB get feature rollups error: {e}")
+                return None
+            source = "checkpoint"
+            items = checkpoint["features"] if checkpoint else []
+            features = {item["name"]: item for item in items}
+            sketches = {item["name"]: item.get("sketch", {}) for item in items}
+
+        return {
+            "model_version": model_version,
+            "source": source,
+            "features": {
+                name: rollups.summarize(stats, sketches.get(name, {}), quantiles)
+                for name, stats in sorted(features.items())
+            },
+        }
+
+    def rebuild_rollups(
+        self, model_version: str, batch_size: int = 1000
+    ) -> Dict[str, int]:
+        """
+        Recalcula as estatísticas de uma versão a partir do MongoDB
+
+        Varre a versão uma vez (paginação pelo índice de busca) para iniciar
+        as estatísticas de dados já carregados ou corrigir desvios (ex.:
+        escritas diretas no MongoDB). Escritas feitas durante a varredura
+        podem ficar de fora: rode fora dos horários de carga.
+
+        Returns:
+            Dict com contadores: {"documents": int, "features": int}
+        """
+        if not self.feature_rollups:
+            raise ValueError("Feature rollups are disabled")
+
+        delta = RollupDelta()
+        documents = 0
+        for collection, keyed_by_id in self._collections():
+            for doc in self._iter_version(
+                collection,
+                keyed_by_id,
+                model_version,
+                None,
+                {"_id": 0, "customer_id": 1, "features": 1},
+                batch_size,
+            ):
+                delta.add(doc.get("features"))
+                documents += 1
+
+        keys = self._rollup_keys(model_version)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(*keys)
+        self._restore_rollup_script(
+            keys=keys,
+            args=[rollups.META_FIELD, "rebuilt", json.dumps(delta.snapshot())],
+            client=pipe,
+        )
+        pipe.execute()
+        self.checkpoint_rollups(model_version)
+
+        logger.info(
+            f"Rebuilt feature rollups of {model_version} from {documents} documents"
+        )
+        return {"documents": documents, "features": len(delta.added)}
+
+    def get_features(
+        self,
+        customer_id: str,
+        model_version: Optional[str] = None,
+        bulkhead: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Recupera features de um cliente (Redis → MongoDB → None)
+
+        Clientes desconhecidos são respondidos pelo cache negativo do Redis
+        ou, após um miss no Redis, sem consultar o MongoDB quando o Bloom
+        filter indica ausência.
+
+        Args:
+            customer_id: ID do cliente
+            model_version: Versão a consultar (padrão: versão ativa)
+            bulkhead: Se a consulta ao MongoDB passa pelo bulkhead (e pelo
+                micro-batcher); False para reler o que acabou de ser gravado
+
+        Returns:
+            Dict com features ou None se não encontrado
+        """
+        cache_logger.info(
+            "Fetching features for customer_id: %s",
+            customer_id,
+            extra={"event": "lookup"},
+        )
+        model_version = model_version or self.get_active_version()
+        if self.admission is not None:
+            self.admission.record(f"{model_version}:{customer_id}")
+
+        # Micro-batching: segue junto com as leituras concorrentes da janela
+        if self._read_batcher is not None and bulkhead:
+            return self._read_batcher.load((customer_id, model_version))
+
+        # Tenta Redis primeiro (cache L1)
+        if self.use_redis and self.redis_client:
+            try:
+                with phase("redis"):
+                    key = self._get_redis_key(customer_id, model_version)
+                    if self._use_get_script():
+                        cached = self._get_features_script(
+                            keys=[key, CACHE_STATS_KEY],
+                            args=self._get_script_args(model_version),
+                        )
+                    else:
+                        cached = self.redis_client.get(key)
+                if cached == NEGATIVE_CACHE_MARKER:
+                    cache_logger.info(
+                        "Features negative cache HIT for %s",
+                        customer_id,
+                        extra={"event": "negative_hit"},
+                    )
+                    return None
+                if cached:
+                    cache_logger.info(
+                        "Features cache HIT for %s (Redis)",
+                        customer_id,
+                        extra={"event": "hit"},
+                    )
+                    with phase("decode"):
+                        doc = json.loads(cached)
+                    self._remember_stale(customer_id, model_version, doc)
+                    return doc
+            except Exception as e:
+                cache_logger.error("Redis get error: %s", e, extra={"event": "error"})
+
+        # Bloom filter: "definitivamente ausente" dispensa o MongoDB
+        if self._bloom_absent([customer_id]):
+            cache_logger.info(
+                "Features absent for %s (Bloom filter)",
+                customer_id,
+                extra={"event": "bloom_absent"},
+            )
+            return None
+
+        # Tenta MongoDB (persistência L2)
+        if self.use_mongo and self.mongo_collection is not None:
+            slot = self.mongo_bulkhead.slot() if bulkhead else contextlib.nullcontext()
+            try:
+                with slot, phase("mongo"):
+                    doc = self._find_document(
+                        customer_id, model_version, {"_id": 0}  # Exclui o _id
+                    )
+
+                if doc:
+                    cache_logger.info(
+                        "Features cache MISS Redis, HIT MongoDB for %s",
+                        customer_id,
+                        extra={"event": "miss"},
+                    )
+
+                    # Atualiza o cache Redis (se admitido pela política)
+                    ttl = self._backfill_ttl(customer_id, model_version)
+                    if ttl and self.use_redis and self.redis_client:
+                        try:
+                            with phase("redis_backfill"):
+                                self._backfill(
+                                    self._get_redis_key(customer_id, model_version),
+                                    doc,
+                                    ttl,
+                                )
+                        except Exception as e:
+                            cache_logger.error(
+                                "Redis set error: %s", e, extra={"event": "error"}
+                            )
+
+                    self._remember_stale(customer_id, model_version, doc)
+                    return doc
+
+                # Camada L3: calcula, grava no MongoDB e no Redis e devolve
+                settled = True
+                if self.loader is not None:
+                    computed = self.loader.load_many([customer_id], model_version)
+                    doc = computed.get(customer_id)
+                    if doc:
+                        cache_logger.info(
+                            "Features computed by the loader for %s",
+                            customer_id,
+                            extra={"event": "computed"},
+                        )
+                        return doc
+                    # Timeout, pool cheio ou falha: sem cache negativo
+                    settled = customer_id in computed
+
+                # Cache negativo: evita novo find_one até o TTL curto expirar.
+                # NX: não sobrescreve um documento gravado nesse meio tempo
+                if settled and self.use_redis and self.redis_client:
+                    try:
+                        self.redis_client.set(
+                            self._get_redis_key(customer_id, model_version),
+                            NEGATIVE_CACHE_MARKER,
+                            ex=self.negative_cache_ttl,
+                            nx=True,
+                        )
+                    except Exception as e:
+                        cache_logger.error(
+                            "Redis set error: %s", e, extra={"event": "error"}
+                        )
+            except BulkheadFull:
+                cache_logger.warning(
+                    "MongoDB bulkhead full, shedding lookup for %s",
+                    customer_id,
+                    extra={"event": "shed"},
+                )
+                raise ServiceOverloaded(
+                    customer_id, self._get_stale(customer_id, model_version)
+                )
+            except Exception as e:
+                cache_logger.error("MongoDB get error: %s", e, extra={"event": "error"})
+
+        cache_logger.warning(
+            "Features not found for customer_id: %s",
+            customer_id,
+            extra={"event": "not_found"},
+        )
+        return None
+
+    def get_features_metadata(
+        self, customer_id: str, model_version: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Recupera só os metadados de um cliente, para validar requisições
+        condicionais sem buscar e decodificar o documento completo
+
+        No Redis a extração é feita por script Lua; no MongoDB, por projeção.
+        Um miss aqui não popula o cache (a requisição completa o fará).
+
+        Args:
+            customer_id: ID do cliente
+            model_version: Versão a consultar (padrão: versão ativa)
+
+        Returns:
+            Dict com calculated_at, model_version e expires_at, ou None se
+            não encontrado ou indisponível
+        """
+        model_version = model_version or self.get_active_version()
+
+        if self.use_redis and self._features_metadata_script is not None:
+            try:
+                with phase("redis"):
+                    cached = self._features_metadata_script(
+                        keys=[self._get_redis_key(customer_id, model_version)]
+                    )
+                if cached == NEGATIVE_CACHE_MARKER:
+                    return None
+                if cached:
+                    return dict(zip(METADATA_FIELDS, cached))
+            except Exception as e:
+                cache_logger.error(
+                    "Redis metadata error: %s", e, extra={"event": "error"}
+                )
+
+        if self._bloom_absent([customer_id]):
+            return None
+
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                with self.mongo_bulkhead.slot(), phase("mongo"):
+                    return self._find_document(
+                        customer_id,
+                        model_version,
+                        {"_id": 0, **{field: 1 for field in METADATA_FIELDS}},
+                    )
+            except BulkheadFull:
+                # A requisição completa decide entre valor antigo e 503
+                return None
+            except Exception as e:
+                cache_logger.error(
+                    "MongoDB metadata error: %s", e, extra={"event": "error"}
+                )
+
+        return None
+
+    def _load_batch(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Any]:
+        """Executa um lote do micro-batcher: chaves (customer_id, model_version)"""
+        by_version: Dict[str, List[str]] = {}
+        for customer_id, model_version in keys:
+            by_version.setdefault(model_version, []).append(customer_id)
+
+        results = {}
+        for model_version, customer_ids in by_version.items():
+            batch = self._get_features_batch(customer_ids, model_version)
+            for customer_id, value in batch.items():
+                results[(customer_id, model_version)] = value
+        return results
+
+    def _get_features_batch(
+        self, customer_ids: List[str], model_version: str
+    ) -> Dict[str, Any]:
+        """
+        Mesmo fluxo de `get_features` para vários clientes de uma versão:
+        um MGET no Redis, um `find` com `$in` no MongoDB e um pipeline de
+        backfill
+
+        Returns:
+            Dict customer_id → documento, None (não encontrado) ou
+            ServiceOverloaded (consulta descartada pelo bulkhead)
+        """
+        results: Dict[str, Any] = {}
+        pending = list(customer_ids)
+
+        # Redis (cache L1): um MGET para o lote
+        if pending and self.use_redis and self.redis_client:
+            try:
+                keys = [self._get_redis_key(c, model_version) for c in pending]
+                with phase("redis"):
+                    if self._use_get_script():
+                        # Um EVALSHA por chave, todos no mesmo pipeline
+                        args = self._get_script_args(model_version)
+
+                        def queue_gets(pipe):
+                            for key in keys:
+                                self._queue_script(
+                                    pipe,
+                                    self._get_features_script,
+                                    [key, CACHE_STATS_KEY],
+                                    args,
+                                )
+
+                        cached = self._execute_scripts(queue_gets)
+                    else:
+                        cached = self.redis_client.mget(keys)
+                misses = []
+                for customer_id, value in zip(pending, cached):
+                    if value == NEGATIVE_CACHE_MARKER:
+                        results[customer_id] = None
+                    elif value:
+                        cache_logger.info(
+                            "Features cache HIT for %s (Redis)",
+                            customer_id,
+                            extra={"event": "hit"},
+                        )
+                        with phase("decode"):
+                            doc = json.loads(value)
+                        self._remember_stale(customer_id, model_version, doc)
+                        results[customer_id] = doc
+                    else:
+                        misses.append(customer_id)
+                pending = misses
+            except Exception as e:
+                cache_logger.error("Redis get error: %s", e, extra={"event": "error"})
+
+        # Bloom filter: os "definitivamente ausentes" não vão ao MongoDB
+        absent = self._bloom_absent(pending) if pending else set()
+        for customer_id in absent:
+            results[customer_id] = None
+        pending = [c for c in pending if c not in absent]
+
+        # MongoDB (persistência L2): um find com $in para os misses
+        if pending and self.use_mongo and self.mongo_collection is not None:
+            try:
+                with self.mongo_bulkhead.slot(), phase("mongo"):
+                    found = self._find_documents(pending, model_version)
+
+                # Camada L3: os ausentes são calculados em uma única chamada
+                computed = {}
+                unsettled = set()
+                missing = [c for c in pending if c not in found]
+                if missing and self.loader is not None:
+                    loaded = self.loader.load_many(missing, model_version)
+                    computed = {c: doc for c, doc in loaded.items() if doc}
+                    unsettled = {c for c in missing if c not in loaded}
+
+                if self.use_redis and self.redis_client:
+                    try:
+                        with phase("redis_backfill"):
+                            # (chave, documento ou None para o cache negativo, TTL)
+                            writes = []
+                            for customer_id in pending:
+                                if customer_id in computed or customer_id in unsettled:
+                                    continue  # gravado pelo loader ou em cálculo
+                                key = self._get_redis_key(customer_id, model_version)
+                                doc = found.get(customer_id)
+                                if doc is None:
+                                    writes.append((key, None, None))
+                                    continue
+                                ttl = self._backfill_ttl(customer_id, model_version)
+                                if ttl:
+                                    writes.append((key, doc, ttl))
+
+                            def queue_backfill(pipe):
+                                for key, doc, ttl in writes:
+                                    if doc is None:
+                                        pipe.set(
+                                            key,
+                                            NEGATIVE_CACHE_MARKER,
+                                            ex=self.negative_cache_ttl,
+                                            nx=True,
+                                        )
+                                    else:
+                                        self._backfill(key, doc, ttl, client=pipe)
+
+                            self._execute_scripts(queue_backfill)
+                    except Exception as e:
+                        cache_logger.error(
+                            "Redis set error: %s", e, extra={"event": "error"}
+                        )
+
+                for customer_id, doc in found.items():
+                    cache_logger.info(
+                        "Features cache MISS Redis, HIT MongoDB for %s",
+                        customer_id,
+                        extra={"event": "miss"},
+                    )
+                    self._remember_stale(customer_id, model_version, doc)
+                    results[customer_id] = doc
+                for customer_id, doc in computed.items():
+                    cache_logger.info(
+                        "Features computed by the loader for %s",
+                        customer_id,
+                        extra={"event": "computed"},
+                    )
+                    results[customer_id] = doc
+            except BulkheadFull:
+                for customer_id in pending:
+                    cache_logger.warning(
+                        "MongoDB bulkhead full, shedding lookup for %s",
+                        customer_id,
+                        extra={"event": "shed"},
+                    )
+                    results[customer_id] = ServiceOverloaded(
+                        customer_id, self._get_stale(customer_id, model_version)
+                    )
+            except Exception as e:
+                cache_logger.error("MongoDB get error: %s", e, extra={"event": "error"})
+
+        for customer_id in pending:
+            if customer_id not in results:
+                cache_logger.warning(
+                    "Features not found for customer_id: %s",
+                    customer_id,
+                    extra={"event": "not_found"},
+                )
+                results[customer_id] = None
+        return results
+
+    def _backfill_ttl(self, customer_id: str, model_version: str) -> Optional[int]:
+        """TTL do backfill de uma leitura do MongoDB, ou None se não admitida"""
+        full_ttl = self.redis_ttl
+        if self.cache_idle_ttl:
+            full_ttl = min(self.cache_idle_ttl, full_ttl)
+        if self.admission is None:
+            return full_ttl
+        return self.admission.ttl_for(f"{model_version}:{customer_id}", full_ttl)
+
+    def _backfill(
+        self,
+        key: str,
+        doc: Dict[str, Any],
+        ttl: int,
+        client=None,
+        keep_ttl: bool = False,
+    ) -> None:
+        """
+        Grava no Redis um documento lido do MongoDB (compare-and-set em
+        calculated_at: não sobrescreve uma versão mais nova já cacheada);
+        com `keep_ttl`, uma chave já cacheada mantém o TTL que tinha
+        """
+        keys = [key]
+        args = [
+            json.dumps(doc, default=str),
+            ttl,
+            str(doc.get("calculated_at") or ""),
+            1 if keep_ttl else 0,
+        ]
+        if client is None:
+            self._backfill_features_script(keys=keys, args=args)
+        else:
+            self._queue_script(client, self._backfill_features_script, keys, args)
+
+    def _queue_script(self, pipe, script, keys: List[str], args: List[Any]) -> None:
+        """
+        Enfileira um EVALSHA sem registrar o Script no pipeline (com ele o
+        redis-py faria um SCRIPT EXISTS a cada execute); use com
+        `_execute_scripts`
+        """
+        pipe.execute_command("EVALSHA", script.sha, len(keys), *keys, *args)
+
+    def _execute_scripts(self, queue: Callable[[Any], None]) -> list:
+        """
+        Monta com `queue(pipe)` e executa um pipeline de scripts enfileirados
+        por `_queue_script`, em um round trip. Se o Redis perdeu os scripts
+        (reinício ou SCRIPT FLUSH), carrega todos e repete uma vez.
+        """
+        for attempt in range(2):
+            pipe = self.redis_client.pipeline(transaction=False)
+            queue(pipe)
+            try:
+                return pipe.execute()
+            except redis.exceptions.NoScriptError:
+                if attempt:
+                    raise
+                self._load_scripts()
+
+    def _load_scripts(self) -> None:
+        """Carrega (SCRIPT LOAD) os scripts Lua do serviço no Redis"""
+        for script in (
+            self._features_metadata_script,
+            self._get_features_script,
+            self._backfill_features_script,
+            self._apply_rollup_script,
+            self._restore_rollup_script,
+        ):
+            self.redis_client.script_load(script.script)
+
+    def _use_get_script(self) -> bool:
+        """Leituras passam pelo script Lua só quando há algo além do GET"""
+        return self.cache_idle_ttl > 0 or self.cache_hit_counters
+
+    def _get_script_args(
+        self, model_version: str, count_misses: bool = True
+    ) -> List[Any]:
+        counters = 0
+        if self.cache_hit_counters:
+            counters = 1 if count_misses else 2
+        return [self.cache_idle_ttl, model_version, counters]
+
+    def _remember_stale(
+        self, customer_id: str, model_version: str, doc: Dict[str, Any]
+    ) -> None:
+        """Guarda o documento no cache em memória usado quando há descarte"""
+        if not self.stale_cache_size:
+            return
+        key = (customer_id, model_version)
+        with self._stale_lock:
+            self._stale_cache[key] = doc
+            self._stale_cache.move_to_end(key)
+            if len(self._stale_cache) > self.stale_cache_size:
+                self._stale_cache.popitem(last=False)
+
+    def _get_stale(
+        self, customer_id: str, model_version: str
+    ) -> Optional[Dict[str, Any]]:
+        if not self.stale_cache_size:
+            return None
+        with self._stale_lock:
+            doc = self._stale_cache.get((customer_id, model_version))
+            if doc is not None:
+                self.stale_served += 1
+        return doc
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Métricas em memória deste processo
+
+        Returns:
+            Dict com o estado do bulkhead do MongoDB (fila, descartes), da
+            política de admissão, do micro-batching de leituras, do loader
+            e do cache de valores antigos; com `cache_hit_counters`, também os
+            contadores de hit/miss do Redis (somados entre processos)
+        """
+        return {
+            "cache_counters": self.get_cache_counters(),
+            "mongo_bulkhead": self.mongo_bulkhead.stats(),
+            "admission": (
+                self.admission.stats() if self.admission is not None else None
+            ),
+            "read_batching": (
+                self._read_batcher.stats() if self._read_batcher is not None else None
+            ),
+            "loader": self.loader.stats() if self.loader is not None else None,
+            "stale_cache": {
+                "size": len(self._stale_cache),
+                "max_size": self.stale_cache_size,
+                "served": self.stale_served,
+            },
+        }
+
+    def get_cache_counters(self) -> Optional[Dict[str, Dict[str, int]]]:
+        """
+        Contadores de leitura mantidos pelo script de GET no Redis
+
+        Returns:
+            Dict versão → {"hits", "misses", "negative_hits"}, ou None se a
+            contagem estiver desligada ou o Redis indisponível
+        """
+        if not (self.cache_hit_counters and self.use_redis and self.redis_client):
+            return None
+        counters: Dict[str, Dict[str, int]] = {}
+        try:
+            for field, value in self.redis_client.hgetall(CACHE_STATS_KEY).items():
+                counter, _, model_version = field.partition(":")
+                version = counters.setdefault(
+                    model_version, {"hits": 0, "misses": 0, "negative_hits": 0}
+                )
+                version[counter] = int(value)
+        except Exception as e:
+            logger.error(f"Redis cache counters error: {e}")
+            return None
+        return counters
+
+    def set_features(
+        self,
+        customer_id: str,
+        features: Dict[str, Any],
+        model_version: Optional[str] = None,
+        ttl_days: int = 7,
+    ) -> bool:
+        """
+        Armazena features de um cliente (MongoDB + Redis)
+
+        Args:
+            customer_id: ID do cliente
+            features: Dicionário com as features
+            model_version: Versão do modelo que gerou as features (padrão:
+                versão ativa)
+            ttl_days: Dias até expiração (padrão: 7)
+
+        Returns:
+            bool: True se sucesso, False se falhou
+        """
+        model_version = model_version or self.get_active_version()
+        now = datetime.utcnow()
+        doc = self._build_document(
+            customer_id, features, model_version, now, now + timedelta(days=ttl_days)
+        )
+
+        success = False
+
+        # Salva no MongoDB (persistência)
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                if self.feature_rollups:
+                    # Devolve as features substituídas, que saem das estatísticas
+                    previous = self.mongo_collection.find_one_and_replace(
+                        self._document_filter(customer_id, model_version),
+                        doc,
+                        projection={"_id": 0, "features": 1},
+                        upsert=True,
+                    )
+                    replaced = (
+                        previous.get("features")
+                        if previous
+                        else self._legacy_features([customer_id], model_version).get(
+                            customer_id
+                        )
+                    )
+                else:
+                    self.mongo_collection.replace_one(
+                        self._document_filter(customer_id, model_version),
+                        doc,
+                        upsert=True,
+                    )
+                self._discard_legacy(model_version, [customer_id])
+                cache_logger.info(
+                    "Features saved to MongoDB for %s",
+                    customer_id,
+                    extra={"event": "write"},
+                )
+                success = True
+
+                if self.feature_rollups:
+                    delta = RollupDelta()
+                    delta.remove(replaced)
+                    delta.add(features)
+                    self._apply_rollup(model_version, delta)
+            except Exception as e:
+                cache_logger.error("MongoDB set error: %s", e, extra={"event": "error"})
+
+        # Salva no Redis (cache) e marca o cliente no Bloom filter
+        if self.use_redis and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.setex(
+                    self._get_redis_key(customer_id, model_version),
+                    self.redis_ttl,
+                    json.dumps(doc, default=str),
+                )
+                self._queue_bloom_add(pipe, [customer_id])
+                pipe.execute()
+                cache_logger.info(
+                    "Features cached in Redis for %s",
+                    customer_id,
+                    extra={"event": "write"},
+                )
+                success = True
+            except Exception as e:
+                cache_logger.error("Redis set error: %s", e, extra={"event": "error"})
+
+        return success
+
+    def update_features(
+        self,
+        customer_id: str,
+        features: Dict[str, Any],
+        model_version: Optional[str] = None,
+    ) -> bool:
+        """
+        Atualiza parcialmente as features de um cliente (MongoDB + Redis)
+
+        Apenas as features informadas são alteradas: no MongoDB via `$set` nos
+        caminhos `features.*` e no Redis mesclando as features no documento
+        cacheado (`_patch_cached`). O `expires_at` e o TTL do cache são
+        preservados.
+
+        Args:
+            customer_id: ID do cliente
+            features: Dicionário com as features alteradas
+            model_version: Versão a atualizar (padrão: versão ativa)
+
+        Returns:
+            bool: True se atualizado, False se não encontrado ou se falhou
+        """
+        model_version = model_version or self.get_active_version()
+        updated_at = datetime.utcnow()
+        calculated_at = _timestamp(updated_at)
+        updated = False
+
+        # Atualiza no MongoDB (persistência)
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                self._move_from_legacy(model_version, [customer_id])
+                update = self._build_features_update(
+                    features, calculated_at, updated_at
+                )
+                if self.feature_rollups:
+                    previous = self.mongo_collection.find_one_and_update(
+                        self._document_filter(customer_id, model_version),
+                        update,
+                        projection={"_id": 1, **{f"features.{n}": 1 for n in features}},
+                    )
+                    matched = previous is not None
+                else:
+                    matched = (
+                        self.mongo_collection.update_one(
+                            self._document_filter(customer_id, model_version), update
+                        ).matched_count
+                        > 0
+                    )
+                if not matched:
+                    cache_logger.warning(
+                        "Features not found for customer_id: %s",
+                        customer_id,
+                        extra={"event": "not_found"},
+                    )
+                    return False
+                cache_logger.info(
+                    "Features updated in MongoDB for %s",
+                    customer_id,
+                    extra={"event": "write"},
+                )
+                updated = True
+
+                if self.feature_rollups:
+                    delta = RollupDelta()
+                    delta.remove(previous.get("features"))
+                    delta.add(features)
+                    self._apply_rollup(model_version, delta)
+            except Exception as e:
+                cache_logger.error(
+                    "MongoDB update error: %s", e, extra={"event": "error"}
+                )
+
+        # Atualiza no Redis (cache), somente se a chave já estiver cacheada
+        if self.use_redis and self.redis_client:
+            try:
+                patched = self._patch_cached(
+                    [(self._get_redis_key(customer_id, model_version), features)],
+                    calculated_at,
+                    updated_at,
+                )
+                if patched:
+                    cache_logger.info(
+                        "Features updated in Redis for %s",
+                        customer_id,
+                        extra={"event": "write"},
+                    )
+                    updated = True
+            except Exception as e:
+                cache_logger.error(
+                    "Redis update error: %s", e, extra={"event": "error"}
+                )
+
+        return updated
+
+    def bulk_update_features(
+        self, updates_list: list, model_version: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Atualiza parcialmente as features de múltiplos clientes em batch
+
+        Args:
+            updates_list: Lista de dicts com customer_id e features alteradas
+                Formato: [{"customer_id": "...", "features": {...}}, ...]
+            model_version: Versão a atualizar (padrão: versão ativa)
+
+        Returns:
+            Dict com contadores: {"success": int, "failed": int}
+        """
+        model_version = model_version or self.get_active_version()
+        updated_at = datetime.utcnow()
+        calculated_at = _timestamp(updated_at)
+
+        stats = {"success": 0, "failed": 0}
+
+        # Bulk update no MongoDB
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                from pymongo import UpdateOne
+
+                customer_ids = [item["customer_id"] for item in updates_list]
+                self._move_from_legacy(model_version, customer_ids)
+                # Valores atuais das features alteradas, para as estatísticas
+                before = (
+                    self._find_documents(customer_ids, model_version)
+                    if self.feature_rollups
+                    else {}
+                )
+                operations = [
+                    UpdateOne(
+                        self._document_filter(item["customer_id"], model_version),
+                        self._build_features_update(
+                            item["features"], calculated_at, updated_at
+                        ),
+                    )
+                    for item in updates_list
+                ]
+
+                result = self.mongo_collection.bulk_write(operations, ordered=False)
+                stats["success"] = result.matched_count
+                stats["failed"] = len(updates_list) - result.matched_count
+
+                cache_logger.info(
+                    "Bulk update to MongoDB: %s documents",
+                    stats["success"],
+                    extra={"event": "bulk_write"},
+                )
+
+                if self.feature_rollups:
+                    delta = RollupDelta()
+                    for item in updates_list:
+                        current = before.get(item["customer_id"])
+                        if current is None:
+                            continue
+                        old = current.get("features") or {}
+                        delta.remove({n: old[n] for n in item["features"] if n in old})
+                        delta.add(item["features"])
+                    self._apply_rollup(model_version, delta)
+            except Exception as e:
+                cache_logger.error(
+                    "MongoDB bulk update error: %s", e, extra={"event": "error"}
+                )
+                stats["failed"] = len(updates_list)
+
+        # Atualiza o cache Redis (um WATCH/MGET/MULTI para o lote)
+        if self.use_redis and self.redis_client:
+            try:
+                patched = self._patch_cached(
+                    [
+                        (
+                            self._get_redis_key(item["customer_id"], model_version),
+                            item["features"],
+                        )
+                        for item in updates_list
+                    ],
+                    calculated_at,
+                    updated_at,
+                )
+
+                cache_logger.info(
+                    "Bulk update to Redis: %s keys",
+                    patched,
+                    extra={"event": "bulk_write"},
+                )
+            except Exception as e:
+                cache_logger.error(
+                    "Redis bulk update error: %s", e, extra={"event": "error"}
+                )
+
+        return stats
+
+    def _build_document(
+        self,
+        customer_id: str,
+        features: Dict[str, Any],
+        model_version: str,
+        now: datetime,
+        expires_at: datetime,
+    ) -> Dict[str, Any]:
+        """Documento completo de features, como gravado no MongoDB e no Redis"""
+        return {
+            "customer_id": customer_id,
+            "features": features,
+            "content_hash": self._content_hash(features),
+            "calculated_at": _timestamp(now),
+            "model_version": model_version,
+            "expires_at": expires_at,
+            "updated_at": now,
+        }
+
+    def _store_computed(
+        self, computed: Dict[str, Dict[str, Any]], model_version: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Write-through do loader: grava as features calculadas em lote
+        (MongoDB + Redis + Bloom filter) e devolve os documentos gravados
+        """
+        now = datetime.utcnow()
+        stats = self.bulk_set_features(
+            [
+                {"customer_id": customer_id, "features": features}
+                for customer_id, features in computed.items()
+            ],
+            model_version,
+            self.loader_ttl_days,
+            calculated_at=now,
+        )
+        if stats["failed"]:
+            logger.error(f"Loader write-through failed for {stats['failed']} customers")
+        expires_at = now + timedelta(days=self.loader_ttl_days)
+        return {
+            customer_id: self._build_document(
+                customer_id, features, model_version, now, expires_at
+            )
+            for customer_id, features in computed.items()
+        }
+
+    def _patch_cached(
+        self,
+        changes: List[Tuple[str, Dict[str, Any]]],
+        calculated_at: str,
+        updated_at: datetime,
+    ) -> int:
+        """
+        Mescla features alteradas nos documentos cacheados (chave → features)
+
+        A mescla é feita no cliente, em uma transação otimista (WATCH, MGET,
+        MULTI/SET KEEPTTL): os valores não alterados voltam ao Redis exatamente
+        como estavam, sem passar pelo cjson do Lua (que reescreve números com
+        14 dígitos). Chaves fora do cache ou com cache negativo são ignoradas:
+        a próxima leitura repopula a partir do MongoDB. Se outra escrita
+        mudar as chaves em todas as tentativas, elas são removidas.
+
+        Returns:
+            int: Quantidade de documentos cacheados atualizados
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for key, features in changes:
+            merged.setdefault(key, {}).update(features)
+        keys = list(merged)
+        if not keys:
+            return 0
+
+        for _ in range(PATCH_CACHE_RETRIES):
+            with self.redis_client.pipeline() as pipe:
+                try:
+                    pipe.watch(*keys)
+                    cached = pipe.mget(keys)
+                    pipe.multi()
+                    patched = 0
+                    for key, value in zip(keys, cached):
+                        if not value:
+                            continue
+                        doc = json.loads(value)
+                        doc["features"].update(merged[key])
+                        doc["calculated_at"] = calculated_at
+                        doc["updated_at"] = updated_at
+                        # Como no MongoDB: o hash deixou de valer
+                        doc.pop("content_hash", None)
+                        pipe.set(key, json.dumps(doc, default=str), keepttl=True)
+                        patched += 1
+                    pipe.execute()
+                    return patched
+                except redis.WatchError:
+                    continue
+
+        logger.warning(f"Redis patch contention, invalidating {len(keys)} keys")
+        self.redis_client.delete(*keys)
+        return 0
+
+    def _build_features_update(
+        self, features: Dict[str, Any], calculated_at: str, updated_at: datetime
+    ) -> Dict[str, Any]:
+        """
+        Monta o update do MongoDB: `$set` apenas nos caminhos alterados e
+        remoção do `content_hash`, que deixa de descrever o documento (a
+        próxima carga em lote o regrava)
+        """
+        changes = {f"features.{name}": value for name, value in features.items()}
+        changes["calculated_at"] = calculated_at
+        changes["updated_at"] = updated_at
+        return {"$set": changes, "$unset": {"content_hash": ""}}
+
+    @staticmethod
+    def _content_hash(features: Dict[str, Any]) -> str:
+        """Hash estável das features (independe da ordem das chaves)"""
+        canonical = json.dumps(
+            features, sort_keys=True, separators=(",", ":"), default=str
+        )
+        return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+    def delete_features(self, customer_id: str) -> bool:
+        """
+        Remove features de um cliente em todas as versões (MongoDB + Redis)
+
+        Args:
+            customer_id: ID do cliente
+
+        Returns:
+            bool: True se removido, False se não encontrado
+        """
+        deleted = False
+
+        # Versões em que o cliente possui documento (índice customer_id +
+        # model_version; no layout "id", todas as versões conhecidas)
+        versions = {self.get_active_version()}
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                if self._keyed_by_id:
+                    versions.update(self._known_model_versions())
+                for collection, keyed_by_id in self._collections():
+                    if not keyed_by_id:
+                        versions.update(
+                            doc["model_version"]
+                            for doc in collection.find(
+                                {"customer_id": customer_id},
+                                {"_id": 0, "model_version": 1},
+                            )
+                        )
+            except Exception as e:
+                cache_logger.error(
+                    "MongoDB get versions error: %s", e, extra={"event": "error"}
+                )
+
+        if self.stale_cache_size:
+            with self._stale_lock:
+                for version in versions:
+                    self._stale_cache.pop((customer_id, version), None)
+
+        # Remove do Redis, deixando uma entrada de cache negativo na versão ativa
+        # (o Bloom filter não suporta remoção)
+        if self.use_redis and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.delete(*[self._get_redis_key(customer_id, v) for v in versions])
+                pipe.setex(
+                    self._get_redis_key(customer_id, self.get_active_version()),
+                    self.negative_cache_ttl,
+                    NEGATIVE_CACHE_MARKER,
+                )
+                pipe.execute()
+                cache_logger.info(
+                    "Features removed from Redis for %s",
+                    customer_id,
+                    extra={"event": "delete"},
+                )
+                deleted = True
+            except Exception as e:
+                cache_logger.error(
+                    "Redis delete error: %s", e, extra={"event": "error"}
+                )
+
+        # Remove do MongoDB
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                mongo_filters = [
+                    (
+                        collection,
+                        self._selector_filter(
+                            keyed_by_id, [customer_id], None, None, sorted(versions)
+                        ),
+                    )
+                    for collection, keyed_by_id in self._collections()
+                ]
+                self._remove_from_rollups(mongo_filters)
+                removed = 0
+                for collection, mongo_filter in mongo_filters:
+                    removed += collection.delete_many(mongo_filter).deleted_count
+                if removed > 0:
+                    cache_logger.info(
+                        "Features removed from MongoDB for %s",
+                        customer_id,
+                        extra={"event": "delete"},
+                    )
+                    deleted = True
+            except Exception as e:
+                cache_logger.error(
+                    "MongoDB delete error: %s", e, extra={"event": "error"}
+                )
+
+        return deleted
+
+    def bulk_delete_features(
+        self,
+        customer_ids: Optional[List[str]] = None,
+        customer_id_prefix: Optional[str] = None,
+        model_version: Optional[str] = None,
+        calculated_after: Optional[Union[str, datetime]] = None,
+        calculated_before: Optional[Union[str, datetime]] = None,
+        batch_size: int = 1000,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, int]:
+        """
+        Remove features de muitos clientes (MongoDB + Redis) em lotes
+
+        Os critérios são combinados (E): lista de IDs, prefixo de customer_id,
+        versão do modelo e intervalo de calculated_at [after, before).
+
+        - Sem intervalo de datas, as chaves Redis são endereçáveis: lista de
+          IDs → UNLINK em pipeline por lote; prefixo/versão → varredura
+          incremental com SCAN + UNLINK (não bloqueia o Redis)
+        - Com intervalo de datas, os documentos são localizados no MongoDB
+          (paginação por _id) e cada lote removido nos dois lados
+
+        Em cada lote o MongoDB é removido antes do Redis, para que uma
+        leitura concorrente não repopule o cache com o documento removido.
+        O Bloom filter não suporta remoção: leituras de clientes removidos
+        caem no cache negativo.
+
+        Args:
+            customer_ids: IDs dos clientes
+            customer_id_prefix: Prefixo dos IDs
+            model_version: Versão a remover (padrão: todas)
+            calculated_after: calculated_at mínimo (inclusive)
+            calculated_before: calculated_at máximo (exclusivo)
+            batch_size: Quantidade de IDs/chaves por lote
+            progress: Chamado após cada lote com os contadores acumulados
+
+        Returns:
+            Dict com contadores: {"redis_keys", "mongo_documents", "batches"}
+
+        Raises:
+            ValueError: Se nenhum critério for informado
+        """
+        if customer_ids is None and not any(
+            (customer_id_prefix, model_version, calculated_after, calculated_before)
+        ):
+            raise ValueError("Bulk delete requires customer_ids or a selector")
+
+        calculated_at: Dict[str, str] = {}
+        if calculated_after:
+            calculated_at["$gte"] = self._format_calculated_at(calculated_after)
+        if calculated_before:
+            calculated_at["$lt"] = self._format_calculated_at(calculated_before)
+        versions = [model_version] if model_version else self._known_model_versions()
+
+        def mongo_filters(chunk: Optional[List[str]]) -> List[Tuple[Any, Dict]]:
+            filters = []
+            if self.use_mongo and self.mongo_collection is not None:
+                for collection, keyed_by_id in self._collections():
+                    query = self._selector_filter(
+                        keyed_by_id, chunk, customer_id_prefix, model_version, versions
+                    )
+                    if calculated_at:
+                        query["calculated_at"] = calculated_at
+                    filters.append((collection, query))
+            return filters
+
+        stats = {"redis_keys": 0, "mongo_documents": 0, "batches": 0}
+
+        def report():
+            stats["batches"] += 1
+            if progress is not None:
+                progress(dict(stats))
+
+        if calculated_at:
+            id_chunks = (
+                [None]
+                if customer_ids is None
+                else self._chunks(customer_ids, batch_size)
+            )
+            for chunk in id_chunks:
+                for collection, query in mongo_filters(chunk):
+                    for pairs, doc_ids in self._find_for_delete(
+                        collection, query, batch_size
+                    ):
+                        self._delete_batch(
+                            [(collection, {"_id": {"$in": doc_ids}})], pairs, stats
+                        )
+                        report()
+
+        elif customer_ids is not None:
+            for chunk in self._chunks(customer_ids, batch_size):
+                if customer_id_prefix:
+                    chunk = [c for c in chunk if c.startswith(customer_id_prefix)]
+                pairs = [(c, v) for c in chunk for v in versions]
+                self._delete_batch(mongo_filters(chunk), pairs, stats)
+                report()
+
+        else:
+            # Seletores endereçáveis: MongoDB de uma vez, Redis por varredura
+            self._delete_batch(mongo_filters(None), [], stats)
+            if self.use_redis and self.redis_client:
+                pattern = self._get_redis_key(
+                    self._escape_glob(customer_id_prefix or "") + "*",
+                    self._escape_glob(model_version) if model_version else "*",
+                )
+                batch = []
+                try:
+                    for key in self.redis_client.scan_iter(
+                        match=pattern, count=batch_size
+                    ):
+                        if key in RESERVED_KEYS:
+                            continue
+                        batch.append(key)
+                        if len(batch) >= batch_size:
+                            self._unlink_keys(batch, stats)
+                            report()
+                            batch = []
+                    if batch:
+                        self._unlink_keys(batch, stats)
+                except Exception as e:
+                    logger.error(f"Redis bulk delete error: {e}")
+            report()
+
+        logger.info(
+            f"Bulk delete removed {stats['mongo_documents']} MongoDB documents "
+            f"and {stats['redis_keys']} Redis keys in {stats['batches']} batches"
+        )
+        return stats
+
+    @staticmethod
+    def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+        for start in range(0, len(items), size):
+            yield items[start : start + size]
+
+    @staticmethod
+    def _escape_glob(value: str) -> str:
+        """Escapa os caracteres especiais do MATCH do SCAN"""
+        return re.sub(r"([*?\[\]\\])", r"\\\1", value)
+
+    @staticmethod
+    def _format_calculated_at(value: Union[str, datetime]) -> str:
+        """Converte um limite de data para o formato ISO de calculated_at"""
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return value
+
+    def _known_model_versions(self) -> List[str]:
+        """Versões com documentos no MongoDB, mais a versão ativa"""
+        versions = {self.get_active_version()}
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                for collection, _ in self._collections():
+                    versions.update(collection.distinct("model_version"))
+            except Exception as e:
+                logger.error(f"MongoDB get versions error: {e}")
+        return sorted(versions)
+
+    def _selector_filter(
+        self,
+        keyed_by_id: bool,
+        customer_ids: Optional[List[str]],
+        customer_id_prefix: Optional[str],
+        model_version: Optional[str],
+        versions: List[str],
+    ) -> Dict[str, Any]:
+        """
+        Filtro MongoDB de uma seleção de clientes em uma coleção
+
+        No layout "id" não há índice em customer_id: lista de IDs e prefixo
+        viram consultas pelo _id, uma por versão em `versions`.
+        """
+        if customer_ids is not None and customer_id_prefix:
+            customer_ids = [c for c in customer_ids if c.startswith(customer_id_prefix)]
+
+        if not keyed_by_id:
+            query: Dict[str, Any] = {}
+            if model_version:
+                query["model_version"] = model_version
+            if customer_ids is not None:
+                query["customer_id"] = {"$in": customer_ids}
+            elif customer_id_prefix:
+                query["customer_id"] = {"$regex": f"^{re.escape(customer_id_prefix)}"}
+            return query
+
+        if customer_ids is not None:
+            return {
+                "_id": {
+                    "$in": [
+                        self._get_document_id(c, v)
+                        for v in versions
+                        for c in customer_ids
+                    ]
+                }
+            }
+        if customer_id_prefix:
+            ranges = [
+                {
+                    "_id": {
+                        "$regex": "^"
+                        + re.escape(self._get_document_id(customer_id_prefix, v))
+                    }
+                }
+                for v in versions
+            ]
+            return ranges[0] if len(ranges) == 1 else {"$or": ranges}
+        return {"model_version": model_version}
+
+    def _find_for_delete(
+        self, collection, query: Dict[str, Any], batch_size: int
+    ) -> Iterable[Tuple[List[Tuple[str, str]], List[Any]]]:
+        """Pagina (por _id) os documentos de `collection` que atendem a `query`"""
+        last_id = None
+        while True:
+            page_query = query
+            if last_id is not None:
+                # $and: no layout "id" a própria seleção pode filtrar o _id
+                page_query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+            docs = list(
+                collection.find(
+                    page_query, {"_id": 1, "customer_id": 1, "model_version": 1}
+                )
+                .sort("_id", 1)
+                .limit(batch_size)
+            )
+            if not docs:
+                return
+            last_id = docs[-1]["_id"]
+            yield (
+                [(doc["customer_id"], doc["model_version"]) for doc in docs],
+                [doc["_id"] for doc in docs],
+            )
+
+    def _delete_batch(
+        self,
+        mongo_filters: List[Tuple[Any, Dict[str, Any]]],
+        pairs: List[Tuple[str, str]],
+        stats: Dict[str, int],
+    ) -> None:
+        """
+        Remove um lote: MongoDB primeiro (filtro por coleção), depois as
+        chaves Redis de `pairs`
+        """
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                self._remove_from_rollups(mongo_filters)
+                for collection, mongo_filter in mongo_filters:
+                    result = collection.delete_many(mongo_filter)
+                    stats["mongo_documents"] += result.deleted_count
+            except Exception as e:
+                logger.error(f"MongoDB bulk delete error: {e}")
+
+        if pairs and self.use_redis and self.redis_client:
+            try:
+                self._unlink_keys([self._get_redis_key(c, v) for c, v in pairs], stats)
+            except Exception as e:
+                logger.error(f"Redis bulk delete error: {e}")
+
+    def _unlink_keys(self, keys: List[str], stats: Dict[str, int]) -> None:
+        """UNLINK em pipeline e descarte das cópias no cache em memória"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(keys), 500):
+            pipe.unlink(*keys[start : start + 500])
+        stats["redis_keys"] += sum(pipe.execute())
+
+        if self.stale_cache_size:
+            with self._stale_lock:
+                for key in keys:
+                    _, model_version, customer_id = key.split(":", 2)
+                    self._stale_cache.pop((customer_id, model_version), None)
+
+    def bulk_set_features(
+        self,
+        features_list: list,
+        model_version: Optional[str] = None,
+        ttl_days: int = 7,
+        skip_unchanged: bool = True,
+        calculated_at: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        """
+        Armazena features de múltiplos clientes em batch
+
+        Os documentos são gravados no namespace da `model_version`: carregar
+        uma versão que não é a ativa não afeta as leituras até que ela seja
+        ativada com `activate_model_version`.
+
+        Cargas recorrentes só reescrevem o que mudou: o `content_hash` de
+        cada documento é comparado (uma consulta por lote) com o das
+        features recebidas. Documentos iguais só têm o `expires_at`
+        estendido, no MongoDB e na chave Redis (que também renova o TTL, se
+        estiver cacheada). Não há `ReplaceOne` nem `updated_at` novo, e o
+        calculated_at é mantido, então ETags continuam válidos.
+
+        Args:
+            features_list: Lista de dicts com customer_id e features
+                Formato: [{"customer_id": "...", "features": {...}}, ...]
+            model_version: Versão do modelo (padrão: versão ativa)
+            ttl_days: Dias até expiração
+            skip_unchanged: Se False, reescreve todos os documentos
+            calculated_at: Momento do cálculo das features (padrão: agora)
+
+        Returns:
+            Dict com contadores: {"success": int, "failed": int,
+            "unchanged": int}
+        """
+        model_version = model_version or self.get_active_version()
+        now = calculated_at or datetime.utcnow()
+        expires_at = now + timedelta(days=ttl_days)
+
+        stats = {"success": 0, "failed": 0, "unchanged": 0}
+
+        # Prepara documentos
+        docs = [
+            self._build_document(
+                item["customer_id"], item["features"], model_version, now, expires_at
+            )
+            for item in features_list
+        ]
+
+        # Documentos inalterados com o novo expires_at (para o Redis)
+        refreshed = []
+
+        # Bulk insert no MongoDB (apenas documentos alterados)
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                from pymongo import ReplaceOne, UpdateOne
+
+                unchanged = []
+                current = {}
+                if (skip_unchanged or self.feature_rollups) and docs:
+                    projection = {
+                        "_id": 0,
+                        "customer_id": 1,
+                        "content_hash": 1,
+                        "calculated_at": 1,
+                        "updated_at": 1,
+                    }
+                    if self.feature_rollups:
+                        projection["features"] = 1
+                    current = {
+                        doc["customer_id"]: doc
+                        for doc in self.mongo_collection.find(
+                            self._documents_filter(
+                                [doc["customer_id"] for doc in docs], model_version
+                            ),
+                            projection,
+                        )
+                    }
+                if skip_unchanged and docs:
+                    changed = []
+                    for doc in docs:
+                        existing = current.get(doc["customer_id"], {})
+                        if existing.get("content_hash") == doc["content_hash"]:
+                            unchanged.append(doc["customer_id"])
+                            refreshed.append(
+                                dict(
+                                    doc,
+                                    calculated_at=existing.get("calculated_at"),
+                                    updated_at=existing.get("updated_at"),
+                                )
+                            )
+                        else:
+                            changed.append(doc)
+                    docs = changed
+
+                # Features substituídas (inclusive na coleção antiga), que
+                # saem das estatísticas
+                replaced = {}
+                if self.feature_rollups:
+                    replaced = {c: doc.get("features") for c, doc in current.items()}
+                    replaced.update(
+                        self._legacy_features(
+                            [
+                                d["customer_id"]
+                                for d in docs
+                                if d["customer_id"] not in current
+                            ],
+                            model_version,
+                        )
+                    )
+
+                operations = [
+                    ReplaceOne(
+                        self._document_filter(doc["customer_id"], model_version),
+                        doc,
+                        upsert=True,
+                    )
+                    for doc in docs
+                ]
+                operations.extend(
+                    UpdateOne(
+                        self._document_filter(customer_id, model_version),
+                        {"$set": {"expires_at": expires_at}},
+                    )
+                    for customer_id in unchanged
+                )
+
+                if operations:
+                    self.mongo_collection.bulk_write(operations, ordered=False)
+                stats["success"] = len(docs)
+                stats["unchanged"] = len(unchanged)
+                self._discard_legacy(
+                    model_version, [doc["customer_id"] for doc in docs]
+                )
+
+                logger.info(
+                    f"Bulk insert to MongoDB: {stats['success']} documents "
+                    f"({stats['unchanged']} unchanged)"
+                )
+
+                if self.feature_rollups:
+                    delta = RollupDelta()
+                    for doc in docs:
+                        delta.remove(replaced.get(doc["customer_id"]))
+                        delta.add(doc["features"])
+                    self._apply_rollup(model_version, delta)
+            except Exception as e:
+                logger.error(f"MongoDB bulk insert error: {e}")
+                stats.update(success=0, unchanged=0, failed=len(features_list))
+                refreshed = []
+
+        # Cacheia no Redis (em pipeline para performance)
+        if self.use_redis and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline()
+                for doc in docs:
+                    pipe.setex(
+                        self._get_redis_key(doc["customer_id"], model_version),
+                        self.redis_ttl,
+                        json.dumps(doc, default=str),
+                    )
+                # Inalterados: novo expires_at e TTL só nas chaves já cacheadas
+                for doc in refreshed:
+                    pipe.set(
+                        self._get_redis_key(doc["customer_id"], model_version),
+                        json.dumps(doc, default=str),
+                        ex=self.redis_ttl,
+                        xx=True,
+                    )
+                self._queue_bloom_add(pipe, [doc["customer_id"] for doc in docs])
+                pipe.execute()
+
+                logger.info(f"Bulk cache to Redis: {len(docs)} keys")
+            except Exception as e:
+                logger.error(f"Redis bulk set error: {e}")
+
+        return stats
+
+    def sync_cache(
+        self,
+        changed_docs: list,
+        removed_docs: list = (),
+        invalidate: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Aplica no Redis alterações feitas diretamente no MongoDB
+
+        Usado pelo worker de sincronização para escritas que não passam pela
+        API. Todas as operações vão num único pipeline. Documentos alterados
+        passam pelo compare-and-set do backfill (um evento atrasado não
+        sobrescreve um `calculated_at` mais novo gravado pela API; escritas
+        externas devem avançá-lo), mantêm o TTL de uma chave já cacheada e
+        são gravados sem os campos internos (`_id`, `content_hash`,
+        `updated_at`).
+
+        Args:
+            changed_docs: Documentos inseridos/alterados (completos)
+            removed_docs: Documentos removidos (precisam de customer_id e
+                model_version)
+            invalidate: Se True, remove as chaves alteradas em vez de
+                reescrevê-las (a próxima leitura repopula a partir do MongoDB)
+
+        Returns:
+            Dict com contadores: {"refreshed": int, "invalidated": int}
+
+        Raises:
+            Exception: Erros do Redis são propagados para que o worker não
+                avance o checkpoint
+        """
+        stats = {"refreshed": 0, "invalidated": 0}
+        if not (self.use_redis and self.redis_client):
+            return stats
+
+        changed = []
+        for doc in changed_docs:
+            if "customer_id" not in doc:
+                continue
+            key = self._get_redis_key(
+                doc["customer_id"], doc.get("model_version", DEFAULT_MODEL_VERSION)
+            )
+            cached = {
+                name: value
+                for name, value in doc.items()
+                if name not in SYNC_INTERNAL_FIELDS
+            }
+            changed.append((doc["customer_id"], key, cached))
+            stats["invalidated" if invalidate else "refreshed"] += 1
+
+        removed = []
+        for doc in removed_docs:
+            if "customer_id" not in doc:
+                continue
+            removed.append(
+                self._get_redis_key(
+                    doc["customer_id"], doc.get("model_version", DEFAULT_MODEL_VERSION)
+                )
+            )
+            stats["invalidated"] += 1
+
+        def queue(pipe):
+            for _, key, cached in changed:
+                if invalidate:
+                    pipe.delete(key)
+                else:
+                    self._backfill(key, cached, self.redis_ttl, pipe, keep_ttl=True)
+            for key in removed:
+                pipe.delete(key)
+            self._queue_bloom_add(pipe, [customer_id for customer_id, _, _ in changed])
+
+        self._execute_scripts(queue)
+
+        return stats
+
+    def warm_up(self) -> Dict[str, bool]:
+        """
+        Prepara o processo antes de receber tráfego
+
+        Abre as conexões do Redis e do MongoDB, carrega os scripts Lua no
+        Redis (o primeiro EVALSHA não paga o NOSCRIPT), carrega a versão ativa
+        e o Bloom filter em memória e faz uma consulta pelo índice de busca
+        ((customer_id, model_version), ou _id no layout "id") para trazer suas
+        páginas para o cache do MongoDB. Evita que a primeira requisição de cada worker pague esse custo.
+
+        Returns:
+            Dict indicando quais etapas foram concluídas
+        """
+        warmed = {"redis": False, "mongodb": False, "bloom_filter": False}
+
+        if self.use_redis and self.redis_client:
+            try:
+                self.redis_client.ping()
+                self.redis_binary_client.ping()
+                self._load_scripts()
+                warmed["redis"] = True
+            except Exception as e:
+                logger.error(f"Redis warm up error: {e}")
+
+        model_version = self.get_active_version()
+        warmed["bloom_filter"] = self._get_bloom_filter() is not None
+
+        if self.use_mongo and self.mongo_collection is not None:
+            try:
+                self.mongo_client.admin.command("ping")
+                self.mongo_collection.find_one(
+                    self._document_filter("", model_version), {"_id": 1}
+                )
+                warmed["mongodb"] = True
+            except Exception as e:
+                logger.error(f"MongoDB warm up error: {e}")
+
+        return warmed
+
+    def health_check(self) -> Dict[str, Any]:
+        """
+        Verifica saúde das conexões
+
+        Returns:
+            Dict com status de Redis e MongoDB
+        """
+        health = {
+            "redis": {"available": False, "status": "unavailable"},
+            "mongodb": {"available": False, "status": "unavailable"},
+        }
+
+        # Check Redis
+        if self.use_redis and self.redis_client:
+            try:
+                self.redis_client.ping()
+                info = self.redis_client.info("stats")
+                health["redis"] = {
+                    "available": True,
+                    "status": "healthy",
+                    "total_keys": self.redis_client.dbsize(),
+                    "used_memory": info.get("used_memory_human", "N/A"),
+                }
+            except Exception as e:
+                health["redis"] = {
+                    "available": False,
+                    "status": "unhealthy",
+                    "error": str(e),
+                }
+
+        # Check MongoDB
+        if self.use_mongo and self.mongo_client:
+            try:
+                self.mongo_client.server_info()
+                count = self.mongo_collection.count_documents({})
+                health["mongodb"] = {
                     "available": True,
                     "status": "healthy",
                     "documents_count": count,
-                    "collection": "customer_features",
+                    "collection": self.mongo_collection.name,
+                    "layout": self.mongo_layout,
                 }
+                if self.legacy_collection is not None:
+                    health["mongodb"]["legacy_documents_count"] = (
+                        self.legacy_collection.count_documents({})
+                    )
             except Exception as e:
                 health["mongodb"] = {
                     "available": False,
@@ -0,0 +1,75 @@
+"""
+Shared FeaturesService
+One instance per process, rebuilt in the child after a fork (preforked workers)
+"""
+
+import os
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .services import FeaturesService
+
+_features_service = None
+_features_service_lock = threading.Lock()
+
+
+def get_features_service() -> FeaturesService:
+    """Get or create the FeaturesService shared by every request in this process"""
+    global _features_service
+    if _features_service is None:
+        with _features_service_lock:
+            if _features_service is None:
+                _features_service = FeaturesService(
+                    redis_host=settings.REDIS_HOST,
+                    redis_port=settings.REDIS_PORT,
+                    redis_db=settings.REDIS_DB,
+                    redis_ttl=settings.REDIS_TTL,
+                    mongo_uri=settings.MONGO_URI,
+                    mongo_db=settings.MONGO_DB,
+                    mongo_layout=settings.MONGO_LAYOUT,
+                    active_version_cache_ttl=settings.ACTIVE_VERSION_CACHE_TTL,
+                    negative_cache_ttl=settings.NEGATIVE_CACHE_TTL,
+                    use_bloom_filter=settings.BLOOM_FILTER_ENABLED,
+                    bloom_refresh_interval=settings.BLOOM_REFRESH_INTERVAL,
+                    mongo_max_concurrency=settings.MONGO_MAX_CONCURRENCY,
+                    mongo_queue_timeout=settings.MONGO_QUEUE_TIMEOUT_MS / 1000,
+                    stale_cache_size=settings.STALE_CACHE_SIZE,
+                    read_batch_window=settings.READ_BATCH_WINDOW_MS / 1000,
+                    read_batch_max_size=settings.READ_BATCH_MAX_SIZE,
+                    admission_min_frequency=settings.ADMISSION_MIN_FREQUENCY,
+                    admission_probation_ttl=settings.ADMISSION_PROBATION_TTL,
+                    admission_sketch_width=settings.ADMISSION_SKETCH_WIDTH,
+                    cache_idle_ttl=settings.CACHE_IDLE_TTL,
+                    cache_hit_counters=settings.CACHE_HIT_COUNTERS,
+                    feature_rollups=settings.FEATURE_ROLLUPS_ENABLED,
+                    rollup_checkpoint_interval=(
+                        settings.FEATURE_ROLLUP_CHECKPOINT_INTERVAL
+                    ),
+                    feature_loader=(
+                        import_string(settings.FEATURE_LOADER)
+                        if settings.FEATURE_LOADER
+                        else None
+                    ),
+                    loader_workers=settings.FEATURE_LOADER_WORKERS,
+                    loader_timeout=settings.FEATURE_LOADER_TIMEOUT_MS / 1000,
+                    loader_max_pending=settings.FEATURE_LOADER_MAX_PENDING,
+                    loader_processes=settings.FEATURE_LOADER_PROCESSES,
+                    loader_ttl_days=settings.FEATURE_LOADER_TTL_DAYS,
+                )
+    return _features_service
+
+
+def _reset_after_fork():
+    """Drop the parent's instance and lock in the child process
+
+    MongoClient and the Redis sockets are not fork-safe, and the lock may have
+    been held by another thread at fork time, so the child starts from scratch.
+    """
+    global _features_service, _features_service_lock
+    _features_service = None
+    _features_service_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,239 @@
+"""
+Cache Sync Worker
+Acompanha escritas feitas direto no MongoDB e atualiza o cache Redis
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from .services import FeaturesService
+
+logger = logging.getLogger(__name__)
+
+# _id do documento de checkpoint na coleção cache_sync_state
+SYNC_STATE_ID = "customer_features"
+
+
+class CacheSyncWorker:
+    """
+    Worker de sincronização incremental MongoDB → Redis
+
+    Usa change streams quando disponíveis (replica set, MongoDB 6.0+ para
+    pre-images de deletes); caso contrário consulta periodicamente o campo
+    indexado `updated_at` com paginação por keyset (`updated_at`, `_id`).
+
+    As alterações são aplicadas em lotes via `FeaturesService.sync_cache`
+    (um pipeline por lote) e o checkpoint (resume token ou último
+    `updated_at`/`_id`) é salvo na coleção `cache_sync_state` somente depois
+    que o lote foi aplicado.
+
+    Escritas externas precisam preencher `updated_at` para serem vistas no
+    modo polling; deletes só são vistos com change streams. No layout "id" a
+    chave sai do `documentKey` de qualquer delete (inclusive os do TTL
+    monitor); no layout "compound" o `_id` é um ObjectId e o delete só é
+    aplicado com pre-images habilitadas na coleção
+    (`collMod` com `changeStreamPreAndPostImages`).
+    """
+
+    def __init__(
+        self,
+        service: FeaturesService,
+        mode: str = "auto",
+        invalidate: bool = False,
+        batch_size: int = 500,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Args:
+            service: FeaturesService conectado ao Redis e ao MongoDB
+            mode: "auto", "change_stream" ou "polling"
+            invalidate: Remove as chaves alteradas em vez de reescrevê-las
+            batch_size: Máximo de alterações por pipeline
+            poll_interval: Segundos de espera quando não há alterações
+        """
+        self.service = service
+        self.mode = mode
+        self.invalidate = invalidate
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.collection = service.mongo_collection
+        self.state_collection = service.mongo_collection.database["cache_sync_state"]
+        self.stats = {"refreshed": 0, "invalidated": 0, "batches": 0}
+        self._stopped = False
+
+    def stop(self) -> None:
+        """Pede a parada do worker ao fim do lote atual"""
+        self._stopped = True
+
+    def run(self) -> None:
+        """Executa o worker até `stop()` ser chamado"""
+        if self.mode in ("auto", "change_stream"):
+            try:
+                stream = self._open_change_stream()
+            except OperationFailure as e:
+                if self.mode == "change_stream":
+                    raise
+                logger.warning(
+                    f"Change streams not available ({e}); polling updated_at instead"
+                )
+            else:
+                logger.info("Cache sync following MongoDB change stream")
+                self._follow_change_stream(stream)
+                return
+
+        logger.info("Cache sync polling updated_at")
+        self._run_polling()
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        return self.state_collection.find_one({"_id": SYNC_STATE_ID}) or {}
+
+    def _save_checkpoint(self, **fields) -> None:
+        fields["saved_at"] = datetime.utcnow()
+        self.state_collection.update_one(
+            {"_id": SYNC_STATE_ID}, {"$set": fields}, upsert=True
+        )
+
+    def _apply(self, changed_docs: list, removed_docs: list) -> bool:
+        """Aplica um lote no Redis, tentando de novo até conseguir ou parar"""
+        while not self._stopped:
+            try:
+                result = self.service.sync_cache(
+                    changed_docs, removed_docs, invalidate=self.invalidate
+                )
+            except Exception as e:
+                logger.error(f"Cache sync apply error: {e}. Retrying...")
+                time.sleep(self.poll_interval)
+                continue
+
+            self.stats["refreshed"] += result["refreshed"]
+            self.stats["invalidated"] += result["invalidated"]
+            self.stats["batches"] += 1
+            logger.debug(
+                f"Cache sync batch: {result['refreshed']} refreshed, "
+                f"{result['invalidated']} invalidated"
+            )
+            return True
+        return False
+
+    def _open_change_stream(self):
+        resume_token = self._load_checkpoint().get("resume_token")
+        return self.collection.watch(
+            full_document="updateLookup",
+            full_document_before_change="whenAvailable",
+            resume_after=resume_token,
+            max_await_time_ms=int(self.poll_interval * 1000),
+            batch_size=self.batch_size,
+        )
+
+    def _follow_change_stream(self, stream) -> None:
+        """
+        Segue o change stream; após um erro transitório espera
+        `poll_interval` e o reabre a partir do último resume token salvo
+        """
+        while not self._stopped:
+            try:
+                self._run_change_stream(stream)
+                return
+            except PyMongoError as e:
+                logger.error(f"Change stream error: {e}. Reopening...")
+            stream = None
+            while stream is None and not self._stopped:
+                time.sleep(self.poll_interval)
+                try:
+                    stream = self._open_change_stream()
+                except PyMongoError as e:
+                    logger.error(f"Change stream reopen error: {e}")
+
+    def _run_change_stream(self, stream) -> None:
+        saved_token = None
+        with stream:
+            while not self._stopped and stream.alive:
+                changed_docs, removed_docs = [], []
+                try:
+                    while len(changed_docs) + len(removed_docs) < self.batch_size:
+                        change = stream.try_next()
+                        if change is None:
+                            break
+                        operation = change["operationType"]
+                        if operation in ("insert", "update", "replace"):
+                            # fullDocument é None se o documento já foi removido
+                            if change.get("fullDocument"):
+                                changed_docs.append(change["fullDocument"])
+                        elif operation == "delete":
+                            removed = change.get(
+                                "fullDocumentBeforeChange"
+                            ) or self._deleted_key(change["documentKey"])
+                            if removed:
+                                removed_docs.append(removed)
+                        else:
+                            logger.warning(f"Cache sync got '{operation}' event")
+                except PyMongoError as e:
+                    if not changed_docs and not removed_docs:
+                        raise  # reaberto por _follow_change_stream
+                    logger.error(f"Change stream error: {e}")
+
+                if changed_docs or removed_docs:
+                    if not self._apply(changed_docs, removed_docs):
+                        return
+
+                token = stream.resume_token
+                if token is not None and token != saved_token:
+                    self._save_checkpoint(resume_token=token)
+                    saved_token = token
+
+    def _deleted_key(self, document_key: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        customer_id/model_version de um delete sem pre-image, a partir do
+        `documentKey` (só no layout "id": o _id é "{model_version}:{customer_id}")
+        """
+        document_id = document_key.get("_id")
+        if not (self.service._keyed_by_id and isinstance(document_id, str)):
+            return None
+        model_version, _, customer_id = document_id.partition(":")
+        if not customer_id:
+            return None
+        return {"customer_id": customer_id, "model_version": model_version}
+
+    def _run_polling(self) -> None:
+        checkpoint = self._load_checkpoint()
+        last_updated_at: Optional[datetime] = checkpoint.get("updated_at")
+        last_id = checkpoint.get("last_id")
+        if last_updated_at is None:
+            # Sem checkpoint: começa a partir de agora
+            last_updated_at = datetime.utcnow()
+
+        while not self._stopped:
+            if last_id is None:
+                query = {"updated_at": {"$gt": last_updated_at}}
+            else:
+                query = {
+                    "$or": [
+                        {"updated_at": {"$gt": last_updated_at}},
+                        {"updated_at": last_updated_at, "_id": {"$gt": last_id}},
+                    ]
+                }
+
+            try:
+                docs = list(
+                    self.collection.find(query)
+                    .sort([("updated_at", 1), ("_id", 1)])
+                    .limit(self.batch_size)
+                )
+            except PyMongoError as e:
+                logger.error(f"Cache sync poll error: {e}")
+                time.sleep(self.poll_interval)
+                continue
+
+            if docs:
+                if not self._apply(docs, []):
+                    return
+                last_updated_at = docs[-1]["updated_at"]
+                last_id = docs[-1]["_id"]
+                self._save_checkpoint(updated_at=last_updated_at, last_id=last_id)
+
+            if len(docs) < self.batch_size:
+                time.sleep(self.poll_interval)
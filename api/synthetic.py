@@ -0,0 +1,176 @@
+"""
+Synthetic Data
+Gera features de clientes em lotes (amostragem vetorizada com NumPy) e traces
+de acesso com distribuição Zipf para testes de carga
+"""
+
+import random
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# NumPy (instalar: pip install numpy)
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Features de exemplo: (tipo, mínimo, máximo); floats arredondados em 2 casas
+FEATURE_SPECS = {
+    "payment_history_score": ("float", 0.5, 1.0),
+    "credit_utilization": ("float", 0.1, 0.8),
+    "account_age_months": ("int", 6, 120),
+    "recent_inquiries": ("int", 0, 5),
+    "debt_to_income": ("float", 0.1, 0.6),
+    "on_time_payments_pct": ("float", 0.7, 1.0),
+    "total_accounts": ("int", 1, 15),
+    "delinquent_accounts": ("int", 0, 3),
+    "credit_mix_score": ("float", 0.5, 1.0),
+    "length_of_credit_history": ("int", 12, 240),
+}
+
+# Serviço do processo de carga (criado uma vez por processo do pool)
+_worker_service = None
+
+
+def customer_id(index: int, width: int = 5) -> str:
+    """ID do cliente de número `index` (base 1), ex.: CUST00001"""
+    return f"CUST{index:0{width}d}"
+
+
+def id_width(total: int) -> int:
+    """Dígitos dos IDs para `total` clientes (mínimo 5, como os dados de exemplo)"""
+    return max(5, len(str(total)))
+
+
+def generate_chunk(
+    start: int, count: int, seed: int, width: int = 5
+) -> List[Dict[str, Any]]:
+    """
+    Gera `count` clientes a partir do índice `start` (base 0)
+
+    Cada feature é amostrada de uma vez para o lote inteiro. O gerador é
+    semeado por (seed, start), então o resultado não depende de qual
+    processo gerou o lote.
+    """
+    rng = np.random.default_rng([seed, start])
+    columns = {}
+    for name, (kind, low, high) in FEATURE_SPECS.items():
+        if kind == "int":
+            columns[name] = rng.integers(low, high, size=count, endpoint=True)
+        else:
+            columns[name] = np.round(rng.uniform(low, high, size=count), 2)
+
+    names = list(columns)
+    rows = zip(*(columns[name].tolist() for name in names))
+    return [
+        {
+            "customer_id": customer_id(start + offset + 1, width),
+            "features": dict(zip(names, values)),
+        }
+        for offset, values in enumerate(rows)
+    ]
+
+
+def compute_features(
+    customer_ids: List[str], model_version: str
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Loader de exemplo (FEATURE_LOADER=api.synthetic.compute_features)
+
+    Features determinísticas por cliente, no formato de FEATURE_SPECS; um
+    loader real chamaria o pipeline de cálculo.
+    """
+    results = {}
+    for customer in customer_ids:
+        rng = random.Random(f"{model_version}:{customer}")
+        results[customer] = {
+            name: (
+                rng.randint(low, high)
+                if kind == "int"
+                else round(rng.uniform(low, high), 2)
+            )
+            for name, (kind, low, high) in FEATURE_SPECS.items()
+        }
+    return results
+
+
+def chunk_ranges(total: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """(início, quantidade) de cada lote"""
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+def init_worker(service_kwargs: Dict[str, Any]) -> None:
+    """Inicializador do pool: uma conexão Redis/MongoDB por processo"""
+    global _worker_service
+    from .services import FeaturesService
+
+    _worker_service = FeaturesService(**service_kwargs)
+
+
+def load_chunk(
+    start: int,
+    count: int,
+    seed: int,
+    width: int,
+    model_version: str,
+    ttl_days: int,
+) -> Dict[str, int]:
+    """Gera um lote e grava com `bulk_set_features` (executado no pool)"""
+    features_list = generate_chunk(start, count, seed, width)
+    return _worker_service.bulk_set_features(
+        features_list=features_list, model_version=model_version, ttl_days=ttl_days
+    )
+
+
+def write_trace(
+    path: str,
+    num_customers: int,
+    num_requests: int,
+    zipf_s: float = 1.1,
+    miss_ratio: float = 0.0,
+    seed: int = 42,
+    width: Optional[int] = None,
+    chunk_size: int = 1_000_000,
+) -> Dict[str, int]:
+    """
+    Escreve um trace JSONL de leituras (`{"customer_id": ..., "exists": ...}`)
+
+    A popularidade segue Zipf limitada a `num_customers`: o cliente de posto k
+    é pedido com probabilidade proporcional a 1/k^s. Os postos são
+    embaralhados para que os clientes populares não sejam os primeiros IDs.
+    Uma fração `miss_ratio` das leituras pede IDs que não foram carregados
+    (exercita o Bloom filter e o cache negativo).
+
+    Returns:
+        Dict com contadores: {"requests": int, "misses": int}
+    """
+    width = width or id_width(num_customers)
+    rng = np.random.default_rng(seed)
+
+    weights = np.arange(1, num_customers + 1, dtype=np.float64) ** -zipf_s
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    rank_to_customer = rng.permutation(num_customers) + 1
+
+    stats = {"requests": 0, "misses": 0}
+    with open(path, "w", encoding="utf-8") as trace:
+        for _, count in chunk_ranges(num_requests, chunk_size):
+            ranks = np.searchsorted(cdf, rng.random(count), side="right")
+            customers = rank_to_customer[np.minimum(ranks, num_customers - 1)]
+
+            misses = rng.random(count) < miss_ratio
+            unknown = rng.integers(num_customers + 1, 2 * num_customers + 1, count)
+            customers = np.where(misses, unknown, customers)
+
+            trace.write(
+                "".join(
+                    f'{{"customer_id": "{customer_id(index, width)}", '
+                    f'"exists": {"false" if miss else "true"}}}\n'
+                    for index, miss in zip(customers.tolist(), misses.tolist())
+                )
+            )
+            stats["requests"] += count
+            stats["misses"] += int(misses.sum())
+    return stats
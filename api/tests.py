@@ -1,3 +1,430 @@
-from django.test import TestCase
+"""
+Tests for the feature cache service
 
-# Create your tests here.
+Redis and MongoDB are replaced by fakeredis (with Lua, via lupa) and
+mongomock; the pure helpers (rollups, micro-batcher, loader) need neither.
+Run with `python manage.py test api`.
+"""
+
+import json
+import statistics
+import threading
+import time
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import rollups, services
+from .batching import MicroBatcher
+from .loader import FeatureLoader
+from .services import NEGATIVE_CACHE_MARKER, FeaturesService
+
+# fakeredis e mongomock (instalar: pip install "fakeredis[lua]" mongomock)
+try:
+    import fakeredis
+    import mongomock
+
+    FAKES_AVAILABLE = True
+except ImportError:
+    FAKES_AVAILABLE = False
+
+VERSION = "v1.0.0"
+
+
+@unittest.skipUnless(FAKES_AVAILABLE, "requires fakeredis[lua] and mongomock")
+class ServiceTestCase(SimpleTestCase):
+    """Every FeaturesService built in a test shares one fake Redis and MongoDB"""
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        mongo = mongomock.MongoClient()
+
+        def fake_redis(**kwargs):
+            return fakeredis.FakeRedis(
+                server=server, decode_responses=kwargs.get("decode_responses", False)
+            )
+
+        for patcher in (
+            mock.patch.object(services.redis, "Redis", fake_redis),
+            mock.patch.object(services, "MongoClient", lambda *a, **kw: mongo),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_service(self, **kwargs) -> FeaturesService:
+        return FeaturesService(**kwargs)
+
+    def cached(self, service, customer_id, model_version=VERSION):
+        value = service.redis_client.get(
+            service._get_redis_key(customer_id, model_version)
+        )
+        return json.loads(value) if value else value
+
+
+class BackfillTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = self.make_service()
+        self.key = self.service._get_redis_key("C1", VERSION)
+
+    def backfill(self, cached, incoming, **kwargs):
+        self.service.redis_client.set(self.key, json.dumps(cached), ex=100)
+        self.service._backfill(
+            self.key, {"customer_id": "C1", "calculated_at": incoming}, 600, **kwargs
+        )
+        return json.loads(self.service.redis_client.get(self.key))
+
+    def test_newer_cached_document_is_kept(self):
+        doc = self.backfill(
+            {"calculated_at": "2026-01-01T00:00:02.000000Z"},
+            "2026-01-01T00:00:01.000000Z",
+        )
+        self.assertEqual(doc["calculated_at"], "2026-01-01T00:00:02.000000Z")
+
+    def test_older_cached_document_is_replaced(self):
+        doc = self.backfill(
+            {"calculated_at": "2026-01-01T00:00:01.000000Z"},
+            "2026-01-01T00:00:02.000000Z",
+        )
+        self.assertEqual(doc["calculated_at"], "2026-01-01T00:00:02.000000Z")
+        self.assertEqual(self.service.redis_client.ttl(self.key), 600)
+
+    def test_timestamps_without_fraction_compare_chronologically(self):
+        doc = self.backfill(
+            {"calculated_at": "2026-01-01T00:00:01Z"}, "2026-01-01T00:00:00.500000Z"
+        )
+        self.assertEqual(doc["calculated_at"], "2026-01-01T00:00:01Z")
+
+    def test_feature_named_calculated_at_is_ignored(self):
+        doc = self.backfill(
+            {
+                "features": {"calculated_at": "9999-12-31T00:00:00.000000Z"},
+                "calculated_at": "2026-01-01T00:00:00.000000Z",
+            },
+            "2026-01-01T00:00:01.000000Z",
+        )
+        self.assertEqual(doc["calculated_at"], "2026-01-01T00:00:01.000000Z")
+
+    def test_keep_ttl(self):
+        self.backfill(
+            {"calculated_at": "2026-01-01T00:00:00.000000Z"},
+            "2026-01-01T00:00:01.000000Z",
+            keep_ttl=True,
+        )
+        self.assertEqual(self.service.redis_client.ttl(self.key), 100)
+
+    def test_timestamps_have_fixed_microseconds(self):
+        self.service.set_features("C2", {"x": 1})
+        calculated_at = self.cached(self.service, "C2")["calculated_at"]
+        self.assertRegex(calculated_at, r"T\d\d:\d\d:\d\d\.\d{6}Z$")
+
+
+class BulkSetTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = self.make_service()
+        self.items = [{"customer_id": f"C{i}", "features": {"x": i}} for i in range(3)]
+
+    def test_unchanged_documents_are_not_rewritten(self):
+        self.service.bulk_set_features(self.items, VERSION, ttl_days=1)
+        before = self.cached(self.service, "C1")
+        key = self.service._get_redis_key("C1", VERSION)
+        self.service.redis_client.expire(key, 10)
+
+        stats = self.service.bulk_set_features(self.items, VERSION, ttl_days=5)
+
+        self.assertEqual(stats, {"success": 0, "failed": 0, "unchanged": 3})
+        after = self.cached(self.service, "C1")
+        self.assertEqual(after["calculated_at"], before["calculated_at"])
+        self.assertGreater(after["expires_at"], before["expires_at"])
+        self.assertEqual(self.service.redis_client.ttl(key), self.service.redis_ttl)
+        stored = self.service.mongo_collection.find_one({"customer_id": "C1"})
+        self.assertEqual(stored["calculated_at"], before["calculated_at"])
+
+    def test_changed_documents_are_rewritten(self):
+        self.service.bulk_set_features(self.items, VERSION)
+        self.items[1] = {"customer_id": "C1", "features": {"x": 100}}
+
+        stats = self.service.bulk_set_features(self.items, VERSION)
+
+        self.assertEqual(stats, {"success": 1, "failed": 0, "unchanged": 2})
+        self.assertEqual(self.cached(self.service, "C1")["features"], {"x": 100})
+
+    def test_writes_default_to_the_active_version(self):
+        self.service.activate_model_version("v2")
+        self.service.bulk_set_features(self.items)
+        self.assertEqual(self.service.get_features("C1")["model_version"], "v2")
+
+
+class PatchTests(ServiceTestCase):
+    def test_patch_merges_into_cached_document(self):
+        service = self.make_service()
+        service.set_features("C1", {"x": 1, "big": 2**53 + 1})
+        key = service._get_redis_key("C1", VERSION)
+        service.redis_client.expire(key, 100)
+
+        self.assertTrue(service.update_features("C1", {"y": 0.1234567890123456}))
+
+        doc = self.cached(service, "C1")
+        self.assertEqual(
+            doc["features"], {"x": 1, "big": 2**53 + 1, "y": 0.1234567890123456}
+        )
+        self.assertNotIn("content_hash", doc)
+        self.assertLessEqual(service.redis_client.ttl(key), 100)
+        stored = service.mongo_collection.find_one({"customer_id": "C1"})
+        self.assertEqual(stored["features"], doc["features"])
+        self.assertEqual(stored["calculated_at"], doc["calculated_at"])
+
+    def test_patch_of_missing_customer(self):
+        service = self.make_service()
+        self.assertFalse(service.update_features("NOPE", {"y": 1}))
+        self.assertIsNone(service.redis_client.get("features:v1.0.0:NOPE"))
+
+
+class RollupServiceTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = self.make_service(feature_rollups=True)
+        self.service.rebuild_rollups(VERSION)
+
+    def summary(self):
+        return self.service.get_feature_rollups(VERSION)["features"]["x"]
+
+    def test_writes_and_removals_match_direct_statistics(self):
+        values = {f"C{i}": float(i * i % 17) for i in range(40)}
+        self.service.bulk_set_features(
+            [{"customer_id": c, "features": {"x": v}} for c, v in values.items()],
+            VERSION,
+        )
+        self.service.set_features("C3", {"x": 50.0}, VERSION)
+        values["C3"] = 50.0
+        self.service.delete_features("C7")
+        del values["C7"]
+
+        summary = self.summary()
+        self.assertEqual(summary["count"], len(values))
+        self.assertAlmostEqual(summary["mean"], statistics.mean(values.values()))
+        self.assertAlmostEqual(
+            summary["variance"], statistics.variance(values.values())
+        )
+
+    def test_min_max_follow_removals(self):
+        for customer_id, value in (("A", 1), ("B", 10), ("C", 5)):
+            self.service.set_features(customer_id, {"x": value}, VERSION)
+        self.service.set_features("A", {"x": 2}, VERSION)
+        self.service.delete_features("C")
+        self.service.bulk_delete_features(customer_ids=["A"])
+
+        summary = self.summary()
+        self.assertEqual(summary["count"], 1)
+        self.assertEqual(summary["min"], 10.0)
+        self.assertEqual(summary["max"], 10.0)
+        self.assertEqual(summary["quantiles"]["p50"], 10.0)
+
+
+class RollupTests(SimpleTestCase):
+    def test_quantiles_within_relative_accuracy(self):
+        values = [float(v) for v in range(1, 1001)]
+        sketch = {}
+        for value in values:
+            bucket = rollups.bucket_of(value)
+            sketch[bucket] = sketch.get(bucket, 0) + 1
+
+        estimated = rollups.quantiles(sketch, (0.5, 0.9, 0.99), 1.0, 1000.0)
+
+        for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            exact = values[int(fraction * (len(values) - 1))]
+            self.assertLessEqual(
+                abs(estimated[label] - exact) / exact, rollups.RELATIVE_ACCURACY
+            )
+
+    def test_bounds_shrink_to_non_empty_buckets(self):
+        sketch = {rollups.bucket_of(10.0): 1}
+        self.assertEqual(rollups.bounds(sketch, 1.0, 10.0, 10.0), (10.0, 10.0))
+        self.assertEqual(rollups.bounds({}, 1.0, 10.0, 5.0), (1.0, 10.0))
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_loads_share_one_batch(self):
+        calls = []
+
+        def batch_fn(keys):
+            calls.append(sorted(keys))
+            return {key: key * 2 for key in keys}
+
+        batcher = MicroBatcher(batch_fn, window_seconds=0.2, max_batch_size=64)
+        results = {}
+        threads = [
+            threading.Thread(target=lambda k=k: results.update({k: batcher.load(k)}))
+            for k in (1, 2, 3, 3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [[1, 2, 3]])
+        self.assertEqual(results, {1: 2, 2: 4, 3: 6})
+
+    def test_full_batch_runs_without_waiting(self):
+        batcher = MicroBatcher(lambda keys: {k: k for k in keys}, 10.0, 1)
+        started = time.monotonic()
+        self.assertEqual(batcher.load("a"), "a")
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_exception_result_is_raised_only_for_its_key(self):
+        batcher = MicroBatcher(
+            lambda keys: {k: ValueError(k) if k == "bad" else k for k in keys}, 0, 8
+        )
+        self.assertEqual(batcher.load("good"), "good")
+        with self.assertRaises(ValueError):
+            batcher.load("bad")
+
+
+class FeatureLoaderTests(SimpleTestCase):
+    def test_concurrent_requests_compute_once(self):
+        release = threading.Event()
+        calls = []
+
+        def compute(customer_ids, model_version):
+            calls.append(list(customer_ids))
+            release.wait(2)
+            return {c: {"x": 1} for c in customer_ids}
+
+        loader = FeatureLoader(compute, lambda computed, version: computed)
+        self.addCleanup(lambda: loader._executor and loader._executor.shutdown())
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(loader.load_many(["C1"], VERSION))
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [["C1"]])
+        self.assertEqual(results, [{"C1": {"x": 1}}] * 3)
+        self.assertEqual(loader.stats()["deduplicated"], 2)
+
+    def test_missing_customers_are_settled_as_none(self):
+        loader = FeatureLoader(lambda ids, version: {}, lambda computed, version: {})
+        self.addCleanup(lambda: loader._executor and loader._executor.shutdown())
+        self.assertEqual(loader.load_many(["C1"], VERSION), {"C1": None})
+
+    def test_failures_leave_customers_unsettled(self):
+        def compute(customer_ids, model_version):
+            raise RuntimeError("compute down")
+
+        loader = FeatureLoader(compute, lambda computed, version: computed)
+        self.addCleanup(lambda: loader._executor and loader._executor.shutdown())
+        with self.assertLogs("api.loader", "ERROR"):
+            self.assertEqual(loader.load_many(["C1", "C2"], VERSION), {})
+        self.assertEqual(loader.stats()["failed"], 2)
+
+
+class UnknownCustomerTests(ServiceTestCase):
+    def test_unknown_customer_is_negatively_cached(self):
+        service = self.make_service()
+        self.assertIsNone(service.get_features("NOPE"))
+        self.assertEqual(
+            service.redis_client.get("features:v1.0.0:NOPE"), NEGATIVE_CACHE_MARKER
+        )
+
+    def test_loader_failure_is_not_negatively_cached(self):
+        def compute(customer_ids, model_version):
+            raise RuntimeError("compute down")
+
+        service = self.make_service(feature_loader=compute)
+        with self.assertLogs("api.loader", "ERROR"):
+            self.assertIsNone(service.get_features("NEW"))
+        self.assertIsNone(service.redis_client.get("features:v1.0.0:NEW"))
+
+    def test_customer_written_by_another_process_is_found(self):
+        writer = self.make_service()
+        writer.bulk_set_features([{"customer_id": "C1", "features": {"x": 1}}])
+        writer.rebuild_bloom_filter(1000)
+        reader = self.make_service(bloom_refresh_interval=300)
+        self.assertIsNotNone(reader._get_bloom_filter())
+
+        writer.set_features("NEW", {"x": 2})
+        writer.redis_client.delete("features:v1.0.0:NEW")
+
+        self.assertEqual(reader.get_features("NEW")["features"], {"x": 2})
+        with mock.patch.object(reader, "_find_document") as find:
+            self.assertIsNone(reader.get_features("UNKNOWN"))
+        find.assert_not_called()
+
+
+class BatchLookupTests(ServiceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = self.make_service(cache_hit_counters=True)
+        self.service.bulk_set_features(
+            [{"customer_id": f"C{i}", "features": {"x": i}} for i in range(3)]
+        )
+        self.service.redis_client.delete("features:v1.0.0:C1")
+
+    def test_batch_is_one_round_trip_per_tier(self):
+        with mock.patch.object(services.redis.client.Pipeline, "load_scripts") as load:
+            results = self.service._get_features_batch(["C0", "C1", "NOPE"], VERSION)
+        load.assert_not_called()
+        self.assertEqual(results["C1"]["features"], {"x": 1})
+        self.assertIsNone(results["NOPE"])
+        self.assertEqual(self.cached(self.service, "C1")["features"], {"x": 1})
+
+    def test_scripts_are_reloaded_after_a_flush(self):
+        self.service.redis_client.script_flush()
+        results = self.service._get_features_batch(["C0", "C1"], VERSION)
+        self.assertEqual(results["C0"]["features"], {"x": 0})
+        self.assertEqual(self.cached(self.service, "C1")["features"], {"x": 1})
+
+
+class SyncCacheTests(ServiceTestCase):
+    def test_stale_change_event_does_not_overwrite_newer_write(self):
+        service = self.make_service()
+        service.set_features("C1", {"x": 1})
+        old = service.mongo_collection.find_one({"customer_id": "C1"})
+        service.update_features("C1", {"y": 2})
+
+        service.sync_cache([old])
+
+        doc = self.cached(service, "C1")
+        self.assertEqual(doc["features"], {"x": 1, "y": 2})
+
+    def test_refresh_strips_internal_fields(self):
+        service = self.make_service()
+        service.set_features("C1", {"x": 1})
+        service.redis_client.delete("features:v1.0.0:C1")
+
+        service.sync_cache([service.mongo_collection.find_one({"customer_id": "C1"})])
+
+        doc = self.cached(service, "C1")
+        self.assertNotIn("content_hash", doc)
+        self.assertNotIn("updated_at", doc)
+        self.assertNotIn("_id", doc)
+
+
+class LayoutMigrationTests(ServiceTestCase):
+    def test_migrating_layout_moves_documents(self):
+        compound = self.make_service(mongo_layout="compound", use_redis=False)
+        compound.bulk_set_features(
+            [{"customer_id": f"C{i}", "features": {"x": i}} for i in range(5)]
+        )
+        migrating = self.make_service(mongo_layout="migrating", use_redis=False)
+        self.assertEqual(migrating.get_features("C2")["features"], {"x": 2})
+
+        stats = migrating.migrate_layout(batch_size=2)
+
+        self.assertEqual(stats["moved"], 5)
+        self.assertEqual(stats["remaining"], 0)
+        by_id = self.make_service(mongo_layout="id", use_redis=False)
+        self.assertEqual(by_id.get_features("C4")["features"], {"x": 4})
+        self.assertEqual(
+            by_id.mongo_collection.find_one({"_id": "v1.0.0:C4"})["customer_id"], "C4"
+        )
@@ -0,0 +1,88 @@
+"""
+Request Timing
+Coleta o tempo gasto por fase (Redis, MongoDB, decode, serialização, render)
+durante uma requisição
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Acumula a duração (ms) de cada fase de uma requisição"""
+
+    __slots__ = ("phases",)
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + elapsed_ms
+
+    def header_value(self, total_ms: float) -> str:
+        """Valor do header Server-Timing (ex.: `redis;dur=0.42, total;dur=1.80`)"""
+        metrics = [f"{name};dur={ms:.2f}" for name, ms in self.phases.items()]
+        metrics.append(f"total;dur={total_ms:.2f}")
+        return ", ".join(metrics)
+
+
+class _Phase:
+    __slots__ = ("timings", "name", "started")
+
+    def __init__(self, timings: RequestTimings, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.add(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class _NullPhase:
+    """Usado quando não há coleta ativa: custo de um `with` vazio"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name: str):
+    """
+    Mede um trecho de código como uma fase da requisição atual
+
+    Uso: `with phase("redis"): ...`. Sem coleta ativa (instrumentação
+    desligada ou fora de uma requisição) não mede nada.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return _NULL_PHASE
+    return _Phase(timings, name)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_timings.get()
+
+
+def start_request_timings():
+    """Inicia a coleta para a requisição atual; retorna o token para `reset`"""
+    return _current_timings.set(RequestTimings())
+
+
+def end_request_timings(token) -> None:
+    _current_timings.reset(token)
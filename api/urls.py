@@ -8,7 +8,12 @@ from .views import (
     FeatureCreateUpdateView,
     FeatureDeleteView,
     BulkFeatureCreateView,
+    BulkFeaturePatchView,
+    BulkFeatureDeleteView,
+    FeatureExportView,
+    FeatureStatsView,
     HealthCheckView,
+    MetricsView,
     CacheStrategyInfoView,
 )
 
@@ -19,8 +24,22 @@ urlpatterns = [
     path("info/", CacheStrategyInfoView.as_view(), name="cache-info"),
     # Health check
     path("health/", HealthCheckView.as_view(), name="health-check"),
+    # Process metrics
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     # Bulk operations (must come before parameterized routes)
     path("features/bulk/", BulkFeatureCreateView.as_view(), name="feature-bulk-create"),
+    path(
+        "features/bulk/patch/",
+        BulkFeaturePatchView.as_view(),
+        name="feature-bulk-patch",
+    ),
+    path(
+        "features/bulk/delete/",
+        BulkFeatureDeleteView.as_view(),
+        name="feature-bulk-delete",
+    ),
+    path("features/export/", FeatureExportView.as_view(), name="feature-export"),
+    path("features/stats/", FeatureStatsView.as_view(), name="feature-stats"),
     # Feature CRUD operations
     path("features/", FeatureCreateUpdateView.as_view(), name="feature-create"),
     path(
@@ -4,18 +4,33 @@ Demonstrates Redis (L1 Cache) + MongoDB (L2 Persistence)
 """
 
 import logging
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from django.conf import settings
 
-from .services import FeaturesService
+from .schema import swagger_auto_schema, openapi
+from .export import ARROW_AVAILABLE, iter_arrow, iter_ndjson
+from .log import get_event_counters
+from .renderers import ArrowStreamRenderer, NDJSONRenderer, ORJSONRenderer
+from .rollups import DEFAULT_QUANTILES
+from .services import ServiceOverloaded
+from .shared import get_features_service
+from .timing import phase
 from .serializers import (
     FeatureSerializer,
     CreateFeatureSerializer,
     BulkFeatureSerializer,
+    PatchFeatureSerializer,
+    BulkPatchFeatureSerializer,
+    BulkDeleteFeatureSerializer,
+    ExportQuerySerializer,
+    FeatureStatsQuerySerializer,
     HealthCheckSerializer,
 )
 
@@ -23,54 +38,143 @@ logger = logging.getLogger(__name__)
 
 
 class FeaturesServiceMixin:
-    """Mixin to provide features service instance"""
+    """Mixin to provide the process-wide features service instance"""
 
     def get_features_service(self):
-        """Get or create FeaturesService instance"""
-        if not hasattr(self, "_features_service"):
-            self._features_service = FeaturesService(
-                redis_host=settings.REDIS_HOST,
-                redis_port=settings.REDIS_PORT,
-                redis_db=settings.REDIS_DB,
-                redis_ttl=settings.REDIS_TTL,
-                mongo_uri=settings.MONGO_URI,
-                mongo_db=settings.MONGO_DB,
-            )
-        return self._features_service
+        """Get the FeaturesService shared by this process"""
+        return get_features_service()
+
+
+def overloaded_response(exc):
+    """Answer a lookup shed by the MongoDB bulkhead: stale value or fast 503"""
+    if exc.stale is not None:
+        response = Response(
+            FeatureSerializer(exc.stale).data, status=status.HTTP_200_OK
+        )
+        response["Warning"] = '110 - "Response is Stale"'
+        return response
+    return Response(
+        {"error": "Service overloaded, please retry"},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+def _parse_timestamp(value):
+    """Parse a stored timestamp (datetime or ISO string) as an aware UTC datetime"""
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def feature_validators(doc):
+    """
+    Conditional request validators for a features document
+
+    The ETag changes whenever the features are recalculated (calculated_at)
+    or served from another model version. It is weak because the same
+    document may be rendered in different formats/encodings.
+
+    Returns:
+        (etag, last_modified timestamp or None)
+    """
+    etag = f'W/"{doc.get("model_version")}-{doc.get("calculated_at")}"'
+    calculated_at = _parse_timestamp(doc.get("calculated_at"))
+    last_modified = int(calculated_at.timestamp()) if calculated_at else None
+    return etag, last_modified
+
+
+def cache_max_age(doc):
+    """Seconds a response for `doc` may be cached (capped at its expires_at)"""
+    max_age = settings.HTTP_CACHE_MAX_AGE
+    expires_at = _parse_timestamp(doc.get("expires_at"))
+    if expires_at is not None:
+        remaining = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+        max_age = max(0, min(max_age, remaining))
+    return max_age
+
+
+def add_cache_headers(response, doc):
+    """Set ETag, Last-Modified and Cache-Control (max-age from expires_at)"""
+    etag, last_modified = feature_validators(doc)
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+
+    max_age = cache_max_age(doc)
+    if settings.HTTP_CACHE_PUBLIC:
+        patch_cache_control(response, public=True, max_age=max_age)
+    else:
+        patch_cache_control(response, private=True, max_age=max_age)
+    return response
 
 
 class FeatureRetrieveView(FeaturesServiceMixin, APIView):
     """
-    Retrieve feature data for a specific customer
+    Retrieve or partially update feature data for a specific customer
 
-    This endpoint demonstrates the L1 cache strategy:
+    GET demonstrates the L1 cache strategy:
     1. First tries to get data from Redis (L1 - fast cache)
     2. If not found in Redis, queries MongoDB (L2 - persistent storage)
     3. If found in MongoDB, automatically updates Redis cache
+
+    GET responses carry ETag/Last-Modified/Cache-Control. Requests with
+    If-None-Match or If-Modified-Since are validated against the document
+    metadata only and answered with 304 when unchanged.
+
+    PATCH changes only the given features in both MongoDB and Redis
     """
 
     @swagger_auto_schema(
         operation_description="Get features for a customer (Redis → MongoDB)",
         responses={
             200: FeatureSerializer(),
+            304: "Not modified (If-None-Match / If-Modified-Since)",
             404: "Features not found",
             500: "Internal server error",
+            503: "MongoDB overloaded (lookup shed)",
         },
     )
     def get(self, request, customer_id):
         """Get features for a customer"""
         try:
             service = self.get_features_service()
+
+            if (
+                "HTTP_IF_NONE_MATCH" in request.META
+                or "HTTP_IF_MODIFIED_SINCE" in request.META
+            ):
+                metadata = service.get_features_metadata(customer_id)
+                if metadata:
+                    etag, last_modified = feature_validators(metadata)
+                    not_modified = get_conditional_response(
+                        request, etag=etag, last_modified=last_modified
+                    )
+                    if not_modified is not None:
+                        return add_cache_headers(not_modified, metadata)
+
             features = service.get_features(customer_id)
 
             if features:
-                serializer = FeatureSerializer(features)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                with phase("serialize"):
+                    data = FeatureSerializer(features).data
+                return add_cache_headers(
+                    Response(data, status=status.HTTP_200_OK), features
+                )
             else:
                 return Response(
                     {"error": f"Features not found for customer_id: {customer_id}"},
                     status=status.HTTP_404_NOT_FOUND,
                 )
+        except ServiceOverloaded as e:
+            return overloaded_response(e)
         except Exception as e:
             logger.error(f"Error retrieving features: {str(e)}", exc_info=True)
             return Response(
@@ -78,6 +182,48 @@ class FeatureRetrieveView(FeaturesServiceMixin, APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @swagger_auto_schema(
+        operation_description="Partially update features for a customer",
+        request_body=PatchFeatureSerializer,
+        responses={
+            200: FeatureSerializer(),
+            400: "Bad request",
+            404: "Features not found",
+            500: "Internal server error",
+        },
+    )
+    def patch(self, request, customer_id):
+        """Partially update features"""
+        serializer = PatchFeatureSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            service = self.get_features_service()
+            updated = service.update_features(
+                customer_id, serializer.validated_data["features"]
+            )
+
+            if updated:
+                # Read-back of our own write: not shed by the MongoDB bulkhead
+                stored_features = service.get_features(customer_id, bulkhead=False)
+                result_serializer = FeatureSerializer(stored_features)
+                return Response(result_serializer.data, status=status.HTTP_200_OK)
+            else:
+                return Response(
+                    {"error": f"Features not found for customer_id: {customer_id}"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+        except ServiceOverloaded as e:
+            return overloaded_response(e)
+        except Exception as e:
+            logger.error(f"Error updating features: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
 
 class FeatureCreateUpdateView(FeaturesServiceMixin, APIView):
     """
@@ -108,16 +254,21 @@ class FeatureCreateUpdateView(FeaturesServiceMixin, APIView):
             data = serializer.validated_data
             service = self.get_features_service()
 
+            model_version = data.get("model_version") or service.get_active_version()
+
             success = service.set_features(
                 customer_id=data["customer_id"],
                 features=data["features"],
-                model_version=data.get("model_version", "v1.0.0"),
+                model_version=model_version,
                 ttl_days=data.get("ttl_days", 7),
             )
 
             if success:
-                # Retrieve the stored data to return
-                stored_features = service.get_features(data["customer_id"])
+                # Retrieve the stored data (from the version just written; a
+                # read-back of our own write is not shed by the bulkhead)
+                stored_features = service.get_features(
+                    data["customer_id"], model_version, bulkhead=False
+                )
                 result_serializer = FeatureSerializer(stored_features)
                 return Response(result_serializer.data, status=status.HTTP_201_CREATED)
             else:
@@ -125,6 +276,8 @@ class FeatureCreateUpdateView(FeaturesServiceMixin, APIView):
                     {"error": "Failed to store features"},
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 )
+        except ServiceOverloaded as e:
+            return overloaded_response(e)
         except Exception as e:
             logger.error(f"Error creating features: {str(e)}", exc_info=True)
             return Response(
@@ -186,6 +339,7 @@ class BulkFeatureCreateView(FeaturesServiceMixin, APIView):
                     "application/json": {
                         "success": 10,
                         "failed": 0,
+                        "unchanged": 0,
                         "message": "Bulk operation completed",
                     }
                 },
@@ -207,7 +361,9 @@ class BulkFeatureCreateView(FeaturesServiceMixin, APIView):
 
             stats = service.bulk_set_features(
                 features_list=data["features_list"],
-                model_version=data.get("model_version", "v1.0.0"),
+                model_version=(
+                    data.get("model_version") or service.get_active_version()
+                ),
                 ttl_days=data.get("ttl_days", 7),
             )
 
@@ -215,6 +371,7 @@ class BulkFeatureCreateView(FeaturesServiceMixin, APIView):
                 {
                     "success": stats["success"],
                     "failed": stats["failed"],
+                    "unchanged": stats["unchanged"],
                     "message": "Bulk operation completed",
                 },
                 status=status.HTTP_201_CREATED,
@@ -227,6 +384,227 @@ class BulkFeatureCreateView(FeaturesServiceMixin, APIView):
             )
 
 
+class BulkFeaturePatchView(FeaturesServiceMixin, APIView):
+    """
+    Bulk partial update of feature data for multiple customers
+
+    Intended for stream consumers that change a few features at a time
+    """
+
+    @swagger_auto_schema(
+        operation_description="Bulk partial update of features for multiple customers",
+        request_body=BulkPatchFeatureSerializer,
+        responses={
+            200: openapi.Response(
+                description="Bulk update completed",
+                examples={
+                    "application/json": {
+                        "success": 10,
+                        "failed": 0,
+                        "message": "Bulk update completed",
+                    }
+                },
+            ),
+            400: "Bad request",
+            500: "Internal server error",
+        },
+    )
+    def patch(self, request):
+        """Bulk partial update of features"""
+        serializer = BulkPatchFeatureSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            service = self.get_features_service()
+            stats = service.bulk_update_features(
+                serializer.validated_data["updates_list"]
+            )
+
+            return Response(
+                {
+                    "success": stats["success"],
+                    "failed": stats["failed"],
+                    "message": "Bulk update completed",
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            logger.error(f"Error in bulk update: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class BulkFeatureDeleteView(FeaturesServiceMixin, APIView):
+    """
+    Bulk delete feature data by customer_id list and/or selectors
+
+    Used for GDPR purges and rollbacks of bad model outputs. MongoDB documents
+    are removed with delete_many and Redis keys with pipelined UNLINK (or an
+    incremental SCAN sweep for prefix/model_version selectors). Very large
+    purges should use `manage.py bulk_delete`, which reports progress.
+    """
+
+    @swagger_auto_schema(
+        operation_description="Bulk delete features by customer_id list and/or selectors",
+        request_body=BulkDeleteFeatureSerializer,
+        responses={
+            200: openapi.Response(
+                description="Bulk delete completed",
+                examples={
+                    "application/json": {
+                        "mongo_documents": 1000,
+                        "redis_keys": 1000,
+                        "batches": 1,
+                        "message": "Bulk delete completed",
+                    }
+                },
+            ),
+            400: "Bad request",
+            500: "Internal server error",
+        },
+    )
+    def post(self, request):
+        """Bulk delete features"""
+        serializer = BulkDeleteFeatureSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            service = self.get_features_service()
+            stats = service.bulk_delete_features(**serializer.validated_data)
+
+            return Response(
+                {**stats, "message": "Bulk delete completed"},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            logger.error(f"Error in bulk delete: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Internal server error"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class FeatureExportView(FeaturesServiceMixin, APIView):
+    """
+    Stream every feature document of a model version
+
+    Walks customer_features in customer_id order with keyset pagination on
+    the (customer_id, model_version) unique index, so memory stays constant
+    for any collection size. The format is negotiated through Accept or
+    `?format=`: NDJSON (default) or Arrow IPC stream (if pyarrow is installed).
+    Exports cut by `limit` can be resumed with the returned `next_cursor`.
+    """
+
+    renderer_classes = [NDJSONRenderer] + (
+        [ArrowStreamRenderer] if ARROW_AVAILABLE else []
+    )
+
+    @swagger_auto_schema(
+        operation_description="Stream features in customer_id order (NDJSON or Arrow)",
+        query_serializer=ExportQuerySerializer,
+        responses={
+            200: "NDJSON lines or Arrow IPC stream",
+            400: "Bad request",
+        },
+    )
+    def get(self, request):
+        """Stream features"""
+        serializer = ExportQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            # Errors are plain JSON whatever format was negotiated
+            request.accepted_renderer = ORJSONRenderer()
+            request.accepted_media_type = ORJSONRenderer.media_type
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        service = self.get_features_service()
+        model_version, after = data.get("cursor") or (data.get("model_version"), None)
+        model_version = model_version or service.get_active_version()
+        fields = data.get("fields")
+
+        batches = service.export_features(
+            model_version=model_version,
+            after=after,
+            fields=fields,
+            batch_size=data["batch_size"],
+            limit=data.get("limit"),
+        )
+        if request.accepted_renderer.format == "arrow":
+            stream = iter_arrow(batches, model_version, fields)
+        else:
+            stream = iter_ndjson(batches, model_version, data.get("limit"))
+
+        response = StreamingHttpResponse(
+            stream, content_type=request.accepted_renderer.media_type
+        )
+        response["X-Model-Version"] = model_version
+        return response
+
+
+class FeatureStatsView(FeaturesServiceMixin, APIView):
+    """
+    Per-feature statistics of a model version
+
+    Count, mean, variance, min/max and approximate quantiles maintained by
+    the writes (FEATURE_ROLLUPS_ENABLED), read from two Redis hashes: the
+    cost depends on the number of features, never on the collection size
+    """
+
+    @swagger_auto_schema(
+        operation_description="Get running feature statistics of a model version",
+        query_serializer=FeatureStatsQuerySerializer,
+        responses={
+            200: openapi.Response(
+                description="Feature statistics",
+                examples={
+                    "application/json": {
+                        "model_version": "v1.0.0",
+                        "source": "redis",
+                        "features": {
+                            "credit_score": {
+                                "count": 150000,
+                                "mean": 651.2,
+                                "variance": 4410.7,
+                                "stddev": 66.41,
+                                "min": 300.0,
+                                "max": 850.0,
+                                "quantiles": {"p50": 652.9, "p90": 737.4, "p99": 811.0},
+                            }
+                        },
+                    }
+                },
+            ),
+            400: "Bad request",
+            404: "Feature rollups disabled or unavailable",
+        },
+    )
+    def get(self, request):
+        """Get feature statistics"""
+        serializer = FeatureStatsQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        service = self.get_features_service()
+        stats = service.get_feature_rollups(
+            data.get("model_version"), data.get("quantiles") or DEFAULT_QUANTILES
+        )
+        if stats is None:
+            return Response(
+                {"error": "Feature statistics are disabled or unavailable"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(stats, status=status.HTTP_200_OK)
+
+
 class HealthCheckView(FeaturesServiceMixin, APIView):
     """
     Health check endpoint
@@ -259,6 +637,40 @@ class HealthCheckView(FeaturesServiceMixin, APIView):
             )
 
 
+class MetricsView(FeaturesServiceMixin, APIView):
+    """
+    Process metrics endpoint
+
+    Returns in-process counters for this worker: cache events seen by the
+    sampled logger (including the ones not written to the log) and the
+    MongoDB bulkhead queue/shed counts
+    """
+
+    @swagger_auto_schema(
+        operation_description="Get in-process metrics for this worker",
+        responses={
+            200: openapi.Response(
+                description="Process metrics",
+                examples={
+                    "application/json": {
+                        "cache_events": {"hit": {"total": 1000, "suppressed": 990}},
+                        "mongo_bulkhead": {"in_flight": 3, "waiting": 0, "shed": 12},
+                    }
+                },
+            )
+        },
+    )
+    def get(self, request):
+        """Get process metrics"""
+        metrics = {"cache_events": get_event_counters()}
+        metrics.update(self.get_features_service().get_metrics())
+        if settings.ASGI_FAST_PATH:
+            from .fastpath import get_fast_path_counters
+
+            metrics["asgi_fast_path"] = get_fast_path_counters()
+        return Response(metrics, status=status.HTTP_200_OK)
+
+
 class CacheStrategyInfoView(APIView):
     """
     Information about the L1 cache strategy implementation
@@ -327,9 +739,14 @@ class CacheStrategyInfoView(APIView):
             "endpoints": {
                 "GET /api/features/{customer_id}/": "Retrieve features (demonstrates cache strategy)",
                 "POST /api/features/": "Create/update features",
+                "PATCH /api/features/{customer_id}/": "Partially update features",
                 "DELETE /api/features/{customer_id}/": "Delete features",
                 "POST /api/features/bulk/": "Bulk create/update features",
+                "PATCH /api/features/bulk/patch/": "Bulk partial update of features",
+                "POST /api/features/bulk/delete/": "Bulk delete by ID list or selectors",
+                "GET /api/features/export/": "Stream all features (NDJSON or Arrow)",
                 "GET /api/health/": "Check Redis and MongoDB status",
+                "GET /api/metrics/": "In-process metrics for this worker",
                 "GET /api/info/": "This endpoint - strategy information",
             },
         }
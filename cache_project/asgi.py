@@ -7,10 +7,30 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import logging
 import os
+import time
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cache_project.settings')
 
+_load_started = time.perf_counter()
+
 application = get_asgi_application()
+
+# Import the URLconf (and every view) now so it happens once in the master
+# when workers are preloaded, not on each worker's first request
+get_resolver().url_patterns
+
+if settings.ASGI_FAST_PATH:
+    from api.fastpath import FeatureFastPath
+
+    # Answers feature lookups that hit Redis; everything else goes to Django
+    application = FeatureFastPath(application)
+
+logging.getLogger(__name__).info(
+    'ASGI application loaded in %.1f ms', (time.perf_counter() - _load_started) * 1000
+)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -34,32 +35,82 @@ DEBUG = os.getenv("DEBUG", "True") == "True"
 
 ALLOWED_HOSTS = ["*"]
 
+# Lean serving profile: only what the feature API needs on the hot path.
+# Drops admin/auth/sessions/messages, the SQLite database, Swagger generation
+# (drf_yasg is never imported) and the browsable API renderer. The OpenAPI
+# document is served from OPENAPI_SCHEMA_PATH, built with
+# `python manage.py generate_swagger` in the full profile.
+LEAN_MODE = os.getenv("LEAN_MODE", "False") == "True"
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH", str(BASE_DIR / "openapi.json"))
+
 
 # Application definition
 
-INSTALLED_APPS = [
-    "django.contrib.admin",
-    "django.contrib.auth",
-    "django.contrib.contenttypes",
-    "django.contrib.sessions",
-    "django.contrib.messages",
-    "django.contrib.staticfiles",
-    # Third party apps
-    "rest_framework",
-    "drf_yasg",
-    # Local apps
-    "api",
-]
+if LEAN_MODE:
+    INSTALLED_APPS = [
+        "rest_framework",
+        "api",
+    ]
+
+    MIDDLEWARE = [
+        "django.middleware.security.SecurityMiddleware",
+        "django.middleware.common.CommonMiddleware",
+    ]
+else:
+    INSTALLED_APPS = [
+        "django.contrib.admin",
+        "django.contrib.auth",
+        "django.contrib.contenttypes",
+        "django.contrib.sessions",
+        "django.contrib.messages",
+        "django.contrib.staticfiles",
+        # Third party apps
+        "rest_framework",
+        "drf_yasg",
+        # Local apps
+        "api",
+    ]
+
+    MIDDLEWARE = [
+        "django.middleware.security.SecurityMiddleware",
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.middleware.common.CommonMiddleware",
+        "django.middleware.csrf.CsrfViewMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "django.contrib.messages.middleware.MessageMiddleware",
+        "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    ]
+
+# Request instrumentation (api.middleware.RequestTimingMiddleware)
+# Server-Timing header with per-phase timings and slow request logging
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "False") == "True"
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 250))
+# cProfile 1 in N requests and dump the stats to PROFILE_DIR (0 disables)
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+
+# Response compression (api.middleware.ResponseCompressionMiddleware)
+# zstd (if installed) or gzip, negotiated through Accept-Encoding
+RESPONSE_COMPRESSION_ENABLED = (
+    os.getenv("RESPONSE_COMPRESSION_ENABLED", "True") == "True"
+)
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+GZIP_COMPRESSION_LEVEL = int(os.getenv("GZIP_COMPRESSION_LEVEL", 6))
+ZSTD_COMPRESSION_LEVEL = int(os.getenv("ZSTD_COMPRESSION_LEVEL", 3))
 
-MIDDLEWARE = [
-    "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "django.contrib.messages.middleware.MessageMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
-]
+# Right after SecurityMiddleware, so it sees the final response body
+if RESPONSE_COMPRESSION_ENABLED:
+    MIDDLEWARE.insert(1, "api.middleware.ResponseCompressionMiddleware")
+
+# Outermost, so the total includes every other middleware; not installed at
+# all when disabled
+if SERVER_TIMING_ENABLED or PROFILE_SAMPLE_RATE:
+    MIDDLEWARE.insert(0, "api.middleware.RequestTimingMiddleware")
+
+# Raw ASGI fast path for GET /api/features/<id>/ Redis hits (api.fastpath),
+# mounted ahead of Django in cache_project/asgi.py. Bypasses the middleware
+# stack, so Server-Timing and profiling do not see the requests it answers
+ASGI_FAST_PATH = os.getenv("ASGI_FAST_PATH", "False") == "True"
 
 ROOT_URLCONF = "cache_project.urls"
 
@@ -85,12 +136,16 @@ WSGI_APPLICATION = "cache_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# The feature API only uses Redis and MongoDB; the lean profile has no database
+if LEAN_MODE:
+    DATABASES = {}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
     }
-}
 
 
 # Password validation
@@ -135,27 +190,119 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # REST Framework settings
+# JSON through orjson (stock JSONRenderer output if it is not installed),
+# MessagePack for `Accept: application/msgpack` when msgpack is installed
+API_RENDERER_CLASSES = ["api.renderers.ORJSONRenderer"]
+if find_spec("msgpack") is not None:
+    API_RENDERER_CLASSES.append("api.renderers.MessagePackRenderer")
+
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": [
-        "rest_framework.renderers.JSONRenderer",
-        "rest_framework.renderers.BrowsableAPIRenderer",
-    ],
+    "DEFAULT_RENDERER_CLASSES": API_RENDERER_CLASSES
+    + ["rest_framework.renderers.BrowsableAPIRenderer"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
 }
 
+if LEAN_MODE:
+    REST_FRAMEWORK.update(
+        {
+            "DEFAULT_RENDERER_CLASSES": API_RENDERER_CLASSES,
+            "DEFAULT_AUTHENTICATION_CLASSES": [],
+            "DEFAULT_PERMISSION_CLASSES": [],
+            "UNAUTHENTICATED_USER": None,
+        }
+    )
+
+# Swagger settings (used by `manage.py generate_swagger` to build the schema)
+SWAGGER_SETTINGS = {
+    "DEFAULT_INFO": "cache_project.urls.api_info",
+}
+
 # Redis Settings
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_TTL = int(os.getenv("REDIS_TTL", 604800))  # 7 days
 
+# Model version settings
+# Seconds each process caches the active model_version alias
+ACTIVE_VERSION_CACHE_TTL = float(os.getenv("ACTIVE_VERSION_CACHE_TTL", 5))
+
+# Unknown customer settings
+# TTL in seconds of negative cache entries for customers not found in MongoDB
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", 60))
+# Bloom filter of known customer_ids (built with `manage.py rebuild_bloom_filter`)
+BLOOM_FILTER_ENABLED = os.getenv("BLOOM_FILTER_ENABLED", "True") == "True"
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", 1000000))
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", 0.01))
+BLOOM_REFRESH_INTERVAL = float(os.getenv("BLOOM_REFRESH_INTERVAL", 30))
+
+# HTTP caching of GET /api/features/<id>/ (ETag, Last-Modified, Cache-Control)
+# max-age is the time left until expires_at, capped at HTTP_CACHE_MAX_AGE seconds
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 300))
+# "public" lets shared caches (CDN, proxies) store responses; else "private"
+HTTP_CACHE_PUBLIC = os.getenv("HTTP_CACHE_PUBLIC", "True") == "True"
+
 # MongoDB Settings
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 MONGO_DB = os.getenv("MONGO_DB", "cache_demo")
+# Feature collection layout: "compound" (generated _id + unique index on
+# customer_id/model_version), "id" (_id = "<model_version>:<customer_id>") or
+# "migrating" (writes to the "id" collection, reads fall back to the old one
+# while `manage.py migrate_mongo_layout` runs). Indexes: `manage.py mongo_indexes`
+MONGO_LAYOUT = os.getenv("MONGO_LAYOUT", "compound")
 MONGO_USERNAME = os.getenv("MONGO_USERNAME", "admin")
 MONGO_PASSWORD = os.getenv("MONGO_PASSWORD", "password")
 
+# MongoDB bulkhead on the cache miss path (per process; 0, the default,
+# disables it: opt in to shed lookups with 503 or a stale value)
+MONGO_MAX_CONCURRENCY = int(os.getenv("MONGO_MAX_CONCURRENCY", 0))
+# How long a lookup waits for a slot before being shed (503 or stale value)
+MONGO_QUEUE_TIMEOUT_MS = float(os.getenv("MONGO_QUEUE_TIMEOUT_MS", 50))
+# Recently served documents kept in memory to answer shed lookups (0 disables)
+STALE_CACHE_SIZE = int(os.getenv("STALE_CACHE_SIZE", 0))
+
+# Micro-batching of concurrent reads in a worker (one MGET + one $in query)
+# Window a read waits for others to join its batch (0 disables)
+READ_BATCH_WINDOW_MS = float(os.getenv("READ_BATCH_WINDOW_MS", 0))
+READ_BATCH_MAX_SIZE = int(os.getenv("READ_BATCH_MAX_SIZE", 64))
+
+# TinyLFU admission of read-through backfills (writes are always cached)
+# Recent accesses needed to cache a MongoDB hit with REDIS_TTL (0 disables)
+ADMISSION_MIN_FREQUENCY = int(os.getenv("ADMISSION_MIN_FREQUENCY", 0))
+# TTL in seconds for keys below that frequency (0: not cached at all)
+ADMISSION_PROBATION_TTL = int(os.getenv("ADMISSION_PROBATION_TTL", 300))
+ADMISSION_SKETCH_WIDTH = int(os.getenv("ADMISSION_SKETCH_WIDTH", 65536))
+
+# Server-side read script (one EVALSHA per read instead of a plain GET)
+# Sliding expiry: each hit keeps the key at least this many seconds, capped
+# at the document's expires_at; read-through backfills use it too (0 disables)
+CACHE_IDLE_TTL = int(os.getenv("CACHE_IDLE_TTL", 0))
+# Per-model-version hit/miss counters in Redis, shared by all workers
+CACHE_HIT_COUNTERS = os.getenv("CACHE_HIT_COUNTERS", "False") == "True"
+
+# Compute-on-miss loader (L3): dotted path of a function
+# (customer_ids, model_version) -> {customer_id: features} called on a bounded
+# pool for customers missing from Redis and MongoDB; results are written
+# through to both ("" disables, e.g. api.synthetic.compute_features)
+FEATURE_LOADER = os.getenv("FEATURE_LOADER", "")
+FEATURE_LOADER_WORKERS = int(os.getenv("FEATURE_LOADER_WORKERS", 4))
+# Process pool instead of threads (CPU-bound loaders)
+FEATURE_LOADER_PROCESSES = os.getenv("FEATURE_LOADER_PROCESSES", "False") == "True"
+# How long a lookup waits for the computation (it keeps running afterwards)
+FEATURE_LOADER_TIMEOUT_MS = float(os.getenv("FEATURE_LOADER_TIMEOUT_MS", 2000))
+# Customers being computed at once per process; beyond that lookups get 404
+FEATURE_LOADER_MAX_PENDING = int(os.getenv("FEATURE_LOADER_MAX_PENDING", 1000))
+FEATURE_LOADER_TTL_DAYS = int(os.getenv("FEATURE_LOADER_TTL_DAYS", 7))
+
+# Running per-feature statistics of each model version (GET /api/features/stats/),
+# updated by every write; start them with `manage.py feature_rollups --rebuild`
+FEATURE_ROLLUPS_ENABLED = os.getenv("FEATURE_ROLLUPS_ENABLED", "False") == "True"
+# Seconds between checkpoints of the statistics to MongoDB (0: command only)
+FEATURE_ROLLUP_CHECKPOINT_INTERVAL = float(
+    os.getenv("FEATURE_ROLLUP_CHECKPOINT_INTERVAL", 300)
+)
+
 # Logging configuration
 LOGGING = {
     "version": 1,
@@ -166,11 +313,39 @@ LOGGING = {
             "style": "{",
         },
     },
+    "filters": {
+        # Fraction of each cache event type that is logged; every event is
+        # still counted (see GET /api/metrics/)
+        "cache_sampling": {
+            "()": "api.log.CacheEventSampler",
+            "rates": {
+                "hit": float(os.getenv("CACHE_LOG_SAMPLE_HIT", 0.01)),
+                "miss": float(os.getenv("CACHE_LOG_SAMPLE_MISS", 0.1)),
+                "write": float(os.getenv("CACHE_LOG_SAMPLE_WRITE", 0.01)),
+                "delete": float(os.getenv("CACHE_LOG_SAMPLE_DELETE", 0.01)),
+                "not_found": float(os.getenv("CACHE_LOG_SAMPLE_NOT_FOUND", 0.1)),
+                "shed": float(os.getenv("CACHE_LOG_SAMPLE_SHED", 0.1)),
+                "negative_hit": float(os.getenv("CACHE_LOG_SAMPLE_NEGATIVE_HIT", 0.01)),
+                "bloom_absent": float(os.getenv("CACHE_LOG_SAMPLE_BLOOM_ABSENT", 0.01)),
+                # One per read: counted, not printed by default
+                "lookup": float(os.getenv("CACHE_LOG_SAMPLE_LOOKUP", 0.0)),
+                "error": 1.0,
+            },
+            "default_rate": 1.0,
+        },
+    },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
             "formatter": "verbose",
         },
+        # Queue + background thread: formatting and stream I/O leave the
+        # request thread
+        "async_console": {
+            "class": "api.log.AsyncStreamHandler",
+            "formatter": "verbose",
+            "queue_size": 10000,
+        },
     },
     "root": {
         "handlers": ["console"],
@@ -182,5 +357,12 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": False,
         },
+        # Cache hot path events (hit/miss/write/not_found/error)
+        "api.cache": {
+            "handlers": ["async_console"],
+            "filters": ["cache_sampling"],
+            "level": os.getenv("CACHE_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
     },
 }
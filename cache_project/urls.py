@@ -15,15 +15,28 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-# Swagger/OpenAPI configuration
-schema_view = get_schema_view(
-    openapi.Info(
+urlpatterns = [
+    path("api/", include("api.urls")),
+]
+
+if settings.LEAN_MODE:
+    # Lean profile: no admin and no drf_yasg, schema served from the build artifact
+    from api.schema import prebuilt_schema_view
+
+    urlpatterns += [
+        path("swagger.json", prebuilt_schema_view, name="schema-json"),
+    ]
+else:
+    from django.contrib import admin
+    from rest_framework import permissions
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    # Swagger/OpenAPI configuration
+    api_info = openapi.Info(
         title="L1 Cache Strategy API",
         default_version="v1",
         description="""
@@ -49,20 +62,30 @@ Visit `/api/info/` for detailed strategy explanation.
         terms_of_service="https://www.example.com/terms/",
         contact=openapi.Contact(email="contact@example.com"),
         license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+    )
 
-urlpatterns = [
-    path("admin/", admin.site.urls),
-    path("api/", include("api.urls")),
-    # Swagger/OpenAPI documentation
-    path(
-        "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
-    path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
-    path("swagger.json", schema_view.without_ui(cache_timeout=0), name="schema-json"),
-]
+    schema_view = get_schema_view(
+        api_info,
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+    urlpatterns += [
+        path("admin/", admin.site.urls),
+        # Swagger/OpenAPI documentation
+        path(
+            "swagger/",
+            schema_view.with_ui("swagger", cache_timeout=0),
+            name="schema-swagger-ui",
+        ),
+        path(
+            "redoc/",
+            schema_view.with_ui("redoc", cache_timeout=0),
+            name="schema-redoc",
+        ),
+        path(
+            "swagger.json",
+            schema_view.without_ui(cache_timeout=0),
+            name="schema-json",
+        ),
+    ]
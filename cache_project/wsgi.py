@@ -7,10 +7,23 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import logging
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cache_project.settings')
 
+_load_started = time.perf_counter()
+
 application = get_wsgi_application()
+
+# Import the URLconf (and every view) now so it happens once in the master
+# when workers are preloaded, not on each worker's first request
+get_resolver().url_patterns
+
+logging.getLogger(__name__).info(
+    'WSGI application loaded in %.1f ms', (time.perf_counter() - _load_started) * 1000
+)
@@ -161,8 +161,8 @@ echo "Then we'll fetch the data again - it will come from MongoDB."
 echo ""
 
 echo -e "${YELLOW}Deleting from Redis...${NC}"
-print_command "docker exec cache-demo-redis redis-cli DEL 'features:$CUSTOMER_ID'"
-docker exec cache-demo-redis redis-cli DEL "features:$CUSTOMER_ID" 2>/dev/null || echo "Redis container not found"
+print_command "docker exec cache-demo-redis redis-cli DEL 'features:v1.0.0:$CUSTOMER_ID'"
+docker exec cache-demo-redis redis-cli DEL "features:v1.0.0:$CUSTOMER_ID" 2>/dev/null || echo "Redis container not found"
 
 echo ""
 echo -e "${CYAN}Now fetching the data (should hit MongoDB)...${NC}"
@@ -250,7 +250,7 @@ echo "   Response time: ${REDIS_TIME}ms"
 echo ""
 
 echo -e "${CYAN}2. Clearing Redis and fetching from MongoDB:${NC}"
-docker exec cache-demo-redis redis-cli DEL "features:$CUSTOMER_ID" > /dev/null 2>&1
+docker exec cache-demo-redis redis-cli DEL "features:v1.0.0:$CUSTOMER_ID" > /dev/null 2>&1
 START_TIME=$(date +%s%3N)
 curl -s "$BASE_URL/api/features/$CUSTOMER_ID/" > /dev/null
 END_TIME=$(date +%s%3N)
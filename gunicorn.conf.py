@@ -0,0 +1,53 @@
+"""
+Gunicorn configuration for production serving
+
+Serves cache_project.wsgi (gthread workers) or cache_project.asgi (uvicorn
+workers) with preforked processes:
+
+    gunicorn -c gunicorn.conf.py
+
+Environment variables:
+    SERVER_INTERFACE: "wsgi" (default) or "asgi"
+    SERVER_BIND: Address to bind (default: 0.0.0.0:8000)
+    SERVER_WORKERS: Number of worker processes (default: 2 * CPUs + 1)
+    SERVER_THREADS: Threads per worker, wsgi only (default: 4)
+    SERVER_PRELOAD: Import the app in the master before forking (default: True)
+    SERVER_TIMEOUT: Worker timeout in seconds (default: 30)
+    SERVER_MAX_REQUESTS: Recycle workers after N requests, 0 disables (default: 0)
+"""
+
+import multiprocessing
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cache_project.settings")
+
+interface = os.getenv("SERVER_INTERFACE", "wsgi")
+if interface == "asgi":
+    wsgi_app = "cache_project.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "cache_project.wsgi:application"
+    worker_class = "gthread"
+
+bind = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("SERVER_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("SERVER_THREADS", 4))
+preload_app = os.getenv("SERVER_PRELOAD", "True") == "True"
+timeout = int(os.getenv("SERVER_TIMEOUT", 30))
+graceful_timeout = timeout
+keepalive = 5
+max_requests = int(os.getenv("SERVER_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    """Warm the worker's FeaturesService before it accepts connections
+
+    Runs in the child after the fork, so the connections opened here belong
+    to this worker only (see api.shared).
+    """
+    from api.shared import get_features_service
+
+    warmed = get_features_service().warm_up()
+    worker.log.info(f"Worker {worker.pid} warmed up: {warmed}")
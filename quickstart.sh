@@ -79,6 +79,7 @@ fi
 echo ""
 echo "Running Django migrations..."
 docker compose exec -T web python manage.py migrate
+docker compose exec -T web python manage.py mongo_indexes
 
 # Create sample data
 echo ""